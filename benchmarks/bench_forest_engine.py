@@ -0,0 +1,54 @@
+# Latency of the compiled forest engine against sklearn's model.predict.
+#
+# Usage: python benchmarks/bench_forest_engine.py [--repeat 50]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+from forest_engine import CompiledForest
+
+
+def time_call(fn, X, repeat):
+    fn(X)  # warmup
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        samples.append(time.perf_counter() - start)
+    return np.median(samples) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    args = parser.parse_args()
+
+    # Synthetic stand-in shaped like the served model: ~1168 training rows, 10 features
+    rng = np.random.RandomState(42)
+    X_train = rng.randn(1168, 10)
+    y_train = X_train @ rng.rand(10) * 50000 + rng.randn(1168) * 5000
+    model = RandomForestRegressor(n_estimators=args.n_estimators, random_state=42).fit(X_train, y_train)
+    compiled = CompiledForest.from_sklearn(model)
+
+    X = rng.randn(1000, 10)
+    max_diff = np.abs(compiled.predict(X) - model.predict(X)).max()
+    print(f'Trees: {compiled.n_trees} | nodes: {compiled.n_nodes} | max depth: {compiled.max_depth}')
+    print(f'Max |compiled - sklearn|: {max_diff:.3e}')
+    print('=' * 54)
+    print(f'{"rows":>6} {"sklearn (ms)":>14} {"compiled (ms)":>14} {"speedup":>9}')
+    for n_rows in (1, 10, 100, 1000):
+        batch = X[:n_rows]
+        sk_ms = time_call(model.predict, batch, args.repeat)
+        cf_ms = time_call(compiled.predict, batch, args.repeat)
+        print(f'{n_rows:>6} {sk_ms:>14.3f} {cf_ms:>14.3f} {sk_ms / cf_ms:>8.1f}x')
+    print('=' * 54)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Cold-start time of the API: time until uvicorn answers the liveness probe
+# (/health/live) and the readiness probe (/health), per serving engine.
+#
+# Usage: python benchmarks/bench_startup.py [--runs 5]
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from run_benchmarks import SRC_DIR, served_model, synthetic_housing
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except OSError:
+        return None, None
+
+
+def start_once(workdir, engine, timeout_s=60.0):
+    port = _free_port()
+    env = dict(os.environ, SERVING_ENGINE=engine, PYTHONUNBUFFERED='1')
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'serve:app', '--app-dir', str(SRC_DIR), '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    live_s = ready_s = None
+    report = None
+    try:
+        while time.perf_counter() - started < timeout_s:
+            if live_s is None and _get(f'http://127.0.0.1:{port}/health/live')[0] == 200:
+                live_s = time.perf_counter() - started
+            status, body = _get(f'http://127.0.0.1:{port}/health')
+            if status == 200:
+                ready_s = time.perf_counter() - started
+                live_s = live_s or ready_s
+                report = body.get('startup')
+                break
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+    if ready_s is None:
+        raise RuntimeError(f'API did not become ready within {timeout_s}s')
+    return live_s, ready_s, report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    X, y = synthetic_housing()
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as workdir, served_model(workdir, X, y):
+        print('=' * 78)
+        print(f'{"engine":<10} {"live s":>9} {"ready s":>9} {"import s":>9} {"model s":>9}  sklearn imported')
+        for engine in ('sklearn', 'compiled'):
+            runs = [start_once(workdir, engine) for _ in range(args.runs)]
+            live = statistics.median(run[0] for run in runs)
+            ready = statistics.median(run[1] for run in runs)
+            imports = statistics.median(run[2]['import_seconds'] for run in runs)
+            model = statistics.median(run[2]['model_load_seconds'] for run in runs)
+            print(f'{engine:<10} {live:>9.3f} {ready:>9.3f} {imports:>9.3f} {model:>9.3f}  {runs[-1][2]["sklearn_imported"]}')
+        print('=' * 78)
+        print('Medians over', args.runs, 'runs; live/ready are measured from process spawn')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Resident memory of a multi-worker uvicorn deployment, per serving layout:
+# the unpickled sklearn forest, the compiled forest read into each process, and
+# the compiled forest memory-mapped from compiled_forest/ (shared page cache).
+# Reads /proc/<pid>/smaps_rollup, so it runs on Linux only.
+#
+# Usage: python benchmarks/bench_worker_memory.py [--workers 4] [--n-estimators 500]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+from bench_startup import _free_port, _get
+from run_benchmarks import SRC_DIR, served_model, synthetic_housing
+
+LAYOUTS = {
+    'sklearn pickle': {'SERVING_ENGINE': 'sklearn'},
+    'compiled, copied': {'SERVING_ENGINE': 'compiled', 'MODEL_MMAP': '0'},
+    'compiled, mmap': {'SERVING_ENGINE': 'compiled', 'MODEL_MMAP': '1'}
+}
+
+
+def smaps_rollup(pid):
+    # Values in MB. Pss splits shared pages between the processes mapping them.
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    }
+
+
+def worker_pids(parent_pid):
+    # uvicorn --workers spawns one child per worker (plus multiprocessing helpers)
+    pids = []
+    for task in Path(f'/proc/{parent_pid}/task').iterdir():
+        pids.extend(int(pid) for pid in (task / 'children').read_text().split())
+    return [pid for pid in pids if b'spawn_main' in Path(f'/proc/{pid}/cmdline').read_bytes()]
+
+
+def measure_layout(workdir, env_overrides, n_workers, rows, timeout_s=120.0):
+    port = _free_port()
+    env = dict(os.environ, STARTUP_IN_BACKGROUND='0', **env_overrides)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'serve:app', '--app-dir', str(SRC_DIR), '--port', str(port),
+         '--workers', str(n_workers), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        started = time.perf_counter()
+        while _get(f'http://127.0.0.1:{port}/health')[0] != 200 or len(worker_pids(process.pid)) < n_workers:
+            if time.perf_counter() - started > timeout_s:
+                raise RuntimeError('workers did not become ready')
+            time.sleep(0.1)
+        time.sleep(1.0)
+
+        # Exercise every worker so the pages of the model it actually uses are resident
+        payload = json.dumps({'rows': rows}).encode()
+        for _ in range(8 * n_workers):
+            request = urllib.request.Request(f'http://127.0.0.1:{port}/predict/batch', data=payload,
+                                             headers={'Content-Type': 'application/json'})
+            urllib.request.urlopen(request, timeout=30).read()
+        return [smaps_rollup(pid) for pid in worker_pids(process.pid)]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--n-estimators', type=int, default=500)
+    args = parser.parse_args()
+
+    X, y = synthetic_housing()
+    with tempfile.TemporaryDirectory(prefix='bench_memory_') as workdir, \
+            served_model(workdir, X, y, n_estimators=args.n_estimators) as (top_features, _):
+        rows = np.nan_to_num(X[top_features].to_numpy()[:1000]).tolist()
+        model_mb = sum(f.stat().st_size for f in (Path(workdir) / 'compiled_forest').iterdir()) / 2 ** 20
+        print(f'{args.n_estimators} trees, compiled node arrays {model_mb:.1f} MB, {args.workers} workers')
+        print('=' * 78)
+        print(f'{"layout":<18} {"RSS/worker":>11} {"PSS/worker":>11} {"private/worker":>15} {"total PSS":>11}')
+        for name, env_overrides in LAYOUTS.items():
+            workers = measure_layout(workdir, env_overrides, args.workers, rows)
+            rss = statistics.median(w['rss'] for w in workers)
+            pss = statistics.median(w['pss'] for w in workers)
+            private = statistics.median(w['private'] for w in workers)
+            total = sum(w['pss'] for w in workers)
+            print(f'{name:<18} {rss:>9.1f}MB {pss:>9.1f}MB {private:>13.1f}MB {total:>9.1f}MB')
+        print('=' * 78)
+
+
+if __name__ == '__main__':
+    main()
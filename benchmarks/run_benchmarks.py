@@ -0,0 +1,271 @@
+# Micro-benchmarks for the serving and training hot paths, run offline on a
+# synthetic dataset shaped like the house prices data.
+#
+# Usage:
+#   python benchmarks/run_benchmarks.py                           # run and print
+#   python benchmarks/run_benchmarks.py --save-baseline base.json # record a baseline
+#   python benchmarks/run_benchmarks.py --compare base.json       # exit 1 on a regression
+#   python benchmarks/run_benchmarks.py --only predict            # cases whose name contains 'predict'
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import pickle
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+
+SRC_DIR = Path(__file__).resolve().parents[1] / 'src'
+sys.path.insert(0, str(SRC_DIR))
+from data_prep import load_and_prepare_data, prepare_data
+from drift import DriftMonitor, build_reference_profile
+from explain import PathExplainer
+from feature_ranking import rank_features
+from forest_engine import COMPILED_FOREST_DIR, CompiledForest
+from model_index import load_model, resolve_active_model, write_manifest
+from prediction_log import PredictionLog
+
+BASELINE_FORMAT_VERSION = 1
+# A case regresses when its median exceeds the baseline median by this fraction
+DEFAULT_THRESHOLD = 0.25
+# ...and by at least this much in absolute terms, so microsecond jitter is not a regression
+DEFAULT_MIN_DELTA_MS = 0.05
+
+
+def synthetic_housing(n_rows=1460, n_features=36, missing_rate=0.02, seed=42):
+    # Same size as the OpenML house_prices numeric frame, with a few missing values
+    rng = np.random.RandomState(seed)
+    X = rng.lognormal(mean=3.0, sigma=0.8, size=(n_rows, n_features))
+    weights = rng.rand(n_features) * (rng.rand(n_features) < 0.4)
+    y = X @ weights * 1000 + rng.randn(n_rows) * 5000 + 150000
+    X[rng.rand(n_rows, n_features) < missing_rate] = np.nan
+    return pd.DataFrame(X, columns=[f'F{i}' for i in range(1, n_features + 1)]), pd.Series(y, name='target')
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    q1, _, q3 = statistics.quantiles(samples, n=4) if len(samples) > 1 else (samples[0],) * 3
+    return {
+        'n': len(samples),
+        'min_ms': samples[0] * 1e3,
+        'median_ms': statistics.median(samples) * 1e3,
+        'mean_ms': statistics.fmean(samples) * 1e3,
+        'stdev_ms': (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1e3,
+        'p95_ms': samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))] * 1e3,
+        'iqr_ms': (q3 - q1) * 1e3
+    }
+
+
+def measure(fn, warmup=3, repeat=20):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    # Returns [(name, baseline_ms, current_ms, change)] for every case that regressed
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        change = stats['median_ms'] / reference['median_ms'] - 1
+        if change > threshold and stats['median_ms'] - reference['median_ms'] > min_delta_ms:
+            regressions.append((name, reference['median_ms'], stats['median_ms'], change))
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+@contextlib.contextmanager
+def served_model(workdir, X, y, n_estimators=100):
+    # Train a model on the synthetic data and lay out its artifacts the way
+    # train.py does, so serve.py and model_index load it as in production
+    X_train, _, y_train, _, feature_names, preprocessor = prepare_data(X, y, return_preprocessor=True)
+    top_features = feature_names[:10]
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=42).fit(X_train[:, :10], y_train)
+    preprocessor = preprocessor.select(top_features)
+
+    workdir = Path(workdir)
+    with open(workdir / 'model.pkl', 'wb') as f:
+        pickle.dump(model, f)
+    preprocessing_path = preprocessor.save(workdir / 'preprocessing.json')
+    compiled_path = CompiledForest.from_sklearn(model, feature_names=top_features).save(workdir / COMPILED_FOREST_DIR)
+    with open(workdir / 'top_features.json', 'w') as f:
+        json.dump({'top_features': top_features, 'feature_names': {}}, f)
+    write_manifest(workdir / 'model_manifest.json', model_id='benchmark', run_id='benchmark',
+                   model_path=workdir / 'model.pkl', compiled_path=compiled_path, top_features=top_features,
+                   preprocessing_path=preprocessing_path, preprocessing_fingerprint=preprocessor.fingerprint)
+
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        yield top_features, preprocessor
+    finally:
+        os.chdir(previous)
+
+
+def load_serve():
+    spec = importlib.util.spec_from_file_location('serve', SRC_DIR / 'serve.py')
+    serve = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(serve)
+    return serve
+
+
+def build_cases(workdir, X, y, top_features, preprocessor):
+    from fastapi.testclient import TestClient
+
+    serve = load_serve()
+    # Importing serve.py loads nothing; run the startup the lifespan handler would
+    serve.startup()
+    client = TestClient(serve.app)
+    row = np.nan_to_num(X[top_features].to_numpy()[0]).tolist()
+    batch = np.nan_to_num(X[top_features].to_numpy()[:100]).tolist()
+    raw_1000 = X[top_features].to_numpy()[:1000]
+
+    csv_path = Path(workdir) / 'housing.csv'
+    X.assign(SalePrice=y).to_csv(csv_path, index=False)
+    os.environ['DATA_CACHE_DIR'] = str(Path(workdir) / 'data_cache')
+    X_rank = prepare_data(X, y)[0]
+    y_rank = y.to_numpy()[:len(X_rank)]
+    entry = resolve_active_model()
+
+    batch_1000 = np.nan_to_num(raw_1000)
+    batch_1000_json = {'rows': batch_1000.tolist()}
+    batch_1000_raw = batch_1000.astype('<f4').tobytes()
+    raw_headers = {'Content-Type': 'application/octet-stream', 'Accept': 'application/octet-stream'}
+
+    # Request-path cost of the prediction log; the flusher writes SQLite segments meanwhile
+    prediction_log = PredictionLog(Path(workdir) / 'prediction_log', capacity=10**7, flush_interval_s=0.1).start()
+    log_row = raw_1000[:1]
+    drift_monitor = DriftMonitor(build_reference_profile(batch_1000, top_features))
+
+    # Plain mean vs the per-tree matrix behind ?interval=, on the compiled engine and, for
+    # scale, the per-estimator loop it replaces
+    forest = CompiledForest.load(Path(workdir) / COMPILED_FOREST_DIR)
+    scaled_1000 = preprocessor.transform(batch_1000)
+    sklearn_model = load_model(entry, feature_names=top_features).model
+    explainer = PathExplainer(forest)
+
+    def post(path, payload):
+        response = client.post(path, json=payload)
+        response.raise_for_status()
+
+    def post_uncached(path, payload):
+        # Every row misses the explanation cache, as for fresh traffic
+        serve.explanation_cache.clear()
+        post(path, payload)
+
+    def post_raw(path, body, headers):
+        response = client.post(path, content=body, headers=headers)
+        response.raise_for_status()
+
+    # name: (callable, warmup, repeat)
+    return {
+        'predict_single_http': (lambda: post('/predict', {'features': row}), 5, 100),
+        'predict_batch_http_100': (lambda: post('/predict/batch', {'rows': batch}), 3, 30),
+        'predict_batch_http_1000_json': (lambda: post('/predict/batch', batch_1000_json), 3, 20),
+        'predict_batch_http_1000_float32': (lambda: post_raw('/predict/batch', batch_1000_raw, raw_headers), 3, 20),
+        'predict_single_http_interval': (lambda: post('/predict?interval=0.9', {'features': row}), 5, 100),
+        'predict_batch_http_1000_interval': (lambda: post('/predict/batch?interval=0.9', batch_1000_json), 3, 20),
+        'forest_predict_1000': (lambda: forest.predict(scaled_1000), 3, 30),
+        'forest_predict_interval_1000': (lambda: forest.predict_interval(scaled_1000), 3, 30),
+        'forest_predict_interval_1': (lambda: forest.predict_interval(scaled_1000[:1]), 10, 500),
+        'sklearn_per_tree_loop_1': (lambda: [tree.predict(scaled_1000[:1]) for tree in sklearn_model.estimators_], 3, 30),
+        'explain_http_single': (lambda: post_uncached('/explain', {'features': row}), 5, 100),
+        'explain_http_single_cached': (lambda: post('/explain', {'features': row}), 5, 100),
+        'explain_batch_http_1000': (lambda: post_uncached('/explain/batch', batch_1000_json), 3, 20),
+        'explain_batch_http_1000_cached': (lambda: post('/explain/batch', batch_1000_json), 3, 20),
+        'explainer_explain_1000': (lambda: explainer.explain(scaled_1000), 3, 30),
+        'explainer_build': (lambda: PathExplainer(forest), 1, 10),
+        'prediction_log_append_1': (lambda: prediction_log.log('bench', 'benchmark', '/predict', top_features, log_row,
+                                                               [1.0]), 100, 5000),
+        'prediction_log_append_1000': (lambda: prediction_log.log('bench', 'benchmark', '/predict/batch', top_features,
+                                                                  batch_1000, batch_1000[:, 0]), 10, 200),
+        'drift_observe_1': (lambda: drift_monitor.observe(log_row), 100, 5000),
+        'drift_observe_1000': (lambda: drift_monitor.observe(batch_1000), 10, 200),
+        'scaler_transform_1': (lambda: preprocessor.transform(raw_1000[:1]), 10, 500),
+        'scaler_transform_1000': (lambda: preprocessor.transform(raw_1000), 10, 200),
+        'model_load': (lambda: load_model(entry, feature_names=top_features), 1, 10),
+        'data_prep_cached_csv': (lambda: load_and_prepare_data(source=csv_path), 1, 10),
+        'feature_ranking_subsample': (lambda: rank_features(X_rank, y_rank, list(X.columns), method='subsample'), 1, 3),
+        'feature_ranking_full': (lambda: rank_features(X_rank, y_rank, list(X.columns), method='full'), 0, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--only', help='Only run cases whose name contains this text')
+    parser.add_argument('--repeat-scale', type=float, default=1.0, help='Multiply every case repeat count')
+    parser.add_argument('--save-baseline', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON to compare against; exits 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed relative slowdown of the median before failing')
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help='Ignore slowdowns smaller than this many milliseconds')
+    args = parser.parse_args()
+
+    X, y = synthetic_housing()
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='benchmarks_') as workdir, \
+            served_model(workdir, X, y) as (top_features, preprocessor), \
+            contextlib.redirect_stdout(sys.stderr):
+        # Model and data loading chatter goes to stderr; the report stays on stdout
+        cases = build_cases(workdir, X, y, top_features, preprocessor)
+        for name, (fn, warmup, repeat) in cases.items():
+            if args.only and args.only not in name:
+                continue
+            results[name] = measure(fn, warmup=warmup, repeat=max(1, int(repeat * args.repeat_scale)))
+
+    print('=' * 82)
+    print(f'{"case":<32} {"n":>4} {"median ms":>11} {"mean ms":>10} {"stdev":>9} {"p95 ms":>10}')
+    for name, stats in results.items():
+        print(f'{name:<32} {stats["n"]:>4} {stats["median_ms"]:>11.3f} {stats["mean_ms"]:>10.3f} '
+              f'{stats["stdev_ms"]:>9.3f} {stats["p95_ms"]:>10.3f}')
+    print('=' * 82)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'format_version': BASELINE_FORMAT_VERSION, 'environment': environment(), 'results': results},
+                      f, indent=2)
+        print(f'Saved baseline to {args.save_baseline}')
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != environment():
+            print('Warning: baseline was recorded in a different environment; timings may not be comparable')
+        regressions = compare_to_baseline(results, baseline, threshold=args.threshold,
+                                          min_delta_ms=args.min_delta_ms)
+        for name, before, after, change in regressions:
+            print(f'REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms (+{change:.0%})')
+        if regressions:
+            sys.exit(1)
+        print(f'No regression above {args.threshold:.0%} against {args.compare}')
+
+
+if __name__ == '__main__':
+    main()
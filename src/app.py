@@ -1,24 +1,93 @@
 import streamlit as st
 import requests
 import json
+import os
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# In docker-compose the API is another container: API_URL=http://api:8000
+API_URL = os.environ.get('API_URL', 'http://localhost:8000').rstrip('/')
+REQUEST_TIMEOUT_S = 10
+
+# Default what-if sweep bounds, roughly the 1st-99th percentile of the Ames training data
+SWEEP_RANGES = {
+    'OverallQual': (1, 10),
+    'GrLivArea': (700, 3200),
+    'TotalBsmtSF': (0, 2200),
+    '2ndFlrSF': (0, 1400),
+    'BsmtFinSF1': (0, 1600),
+    '1stFlrSF': (500, 2300),
+    'LotArea': (1500, 40000),
+    'GarageArea': (0, 1000),
+    'YearBuilt': (1880, 2010),
+    'GarageCars': (0, 4)
+}
+INTEGER_FEATURES = {'OverallQual', 'YearBuilt', 'GarageCars'}
+
 st.set_page_config(page_title='Predição de Preços', layout='wide')
 
 st.title('PREDIÇÃO DE PREÇO DE IMÓVEL')
 st.markdown('Insira as caracteristicas do imovel para obter uma previsão de preço')
 
-# Load top features from configuration
-top_features = []
-feature_names_map = {}
-config_paths = [Path('../top_features.json'), Path('top_features.json')]
-for config_path in config_paths:
-    if config_path.exists():
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-            top_features = config.get('top_features', [])
-            feature_names_map = config.get('feature_names', {})
-        break
+# Load top features from configuration. Streamlit re-runs this script on every
+# interaction, so the file is read once per process and cached.
+@st.cache_data(ttl=60)
+def load_feature_config():
+    config_paths = [Path('../top_features.json'), Path('top_features.json')]
+    for config_path in config_paths:
+        if config_path.exists():
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+            return config.get('top_features', []), config.get('feature_names', {})
+    return [], {}
+
+# One keep-alive session per Streamlit process, shared by every rerun and browser
+# tab, instead of a new TCP connection per click
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=None)
+    session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=retries))
+    session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=10, max_retries=retries))
+    return session
+
+
+# Per-feature contributions to one prediction from /explain, as a Series indexed by the
+# Portuguese names and sorted by magnitude, plus the base value they start from
+def explain_prediction(features):
+    response = get_session().post(f'{API_URL}/explain', json={'features': features}, timeout=REQUEST_TIMEOUT_S)
+    response.raise_for_status()
+    result = response.json()
+    contributions = pd.Series(result['contributions'], index=result['feature_names'], name='Contribuicao (R$)')
+    return result['base_value'], contributions.reindex(contributions.abs().sort_values(ascending=False).index)
+
+
+def sweep_grid(feature_key, low, high, n_points):
+    grid = np.linspace(low, high, n_points)
+    if feature_key in INTEGER_FEATURES:
+        return tuple(int(v) for v in np.unique(np.round(grid)))
+    return tuple(float(v) for v in grid)
+
+
+# The whole grid goes to /predict/batch in one call; identical sweeps are served
+# from the cache until the TTL expires (a retrained model shows up within a minute)
+@st.cache_data(ttl=60, max_entries=256, show_spinner=False)
+def predict_sweep(base_row, feature_index, grid):
+    rows = []
+    for value in grid:
+        row = list(base_row)
+        row[feature_index] = value
+        rows.append(row)
+    response = get_session().post(f'{API_URL}/predict/batch', json={'rows': rows}, timeout=REQUEST_TIMEOUT_S)
+    response.raise_for_status()
+    return response.json()['predictions']
+
+
+top_features, feature_names_map = load_feature_config()
 
 if not top_features:
     st.error('Configuracao de features nao encontrada. Execute o treinamento do modelo primeiro!')
@@ -78,7 +147,7 @@ with col2:
     if st.button('Gerar Previsao', use_container_width=True):
         input_data = {'features': [feature_values[i] for i in range(len(top_features))]}
         try:
-            response = requests.post('http://localhost:8000/predict', json=input_data)
+            response = get_session().post(f'{API_URL}/predict', json=input_data, timeout=REQUEST_TIMEOUT_S)
             if response.status_code == 200:
                 result = response.json()
                 if 'error' in result:
@@ -97,7 +166,52 @@ with col2:
                                 'Valor': f'{feature_values[i]:.2f}' if not isinstance(feature_values[i], int) else str(feature_values[i])
                             })
                         st.table(summary_data)
+
+                    # Explanation failures should not hide the prediction itself
+                    try:
+                        base_value, contributions = explain_prediction(input_data['features'])
+                        with st.expander('Por que este preco?', expanded=True):
+                            st.markdown(f'Preco medio de partida: **R$ {base_value:,.2f}**. Cada barra mostra '
+                                        'quanto o atributo somou ou subtraiu para chegar ao preco estimado.')
+                            st.bar_chart(contributions)
+                    except Exception as e:
+                        st.warning(f'Explicacao indisponivel: {e}')
             else:
                 st.error(f'Erro no servidor: {response.status_code}')
         except Exception as e:
-            st.error(f'Erro de conexao com a API: {e}')
\ No newline at end of file
+            st.error(f'Erro de conexao com a API: {e}')
+
+# What-if panel: price as one feature sweeps its range, the others fixed at the inputs above
+st.markdown('---')
+st.subheader('Analise de Sensibilidade (what-if)')
+
+sweep_col, range_col = st.columns([1, 2])
+sweep_index = sweep_col.selectbox(
+    'Atributo variado',
+    options=list(range(len(top_features))),
+    format_func=lambda i: feature_names_map.get(top_features[i], top_features[i]),
+    key='sweep_feature'
+)
+sweep_key = top_features[sweep_index]
+sweep_name = feature_names_map.get(sweep_key, sweep_key)
+default_low, default_high = SWEEP_RANGES.get(sweep_key, (0.0, max(2.0 * float(feature_values[sweep_index]), 1000.0)))
+low_col, high_col, points_col = range_col.columns(3)
+sweep_low = low_col.number_input('De', value=float(default_low), key=f'sweep_low_{sweep_key}')
+sweep_high = high_col.number_input('Ate', value=float(default_high), key=f'sweep_high_{sweep_key}')
+sweep_points = points_col.slider('Pontos', min_value=5, max_value=100, value=25, key='sweep_points')
+
+if sweep_high <= sweep_low:
+    st.warning('O limite superior deve ser maior que o inferior')
+else:
+    grid = sweep_grid(sweep_key, sweep_low, sweep_high, sweep_points)
+    base_row = tuple(feature_values[i] for i in range(len(top_features)))
+    try:
+        predictions = predict_sweep(base_row, sweep_index, grid)
+        curve = pd.DataFrame({sweep_name: grid, 'Preco Estimado': predictions}).set_index(sweep_name)
+        st.line_chart(curve)
+        valid = curve['Preco Estimado'].dropna()
+        if not valid.empty:
+            st.caption(f'{sweep_name} de {grid[0]:,} a {grid[-1]:,}: preco entre R$ {valid.min():,.2f} '
+                       f'e R$ {valid.max():,.2f} ({len(grid)} pontos em uma unica chamada a /predict/batch)')
+    except Exception as e:
+        st.error(f'Erro ao calcular a curva de sensibilidade: {e}')
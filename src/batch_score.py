@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from model_index import SEARCH_ROOTS, load_model, resolve_active_model
+
+# Offline scoring of large CSV/Parquet exports with the model serve.py would load.
+# The input is streamed in fixed-size chunks and predictions are appended to the
+# output as soon as they are ready, so memory stays bounded by
+# chunk_size * (in-flight chunks) whatever the file size.
+
+DEFAULT_CHUNK_SIZE = 100_000
+PREDICTION_COLUMN = 'prediction'
+
+# Loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _read_top_features(roots=SEARCH_ROOTS):
+    for root in roots:
+        config_path = Path(root) / 'top_features.json'
+        if config_path.exists():
+            with open(config_path, 'r') as f:
+                return json.load(f).get('top_features', [])
+    return []
+
+
+def _is_parquet(path):
+    return Path(path).suffix in ('.parquet', '.pq')
+
+
+def iter_chunks(path, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Yields DataFrames of at most chunk_size rows holding only `columns`
+    if _is_parquet(path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError('Reading Parquet requires pyarrow (pip install pyarrow)')
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def _input_columns(path):
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+class _OutputWriter:
+    # Appends scored chunks to a CSV or Parquet file, writing the header/schema once
+    def __init__(self, path):
+        self.path = Path(path)
+        self._parquet_writer = None
+        self._started = False
+
+    def write(self, frame):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='a' if self._started else 'w', header=not self._started, index=False)
+        self._started = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def _init_worker(entry, engine, feature_names):
+    global _worker_model
+    _worker_model = load_model(entry, engine=engine, feature_names=feature_names)
+
+
+def _score(features, current=None):
+    # Same transform + predict as serve.py, except that missing values are imputed
+    # with the training means instead of being rejected
+    current = current or _worker_model
+    if current.scaler is not None:
+        features = current.scaler.transform(features)
+    return np.asarray(current.model.predict(features), dtype=float)
+
+
+def score_file(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, n_workers=None, engine='sklearn',
+               id_column='Id', roots=SEARCH_ROOTS, log_every_s=5.0):
+    entry = resolve_active_model(roots)
+    if entry is None:
+        raise RuntimeError('No model could be resolved from the model index')
+    top_features = entry.get('top_features') or _read_top_features(roots)
+    if not top_features:
+        raise RuntimeError('Feature configuration not loaded (top_features.json)')
+
+    available = _input_columns(input_path)
+    missing = [name for name in top_features if name not in available]
+    if missing:
+        raise ValueError(f'{input_path} is missing feature columns {missing}')
+    passthrough = [id_column] if id_column and id_column in available else []
+
+    n_workers = n_workers if n_workers is not None else (os.cpu_count() or 1)
+    writer = _OutputWriter(output_path)
+    rows = 0
+    started = last_log = time.perf_counter()
+
+    def emit(chunk, predictions):
+        nonlocal rows, last_log
+        out = chunk[passthrough].reset_index(drop=True)
+        out[PREDICTION_COLUMN] = predictions
+        writer.write(out)
+        rows += len(out)
+        now = time.perf_counter()
+        if now - last_log >= log_every_s:
+            print(f'Scored {rows:,} rows ({rows / (now - started):,.0f} rows/s)')
+            last_log = now
+
+    chunks = iter_chunks(input_path, passthrough + list(top_features), chunk_size=chunk_size)
+    try:
+        if n_workers <= 1:
+            current = load_model(entry, engine=engine, feature_names=top_features)
+            for chunk in chunks:
+                emit(chunk, _score(chunk[top_features].to_numpy(dtype=np.float64), current))
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(entry, engine, top_features)) as pool:
+                # At most 2 chunks per worker in flight; results are written in input order
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(_score, chunk[top_features].to_numpy(dtype=np.float64))))
+                    if len(pending) >= 2 * n_workers:
+                        done_chunk, future = pending.popleft()
+                        emit(done_chunk, future.result())
+                while pending:
+                    done_chunk, future = pending.popleft()
+                    emit(done_chunk, future.result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else float('inf')
+    print(f'Scored {rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s) -> {output_path}')
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rate}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a CSV/Parquet file with the active model')
+    parser.add_argument('input', help='CSV or Parquet file with the top_features columns')
+    parser.add_argument('output', help='CSV or Parquet file to write predictions to')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows read per chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all CPUs, 1 = in-process)')
+    parser.add_argument('--engine', choices=('sklearn', 'compiled'), default=os.environ.get('SERVING_ENGINE', 'sklearn'))
+    parser.add_argument('--id-column', default='Id', help='Input column copied to the output next to the prediction')
+    args = parser.parse_args()
+
+    try:
+        score_file(args.input, args.output, chunk_size=args.chunk_size, n_workers=args.workers, engine=args.engine,
+                   id_column=args.id_column)
+    except Exception as e:
+        print(f'Batch scoring failed: {e}')
+        sys.exit(1)
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import numpy as np
+
+
+# Coalesces concurrent single-row predictions into one vectorized call: rows
+# submitted within `max_wait_s` of the first queued row (or until
+# `max_batch_size` rows are waiting) are stacked and passed to `predict_fn` in a
+# worker thread, and each caller gets back its own prediction.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_s=0.002, on_batch=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_s))
+        # on_batch(batch_size, queue_depth, wait_seconds) is called after every flush
+        self.on_batch = on_batch
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._task = None
+        self._loop = None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        # (Re)bind to the running loop, e.g. a new event loop after a server restart
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    async def submit(self, row):
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((np.asarray(row, dtype=float), future, time.perf_counter()))
+        return await future
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _collect(self):
+        items = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(items) < self.max_batch_size:
+            # Drain whatever is already queued before waiting on the clock
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            # A failing batch only fails its own callers; the loop keeps serving later submits
+            try:
+                await self._process(items)
+            except Exception as e:
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _process(self, items):
+        started = time.perf_counter()
+        batch = np.vstack([row for row, _, _ in items])
+        predictions = np.asarray(await asyncio.to_thread(self.predict_fn, batch), dtype=float).reshape(-1)
+        if len(predictions) != len(items):
+            raise ValueError(f'predict_fn returned {len(predictions)} predictions for {len(items)} rows')
+        for (_, future, _), value in zip(items, predictions):
+            if not future.done():
+                future.set_result(float(value))
+
+        self.batches += 1
+        self.rows += len(items)
+        if self.on_batch is not None:
+            try:
+                self.on_batch(len(items), self.queue_depth, [started - queued for _, _, queued in items])
+            except Exception as e:
+                print(f'Warning: micro-batch callback failed: {e}')
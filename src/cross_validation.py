@@ -0,0 +1,95 @@
+import os
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, mean_squared_error, r2_score
+from sklearn.model_selection import KFold
+
+from shared_arrays import arrays as _shared, map_shared, shared_directory
+
+METRICS = ('mse', 'r2', 'mae', 'mape')
+
+
+def fold_assignments(n_rows, n_splits=5, n_repeats=1, random_state=42):
+    # (n_repeats, n_rows) array with the test fold of every row in every repetition;
+    # workers receive (repeat, fold) and derive their rows from it, so no index lists are pickled
+    folds = np.empty((n_repeats, n_rows), dtype=np.int8)
+    for repeat in range(n_repeats):
+        splitter = KFold(n_splits=n_splits, shuffle=True, random_state=random_state + repeat)
+        for fold, (_, test_index) in enumerate(splitter.split(np.empty((n_rows, 1)))):
+            folds[repeat, test_index] = fold
+    return folds
+
+
+def _evaluate_fold(task, params, random_state=42):
+    repeat, fold = task
+    started, cpu_started = time.perf_counter(), time.process_time()
+    test_mask = np.asarray(_shared['folds'][repeat]) == fold
+    X, y = _shared['X'], _shared['y']
+    # One core per fold: the parallelism comes from the pool
+    model = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    model.fit(X[~test_mask], y[~test_mask])
+    y_test = y[test_mask]
+    y_pred = model.predict(X[test_mask])
+    metrics = {
+        'mse': mean_squared_error(y_test, y_pred),
+        'r2': r2_score(y_test, y_pred),
+        'mae': mean_absolute_error(y_test, y_pred),
+        'mape': mean_absolute_percentage_error(y_test, y_pred),
+        'fit_seconds': time.perf_counter() - started,
+        # Unlike wall time, not inflated when folds share cores; their sum estimates a serial run
+        'cpu_seconds': time.process_time() - cpu_started
+    }
+    return {'repeat': repeat, 'fold': fold, 'rows': int(test_mask.sum()),
+            **{name: float(value) for name, value in metrics.items()}}
+
+
+def _run_folds(shared_dir, tasks, params, n_workers, random_state):
+    return map_shared(_evaluate_fold, shared_dir, n_workers, tasks, [params] * len(tasks), [random_state] * len(tasks))
+
+
+def summarize_folds(folds):
+    summary = {}
+    for name in METRICS:
+        values = np.array([fold[name] for fold in folds])
+        summary[f'cv_{name}_mean'] = float(values.mean())
+        summary[f'cv_{name}_std'] = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    return summary
+
+
+def cross_validate(X, y, params, n_splits=5, n_repeats=1, n_workers=None, random_state=42, measure_serial=False):
+    # (Repeated) k-fold evaluation of one forest configuration, one fold per worker
+    # process. Returns (per-fold results, summary) where the summary holds the mean
+    # and std of every metric, the wall time and the speedup over serial execution:
+    # measured when measure_serial is set, otherwise estimated from the summed fold CPU times.
+    n_workers = min(n_workers or os.cpu_count() or 1, n_splits * n_repeats)
+    tasks = [(repeat, fold) for repeat in range(n_repeats) for fold in range(n_splits)]
+    with shared_directory('cross_validation_', X=np.asarray(X, dtype=np.float64), y=np.asarray(y, dtype=np.float64),
+                          folds=fold_assignments(len(X), n_splits, n_repeats, random_state)) as shared_dir:
+        started = time.perf_counter()
+        folds = _run_folds(shared_dir, tasks, params, n_workers, random_state)
+        wall_seconds = time.perf_counter() - started
+        serial_seconds = sum(fold['cpu_seconds'] for fold in folds)
+        if measure_serial and n_workers > 1:
+            started = time.perf_counter()
+            _run_folds(shared_dir, tasks, params, 1, random_state)
+            serial_seconds = time.perf_counter() - started
+
+    summary = summarize_folds(folds)
+    summary.update({
+        'cv_folds': n_splits,
+        'cv_repeats': n_repeats,
+        'cv_workers': n_workers,
+        'cv_wall_seconds': wall_seconds,
+        'cv_serial_seconds': serial_seconds,
+        'cv_serial_measured': int(measure_serial and n_workers > 1),
+        'cv_speedup': serial_seconds / wall_seconds if wall_seconds > 0 else float('nan')
+    })
+    return folds, summary
+
+
+def log_cv_results(mlflow, folds):
+    # Per-fold metrics as steps of cv_fold_* in the current run, one batched call per fold
+    for step, fold in enumerate(folds):
+        mlflow.log_metrics({f'cv_fold_{name}': fold[name] for name in (*METRICS, 'fit_seconds')}, step=step)
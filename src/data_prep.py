@@ -1,25 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 from sklearn.datasets import fetch_openml, load_breast_cancer
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 
-def load_and_prepare_data(test_size=0.2, random_state=42, descr:bool=False, selected_features=None):
-    # Load the housing dataset from OpenML
-    housing = fetch_openml(name='house_prices', as_frame=True)
-    if descr == True:
-        print('\n\tDataset Description:')
-        print(housing.DESCR)
+from preprocessing import Preprocessor
+
+OPENML_DATASET = 'house_prices'
+# Target column when reading a local CSV/Parquet export instead of OpenML
+TARGET_COLUMN = 'SalePrice'
+DATA_CACHE_FORMAT_VERSION = 1
+
+def _data_cache_dir():
+    return Path(os.environ.get('DATA_CACHE_DIR', '.data_cache'))
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-    X = pd.DataFrame(housing.data, columns=housing.feature_names)
-    y = pd.Series(housing.target, name='target')
+def _fetch_source(source=None):
+    # Raw feature frame, target and description from OpenML or a local CSV/Parquet file
+    if source is None:
+        housing = fetch_openml(name=OPENML_DATASET, as_frame=True)
+        X = pd.DataFrame(housing.data, columns=housing.feature_names)
+        y = pd.Series(housing.target, name='target')
+        return X, y, housing.DESCR
 
+    source = Path(source)
+    frame = pd.read_parquet(source) if source.suffix in ('.parquet', '.pq') else pd.read_csv(source)
+    y = pd.Series(frame.pop(TARGET_COLUMN).values, name='target')
+    return frame, y, f'Local dataset {source.name}'
+
+def _clean_frame(X):
     # Remove 'Id' column if it exists
     if 'Id' in X.columns:
         X = X.drop(columns=['Id'])
-    
+
     # Select only numeric columns
-    X = X.select_dtypes(include=['number'])
-    
+    return X.select_dtypes(include=['number'])
+
+def _write_cache_entry(cache_dir, X, y, descr, source_key):
+    numeric = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+    target = np.ascontiguousarray(y.to_numpy(dtype=np.float64))
+
+    # Content-addressed: the entry directory is named after the cached arrays themselves
+    digest = hashlib.sha256(numeric.tobytes() + target.tobytes() + json.dumps(list(X.columns)).encode()).hexdigest()
+    entry_dir = cache_dir / digest
+    if not entry_dir.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=cache_dir, prefix='.tmp-'))
+        np.save(tmp_dir / 'numeric.npy', numeric)
+        np.save(tmp_dir / 'target.npy', target)
+        meta = {
+            'format_version': DATA_CACHE_FORMAT_VERSION,
+            'source': source_key,
+            'columns': list(X.columns),
+            'descr': descr,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sha256': {name: _sha256(tmp_dir / name) for name in ('numeric.npy', 'target.npy')}
+        }
+        with open(tmp_dir / 'meta.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another process cached the same content first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    index_path = cache_dir / 'index.json'
+    index = json.loads(index_path.read_text()) if index_path.exists() else {}
+    index[source_key] = digest
+    tmp_index = index_path.with_suffix('.json.tmp')
+    tmp_index.write_text(json.dumps(index, indent=2))
+    os.replace(tmp_index, index_path)
+    return entry_dir
+
+def _read_cache_entry(entry_dir, mmap=False, verify=True):
+    with open(entry_dir / 'meta.json', 'r') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != DATA_CACHE_FORMAT_VERSION:
+        raise ValueError(f'unsupported cache format {meta.get("format_version")}')
+    if verify:
+        for name, expected in meta['sha256'].items():
+            if _sha256(entry_dir / name) != expected:
+                raise ValueError(f'checksum mismatch for {entry_dir / name}')
+
+    mmap_mode = 'r' if mmap else None
+    numeric = np.load(entry_dir / 'numeric.npy', mmap_mode=mmap_mode)
+    target = np.load(entry_dir / 'target.npy', mmap_mode=mmap_mode)
+    X = pd.DataFrame(numeric, columns=meta['columns'], copy=False)
+    y = pd.Series(target, name='target', copy=False)
+    return X, y, meta['descr']
+
+def load_dataset(source=None, use_cache=True, mmap=False, verify=True, refresh=False):
+    # Cleaned numeric frame and target, served from the local cache when possible.
+    # Local files are keyed on their content, so editing the file invalidates the entry.
+    source = source if source is not None else os.environ.get('DATA_SOURCE')
+    if not use_cache:
+        X, y, descr = _fetch_source(source)
+        return _clean_frame(X), y, descr
+
+    cache_dir = _data_cache_dir()
+    source_key = f'file:{_sha256(source)}' if source is not None else f'openml:{OPENML_DATASET}'
+    index_path = cache_dir / 'index.json'
+    if not refresh and index_path.exists():
+        digest = json.loads(index_path.read_text()).get(source_key)
+        if digest is not None and (cache_dir / digest).exists():
+            try:
+                return _read_cache_entry(cache_dir / digest, mmap=mmap, verify=verify)
+            except Exception as e:
+                print(f'Warning: discarding dataset cache entry {digest}: {e}')
+                shutil.rmtree(cache_dir / digest, ignore_errors=True)
+
+    X, y, descr = _fetch_source(source)
+    X = _clean_frame(X)
+    entry_dir = _write_cache_entry(cache_dir, X, y, descr, source_key)
+    return _read_cache_entry(entry_dir, mmap=mmap, verify=False)
+
+def prepare_data(X, y, test_size=0.2, random_state=42, selected_features=None, return_preprocessor=False):
     # Select specific features if provided, otherwise use all
     if selected_features is not None:
         X = X[selected_features]
@@ -27,7 +136,8 @@ def load_and_prepare_data(test_size=0.2, random_state=42, descr:bool=False, sele
     feature_names = X.columns.tolist()
     
     # Handle missing values
-    X = X.fillna(X.mean())
+    fill_values = X.mean()
+    X = X.fillna(fill_values)
 
     # Split the data into training and testing sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=random_state)
@@ -37,8 +147,24 @@ def load_and_prepare_data(test_size=0.2, random_state=42, descr:bool=False, sele
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
 
+    if return_preprocessor:
+        # The fitted imputation + scaling, so serving applies exactly the training transform
+        preprocessor = Preprocessor.from_fitted(feature_names, fill_values.values, scaler)
+        return X_train_scaled, X_test_scaled, y_train.values, y_test.values, feature_names, preprocessor
+
     return X_train_scaled, X_test_scaled, y_train.values, y_test.values, feature_names
 
+def load_and_prepare_data(test_size=0.2, random_state=42, descr:bool=False, selected_features=None, return_preprocessor=False,
+                          source=None, use_cache=True, mmap=False):
+    # Load the housing dataset (OpenML or a local export, through the on-disk cache)
+    X, y, description = load_dataset(source=source, use_cache=use_cache, mmap=mmap)
+    if descr == True:
+        print('\n\tDataset Description:')
+        print(description)
+
+    return prepare_data(X, y, test_size=test_size, random_state=random_state,
+                        selected_features=selected_features, return_preprocessor=return_preprocessor)
+
 if __name__ == '__main__':
     X_train, X_test, y_train, y_test, feature_names = load_and_prepare_data(descr=True)
     print('=' * 50)
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Written by train.py next to top_features.json and read by serve.py
+DRIFT_PROFILE_FILE = 'drift_profile.json'
+DRIFT_PROFILE_FORMAT_VERSION = 1
+# Floor for empty bins, so PSI stays finite when live traffic misses a bin entirely
+_PSI_EPSILON = 1e-4
+
+
+def build_reference_profile(X, feature_names, n_bins=20):
+    # Per-feature histogram of the training inputs (raw, unscaled values, as /predict receives
+    # them) over quantile bins. Edges are observed values, so discrete features such as
+    # OverallQual get at most one bin per value.
+    X = np.asarray(X, dtype=np.float64)
+    features = []
+    for j, name in enumerate(feature_names):
+        column = X[:, j][np.isfinite(X[:, j])]
+        quantiles = np.quantile(column, np.linspace(0, 1, n_bins + 1)[1:-1], method='lower')
+        edges = np.unique(quantiles)
+        counts = np.bincount(np.searchsorted(edges, column, side='right'), minlength=len(edges) + 1)
+        features.append({
+            'name': name,
+            'edges': edges.tolist(),
+            'proportions': (counts / max(len(column), 1)).tolist(),
+            'min': float(column.min()),
+            'max': float(column.max())
+        })
+    return {'format_version': DRIFT_PROFILE_FORMAT_VERSION, 'n_rows': int(len(X)), 'features': features}
+
+
+def save_profile(profile, path=DRIFT_PROFILE_FILE):
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    return Path(path)
+
+
+def load_profile(path):
+    with open(path, 'r') as f:
+        profile = json.load(f)
+    if profile.get('format_version') != DRIFT_PROFILE_FORMAT_VERSION:
+        raise ValueError(f'Unsupported drift profile format {profile.get("format_version")} in {path}')
+    return profile
+
+
+def psi(live, reference):
+    live = np.maximum(live, _PSI_EPSILON)
+    reference = np.maximum(reference, _PSI_EPSILON)
+    return float(np.sum((live - reference) * np.log(live / reference)))
+
+
+def binned_ks(live, reference):
+    # Largest gap between the two CDFs at the bin edges
+    return float(np.max(np.abs(np.cumsum(live) - np.cumsum(reference))))
+
+
+# Live histograms of the served inputs on the reference bins, kept for the current and
+# the previous time window (constant memory whatever the traffic). Each update is one
+# vectorized comparison against a padded (features, edges) matrix plus one bincount,
+# independent of how many rows were seen before.
+class DriftMonitor:
+    def __init__(self, profile, window_s=3600.0, min_rows=100):
+        self.feature_names = [feature['name'] for feature in profile['features']]
+        self.window_s = float(window_s)
+        self.min_rows = int(min_rows)
+        self.rows_observed = 0
+
+        n_features = len(self.feature_names)
+        self._n_bins = max(len(feature['edges']) for feature in profile['features']) + 1
+        self._edges = np.full((n_features, self._n_bins - 1), np.inf)
+        self._reference = np.zeros((n_features, self._n_bins))
+        for j, feature in enumerate(profile['features']):
+            self._edges[j, :len(feature['edges'])] = feature['edges']
+            self._reference[j, :len(feature['proportions'])] = feature['proportions']
+        self._min = np.array([feature['min'] for feature in profile['features']])
+        self._max = np.array([feature['max'] for feature in profile['features']])
+        self._offsets = np.arange(n_features) * self._n_bins
+
+        self._current = np.zeros(n_features * self._n_bins, dtype=np.int64)
+        self._previous = np.zeros_like(self._current)
+        self._current_out_of_range = np.zeros(n_features, dtype=np.int64)
+        self._previous_out_of_range = np.zeros_like(self._current_out_of_range)
+        self._window_started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def observe(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # Bin index = number of edges <= value (padding edges are +inf)
+        bins = (self._edges[None, :, :] <= X[:, :, None]).sum(axis=2)
+        flat = np.bincount((bins + self._offsets).ravel(), minlength=len(self._current))
+        out_of_range = ((X < self._min) | (X > self._max)).sum(axis=0)
+        with self._lock:
+            self._rotate()
+            self._current += flat
+            self._current_out_of_range += out_of_range
+            self.rows_observed += len(X)
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._window_started < self.window_s:
+            return
+        # A window with no traffic at all leaves nothing to compare against
+        if now - self._window_started >= 2 * self.window_s:
+            self._previous[:] = 0
+            self._previous_out_of_range[:] = 0
+        else:
+            self._previous[:] = self._current
+            self._previous_out_of_range[:] = self._current_out_of_range
+        self._current[:] = 0
+        self._current_out_of_range[:] = 0
+        self._window_started = now
+
+    def scores(self):
+        # {feature: {'psi', 'ks', 'out_of_range', 'rows'}} over the previous + current window;
+        # PSI/KS are NaN until min_rows rows have been seen
+        with self._lock:
+            self._rotate()
+            counts = (self._current + self._previous).reshape(len(self.feature_names), self._n_bins)
+            out_of_range = self._current_out_of_range + self._previous_out_of_range
+        result = {}
+        for j, name in enumerate(self.feature_names):
+            rows = int(counts[j].sum())
+            live = counts[j] / rows if rows else counts[j].astype(float)
+            enough = rows >= self.min_rows
+            result[name] = {
+                'psi': psi(live, self._reference[j]) if enough else float('nan'),
+                'ks': binned_ks(live, self._reference[j]) if enough else float('nan'),
+                'out_of_range': out_of_range[j] / rows if rows else 0.0,
+                'rows': rows
+            }
+        return result
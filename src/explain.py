@@ -0,0 +1,46 @@
+import numpy as np
+
+
+# Path-based per-feature contributions of a CompiledForest (the Saabas method): walking
+# from a tree's root to a leaf, every split changes the node value (the mean target of
+# the node), and that change is credited to the split feature. The per-feature sums are
+# computed once for every leaf when the explainer is built, so explaining a row is the
+# usual traversal plus one table lookup per (row, tree), and
+#   prediction == bias + contributions.sum(axis=1)
+class PathExplainer:
+    def __init__(self, forest):
+        self.forest = forest
+        value = np.asarray(forest.value, dtype=np.float64)
+        is_leaf = forest.is_leaf
+        feature = np.asarray(forest.feature, dtype=np.intp)
+
+        # Running per-feature sums from the root, filled one tree level at a time
+        path = np.zeros((forest.n_nodes, forest.n_features))
+        frontier = np.asarray(forest.roots, dtype=np.intp)
+        while frontier.size:
+            frontier = frontier[~is_leaf[frontier]]
+            children = []
+            for child in (forest.left[frontier], forest.right[frontier]):
+                child = np.asarray(child, dtype=np.intp)
+                path[child] = path[frontier]
+                path[child, feature[frontier]] += value[child] - value[frontier]
+                children.append(child)
+            frontier = np.concatenate(children)
+
+        # leaves() only ever returns leaf ids, so only their rows are kept
+        leaf_ids = np.flatnonzero(is_leaf)
+        self._leaf_row = np.full(forest.n_nodes, -1, dtype=np.intp)
+        self._leaf_row[leaf_ids] = np.arange(len(leaf_ids))
+        self._table = path[leaf_ids]
+        # Mean training target: the prediction before any split
+        self.bias = float(value.take(np.asarray(forest.roots, dtype=np.intp)).mean())
+
+    @property
+    def nbytes(self):
+        return self._table.nbytes + self._leaf_row.nbytes
+
+    def explain(self, X):
+        # Returns (predictions, contributions) with shapes (n_samples,) and (n_samples, n_features)
+        rows = self._leaf_row.take(self.forest.leaves(X))
+        contributions = self._table[rows].mean(axis=1)
+        return self.bias + contributions.sum(axis=1), contributions
@@ -0,0 +1,97 @@
+import numpy as np
+from scipy.stats import spearmanr
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.inspection import permutation_importance
+
+# 'full' is the original 500-tree forest; the others trade selection quality for speed
+RANKING_METHODS = ('full', 'subsample', 'hgb', 'incremental')
+
+
+def _sorted_ranking(feature_names, scores):
+    return sorted(zip(feature_names, (float(s) for s in scores)), key=lambda x: x[1], reverse=True)
+
+
+def _top_k(ranking, top_k):
+    return [name for name, _ in ranking[:top_k]]
+
+
+def _full_forest(random_state, **params):
+    return RandomForestRegressor(
+        bootstrap=True,
+        max_depth=50,
+        n_jobs=-1,
+        random_state=random_state,
+        **params
+    )
+
+
+def _rank_full(X, y, feature_names, random_state=42):
+    model = _full_forest(random_state, n_estimators=500)
+    model.fit(X=X, y=y)
+    return _sorted_ranking(feature_names, model.feature_importances_), {'n_estimators': 500}
+
+
+def _rank_subsample(X, y, feature_names, random_state=42, max_samples=0.25, n_estimators=200):
+    # Every tree sees a bootstrap sample of only max_samples of the rows
+    model = _full_forest(random_state, n_estimators=n_estimators, max_samples=max_samples)
+    model.fit(X=X, y=y)
+    return _sorted_ranking(feature_names, model.feature_importances_), \
+        {'n_estimators': n_estimators, 'max_samples': max_samples}
+
+
+def _rank_hgb(X, y, feature_names, random_state=42, max_rows=2000, n_repeats=5):
+    # HistGradientBoosting has no impurity importances, so rank by permutation
+    # importance of the boosted model on (a sample of) the training rows
+    model = HistGradientBoostingRegressor(max_iter=200, random_state=random_state)
+    model.fit(X, y)
+    if len(X) > max_rows:
+        rows = np.random.RandomState(random_state).choice(len(X), size=max_rows, replace=False)
+        X, y = X[rows], y[rows]
+    result = permutation_importance(model, X, y, n_repeats=n_repeats, random_state=random_state, n_jobs=-1)
+    return _sorted_ranking(feature_names, result.importances_mean), {'n_iter': model.n_iter_, 'n_repeats': n_repeats}
+
+
+def _rank_incremental(X, y, feature_names, random_state=42, top_k=10, step=50, patience=2, max_estimators=500):
+    # Grow the forest `step` trees at a time and stop once the top-k has been
+    # identical for `patience` consecutive checkpoints
+    model = _full_forest(random_state, n_estimators=0, warm_start=True)
+    previous, stable = None, 0
+    while model.n_estimators < max_estimators:
+        model.set_params(n_estimators=min(model.n_estimators + step, max_estimators))
+        model.fit(X=X, y=y)
+        ranking = _sorted_ranking(feature_names, model.feature_importances_)
+        current = _top_k(ranking, top_k)
+        stable = stable + 1 if current == previous else 0
+        previous = current
+        if stable >= patience:
+            break
+    return ranking, {'n_estimators': model.n_estimators}
+
+
+def rank_features(X, y, feature_names, method='full', top_k=10, random_state=42):
+    # Returns [(feature, score), ...] sorted by decreasing importance, plus
+    # method-specific details (e.g. how many trees were actually fitted)
+    if method == 'full':
+        return _rank_full(X, y, feature_names, random_state=random_state)
+    if method == 'subsample':
+        return _rank_subsample(X, y, feature_names, random_state=random_state)
+    if method == 'hgb':
+        return _rank_hgb(X, y, feature_names, random_state=random_state)
+    if method == 'incremental':
+        return _rank_incremental(X, y, feature_names, random_state=random_state, top_k=top_k)
+    raise ValueError(f'Unknown ranking method {method!r}, expected one of {RANKING_METHODS}')
+
+
+def ranking_agreement(ranking, reference, top_k=10):
+    # How closely a fast ranking reproduces the reference (full) one
+    selected = _top_k(ranking, top_k)
+    expected = _top_k(reference, top_k)
+    position = {name: i for i, (name, _) in enumerate(ranking)}
+    reference_position = [i for i, _ in enumerate(reference)]
+    rho = spearmanr(reference_position, [position[name] for name, _ in reference]).statistic
+    return {
+        'top_k_overlap': len(set(selected) & set(expected)) / top_k,
+        'top_k_exact': selected == expected,
+        'spearman': float(rho),
+        'missing': [name for name in expected if name not in selected]
+    }
@@ -0,0 +1,316 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# Single-file export (npz, read fully into memory on load)
+COMPILED_FOREST_FILE = 'compiled_forest.npz'
+# Directory of plain .npy files written by train.py and looked up by serve.py. The
+# node arrays are memory-mapped read-only on load, so every uvicorn worker on a
+# host shares one copy through the page cache instead of holding its own.
+COMPILED_FOREST_DIR = 'compiled_forest'
+_NODE_ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'children')
+# Output of CompiledForest.compact(), saved next to the full-precision export
+COMPACT_FOREST_DIR = 'compiled_forest_compact'
+
+
+def _smallest_uint(max_value):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+# A RandomForestRegressor flattened into contiguous node arrays. All trees
+# share one global node numbering; `roots[t]` is the first node of tree t.
+# Leaves point to themselves in `left`/`right` and carry an always-true split
+# (feature 0, threshold +inf), so traversal needs no per-node branching.
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, n_features, max_depth, feature_names=None,
+                 input_dtype='float32', children=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        # float32 reproduces sklearn's own input cast; folded forests compare raw float64 inputs
+        self.input_dtype = np.dtype(input_dtype)
+        # Interleaved (left, right) pairs so one take() picks the next node for every row.
+        # Stored with the other arrays so a memory-mapped load does not rebuild it per process.
+        self._children = children if children is not None else np.stack([left, right], axis=1).ravel()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def is_leaf(self):
+        return self.left == np.arange(self.n_nodes)
+
+    @property
+    def nbytes(self):
+        arrays = [getattr(self, name) for name in _NODE_ARRAYS if name != 'children'] + [self._children]
+        return sum(array.nbytes for array in arrays)
+
+    @classmethod
+    def from_sklearn(cls, model, feature_names=None):
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None:
+            # A single DecisionTreeRegressor is a forest of one tree
+            estimators = [model]
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n)
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, own, tree.children_left + offset))
+            rights.append(np.where(leaf, own, tree.children_right + offset))
+            # value holds the mean target of every node (internal nodes included)
+            values.append(tree.value.reshape(n, -1)[:, 0])
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int64),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.int64),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.int64),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.int64),
+            n_features=model.n_features_in_,
+            max_depth=max_depth,
+            feature_names=feature_names
+        )
+
+    def fold_scaler(self, mean, scale):
+        # Move an affine per-feature transform x' = (x - mean) / scale into the split
+        # thresholds, so the forest can be fed raw features: x' <= t  <=>  x <= t * scale + mean
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        if mean.shape != (self.n_features,) or scale.shape != (self.n_features,):
+            raise ValueError(f'Scaler must have {self.n_features} features')
+        if (scale <= 0).any():
+            raise ValueError('Scaler scale must be positive to fold into thresholds')
+
+        # sklearn sends a scaled value left iff its float32 rounding is <= t, i.e. iff it lies
+        # below the midpoint between the largest float32 <= t and the next float32 up
+        t32 = self.threshold.astype(np.float32)
+        t32 = np.where(t32 > self.threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+        boundary = (t32.astype(np.float64) + np.nextafter(t32, np.float32(np.inf)).astype(np.float64)) / 2
+
+        threshold = boundary * scale[self.feature] + mean[self.feature]
+        return CompiledForest(
+            feature=self.feature,
+            threshold=np.ascontiguousarray(threshold),
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            roots=self.roots,
+            n_features=self.n_features,
+            max_depth=self.max_depth,
+            feature_names=self.feature_names,
+            input_dtype='float64',
+            children=self._children
+        )
+
+    def leaves(self, X):
+        # Global leaf index reached by every (row, tree) pair, shape (n_samples, n_trees)
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got {X.shape[1]}')
+        # sklearn compares float32 inputs against float64 thresholds; do the same to match it exactly
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+
+        n_samples = X.shape[0]
+        flat_X = X.ravel()
+        row_offset = (np.arange(n_samples) * self.n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_samples, self.n_trees)).astype(np.intp)
+        for depth in range(self.max_depth):
+            go_right = flat_X.take(row_offset + self.feature.take(node)) > self.threshold.take(node)
+            # Compact forests store node ids in small unsigned types; index arithmetic stays in intp
+            next_node = self._children.take(2 * node + go_right).astype(np.intp, copy=False)
+            # Most trees are shallower than the deepest one: stop once every path sits on a leaf
+            if depth % 4 == 3 and np.array_equal(next_node, node):
+                break
+            node = next_node
+        return node
+
+    def tree_values(self, X):
+        # Prediction of every tree for every row, shape (n_samples, n_trees), from one traversal
+        return self.value.take(self.leaves(X))
+
+    def predict(self, X):
+        return self.tree_values(X).mean(axis=1, dtype=np.float64)
+
+    def predict_interval(self, X, level=0.9):
+        # Mean plus the central `level` range and standard deviation of the per-tree
+        # predictions. This is the spread of the ensemble, not a calibrated predictive
+        # interval: each tree predicts a leaf mean, so noise within leaves is not included.
+        values = self.tree_values(X).astype(np.float64, copy=False)
+        alpha = (1 - level) / 2
+        lower, upper = np.quantile(values, [alpha, 1 - alpha], axis=1)
+        return {
+            'mean': values.mean(axis=1),
+            'lower': lower,
+            'upper': upper,
+            'std': values.std(axis=1)
+        }
+
+    def _node_depth(self):
+        depth = np.full(self.n_nodes, -1, dtype=np.int64)
+        is_leaf = self.is_leaf
+        frontier = np.asarray(self.roots, dtype=np.intp)
+        level = 0
+        while frontier.size:
+            depth[frontier] = level
+            frontier = frontier[~is_leaf[frontier]]
+            frontier = np.concatenate([self.left[frontier], self.right[frontier]]).astype(np.intp)
+            level += 1
+        return depth
+
+    def compact(self, max_trees=None, max_depth=None, target_bytes=None):
+        # Smaller copy of the forest: float32 thresholds and values, node ids and
+        # feature ids in the smallest unsigned type that fits. Optionally keeps only
+        # the first `max_trees` trees (random forest trees are exchangeable) and cuts
+        # every tree at `max_depth`, turning the nodes there into leaves that predict
+        # their stored mean. With `target_bytes`, max_depth is lowered until it fits.
+        n_trees = min(self.n_trees, max_trees or self.n_trees)
+        depth_limit = min(self.max_depth, max_depth if max_depth is not None else self.max_depth)
+        node_depth = self._node_depth()
+        end = self.roots[n_trees] if n_trees < self.n_trees else self.n_nodes
+        while True:
+            forest = self._prune(n_trees, depth_limit, node_depth, end)
+            if target_bytes is None or forest.nbytes <= target_bytes or depth_limit <= 1:
+                return forest
+            depth_limit -= 1
+
+    def _prune(self, n_trees, depth_limit, node_depth, end):
+        keep = np.zeros(self.n_nodes, dtype=bool)
+        keep[:end] = (node_depth[:end] >= 0) & (node_depth[:end] <= depth_limit)
+        kept = np.flatnonzero(keep)
+        new_index = np.cumsum(keep) - 1
+        n_nodes = len(kept)
+
+        # Nodes on the depth limit become leaves: self-loops with an always-true split
+        cut = self.is_leaf[kept] | (node_depth[kept] == depth_limit)
+        own = np.arange(n_nodes)
+        left = np.where(cut, own, new_index[self.left[kept]])
+        right = np.where(cut, own, new_index[self.right[kept]])
+        feature = np.where(cut, 0, self.feature[kept])
+        threshold = np.where(cut, np.inf, self.threshold[kept])
+
+        if self.input_dtype == np.float32:
+            # sklearn sends a float32 input left iff it is <= the float64 threshold, i.e. iff it is
+            # <= the largest float32 not above it: rounding down keeps every split decision exact
+            t32 = threshold.astype(np.float32)
+            threshold = np.where(t32 > threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+        # Folded forests compare raw float64 inputs, so their thresholds keep full precision
+
+        index_dtype = _smallest_uint(max(n_nodes - 1, 0))
+        left = left.astype(index_dtype)
+        right = right.astype(index_dtype)
+        return CompiledForest(
+            feature=feature.astype(_smallest_uint(max(self.n_features - 1, 0))),
+            threshold=np.ascontiguousarray(threshold),
+            left=left,
+            right=right,
+            value=self.value[kept].astype(np.float32),
+            roots=new_index[self.roots[:n_trees]].astype(index_dtype),
+            n_features=self.n_features,
+            max_depth=depth_limit,
+            feature_names=self.feature_names,
+            input_dtype=self.input_dtype.name
+        )
+
+    def _meta(self):
+        return {
+            'n_features': self.n_features,
+            'max_depth': self.max_depth,
+            'feature_names': self.feature_names,
+            'input_dtype': self.input_dtype.name
+        }
+
+    def save(self, path):
+        # A path ending in .npz gets the single-file format, anything else the mmap-able directory
+        path = Path(path)
+        if path.suffix != '.npz':
+            return self._save_dir(path)
+        meta = self._meta()
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                feature=self.feature,
+                threshold=self.threshold,
+                left=self.left,
+                right=self.right,
+                value=self.value,
+                roots=self.roots,
+                meta=np.array(json.dumps(meta))
+            )
+        return Path(path)
+
+    def _save_dir(self, path):
+        # Written into a fresh directory that is then swapped in: serving workers may have the
+        # previous export memory-mapped, and truncating those files in place would change their
+        # predictions or crash them with SIGBUS. Old mappings keep the replaced files alive.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f'.{path.name}-', dir=path.parent))
+        arrays = {name: getattr(self, name) for name in _NODE_ARRAYS if name != 'children'}
+        arrays['children'] = self._children
+        for name, array in arrays.items():
+            np.save(staging / f'{name}.npy', np.ascontiguousarray(array))
+        with open(staging / 'meta.json', 'w') as f:
+            json.dump(self._meta(), f, indent=2)
+
+        previous = None
+        if path.exists():
+            previous = Path(tempfile.mkdtemp(prefix=f'.{path.name}-old-', dir=path.parent))
+            os.replace(path, previous / path.name)
+        os.replace(staging, path)
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        path = Path(path)
+        if path.is_dir():
+            with open(path / 'meta.json', 'r') as f:
+                meta = json.load(f)
+            mmap_mode = 'r' if mmap else None
+            arrays = {name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode, allow_pickle=False) for name in _NODE_ARRAYS}
+            return cls(**arrays, **meta)
+
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(
+                feature=data['feature'],
+                threshold=data['threshold'],
+                left=data['left'],
+                right=data['right'],
+                value=data['value'],
+                roots=data['roots'],
+                **meta
+            )
@@ -0,0 +1,66 @@
+import os
+import time
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, mean_squared_error, r2_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, train_test_split
+
+from shared_arrays import arrays as _shared, map_shared, shared_directory
+
+SEARCH_MODES = ('grid', 'random')
+
+# Search space around the original single configuration (n_estimators=100, defaults otherwise)
+DEFAULT_PARAM_GRID = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [None, 20, 50],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': [1.0, 'sqrt', 0.5]
+}
+
+
+def candidate_configurations(mode='random', param_grid=None, n_iter=20, random_state=42):
+    param_grid = param_grid or DEFAULT_PARAM_GRID
+    if mode == 'grid':
+        return list(ParameterGrid(param_grid))
+    if mode == 'random':
+        return list(ParameterSampler(param_grid, n_iter=min(n_iter, len(ParameterGrid(param_grid))),
+                                     random_state=random_state))
+    raise ValueError(f'Unknown search mode {mode!r}, expected one of {SEARCH_MODES}')
+
+
+def _evaluate(params, random_state=42):
+    started = time.perf_counter()
+    # One core per configuration: the parallelism comes from the pool
+    model = RandomForestRegressor(random_state=random_state, n_jobs=1, **params)
+    model.fit(_shared['X_fit'], _shared['y_fit'])
+    y_pred = model.predict(_shared['X_val'])
+    y_val = _shared['y_val']
+    metrics = {
+        'val_mse': mean_squared_error(y_val, y_pred),
+        'val_r2': r2_score(y_val, y_pred),
+        'val_mae': mean_absolute_error(y_val, y_pred),
+        'val_mape': mean_absolute_percentage_error(y_val, y_pred),
+        'fit_seconds': time.perf_counter() - started
+    }
+    return params, {name: float(value) for name, value in metrics.items()}
+
+
+def run_search(X_train, y_train, configurations, n_workers=None, validation_size=0.2, random_state=42):
+    # Scores every configuration on a validation split of the training data, so
+    # the test set stays untouched for the final model. Returns
+    # [(params, metrics), ...] sorted by validation MSE, best first.
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=validation_size,
+                                                  random_state=random_state)
+    n_workers = n_workers or os.cpu_count() or 1
+    with shared_directory('hp_search_', X_fit=X_fit, y_fit=y_fit, X_val=X_val, y_val=y_val) as shared_dir:
+        results = map_shared(_evaluate, shared_dir, n_workers, configurations, [random_state] * len(configurations))
+    return sorted(results, key=lambda result: result[1]['val_mse'])
+
+
+def log_search_results(mlflow, results):
+    # One nested run per configuration, each written with a single batched
+    # params call and a single batched metrics call from the parent process
+    for rank, (params, metrics) in enumerate(results, 1):
+        with mlflow.start_run(run_name=f'search-{rank:03d}', nested=True):
+            mlflow.log_params({name: str(value) for name, value in params.items()})
+            mlflow.log_metrics({**metrics, 'search_rank': rank})
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from forest_engine import COMPACT_FOREST_DIR, COMPILED_FOREST_DIR, CompiledForest
+from preprocessing import PREPROCESSING_FILE, Preprocessor
+
+# Written by train.py next to top_features.json; points serving at the active model
+MODEL_MANIFEST_FILE = 'model_manifest.json'
+MLFLOW_DB_FILE = 'mlflow.db'
+
+# serve.py runs either from the repo root or from src/
+SEARCH_ROOTS = (Path('..'), Path('.'))
+
+# MLflow logged model ids ('m-<hex>'); anything else never reaches the filesystem
+MODEL_ID_PATTERN = re.compile(r'm-[A-Za-z0-9_-]+')
+
+
+# A model ready to serve together with everything needed to use it. serve.py
+# swaps whole instances, so a request never sees a model paired with another
+# model's scaler or version.
+class LoadedModel:
+    def __init__(self, model, scaler=None, path=None, model_id=None, engine='sklearn', feature_names=None, source=None,
+                 scaler_folded=False, compact=False, preprocessing_fingerprint=None):
+        self.model = model
+        # Anything with transform(): the training Preprocessor, or a legacy pickled StandardScaler
+        self.scaler = scaler
+        self.scaler_folded = scaler_folded
+        self.compact = compact
+        self.path = Path(path) if path is not None else None
+        self.model_id = model_id
+        self.engine = engine
+        self.feature_names = list(feature_names) if feature_names else None
+        self.source = source
+        # Flat-array copy of a sklearn model for per-tree predictions, compiled by serve.py on first use,
+        # and the path explainer built on it
+        self.compiled_forest = None
+        self.explainer = None
+        self.loaded_at = time.time()
+        # Identity of what produces the predictions: cached predictions are only valid for this
+        # version. Hashed from the content, since re-exporting into the same directory changes
+        # neither its path nor its mtime. A folded scaler lives in the thresholds, so the
+        # preprocessing is named separately.
+        if self.path is None:
+            self.version = None
+        else:
+            preprocessing = preprocessing_fingerprint or getattr(scaler, 'fingerprint', None)
+            self.version = '@'.join(part for part in (model_id or str(self.path.resolve()), artifact_digest(self.path),
+                                                      preprocessing) if part)
+
+
+def artifact_digest(path):
+    # Content hash of a model artifact: a pickle or .npz file, or every file of an export directory
+    path = Path(path)
+    digest = hashlib.blake2b(digest_size=8)
+    files = sorted(file for file in path.rglob('*') if file.is_file()) if path.is_dir() else [path]
+    for file in files:
+        digest.update(file.relative_to(path).as_posix().encode() if path.is_dir() else b'')
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _path_for_manifest(path, manifest_path):
+    # Stored relative to the manifest, so the project directory can be mounted elsewhere
+    # (e.g. /app in the docker-compose containers); absolute when no relative path exists
+    if path is None:
+        return None
+    try:
+        return Path(os.path.relpath(Path(path).absolute(), Path(manifest_path).absolute().parent)).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def write_manifest(path, model_id, run_id, model_path, compiled_path=None, top_features=None,
+                   preprocessing_path=None, preprocessing_fingerprint=None, compact_path=None):
+    manifest = {
+        'model_id': model_id,
+        'run_id': run_id,
+        'model_path': _path_for_manifest(model_path, path),
+        'compiled_path': _path_for_manifest(compiled_path, path),
+        'compact_path': _path_for_manifest(compact_path, path),
+        'preprocessing_path': _path_for_manifest(preprocessing_path, path),
+        'preprocessing_fingerprint': preprocessing_fingerprint,
+        'top_features': top_features,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return Path(path)
+
+
+def _first_existing(name, roots):
+    for root in roots:
+        candidate = Path(root) / name
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _local_artifact_dir(artifact_location, experiment_id, model_id, roots):
+    # mlflow.db stores absolute paths from the machine that trained the model;
+    # fall back to the same layout under a local mlruns directory
+    location = Path(str(artifact_location).replace('file://', ''))
+    if location.exists():
+        return location
+    for root in roots:
+        candidate = Path(root) / 'mlruns' / str(experiment_id) / 'models' / model_id / 'artifacts'
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def read_manifest(roots=SEARCH_ROOTS):
+    manifest_path = _first_existing(MODEL_MANIFEST_FILE, roots)
+    if manifest_path is None:
+        return None
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+
+    model_path = Path(manifest['model_path'])
+    if not model_path.is_absolute():
+        model_path = manifest_path.parent / model_path
+    if not model_path.exists():
+        print(f'Warning: {manifest_path} points to missing model {model_path}')
+        return None
+
+    def relative_to_manifest(key):
+        value = manifest.get(key)
+        if value is None:
+            return None
+        value = Path(value)
+        return value if value.is_absolute() else manifest_path.parent / value
+
+    return {
+        'model_id': manifest.get('model_id'),
+        'model_path': model_path,
+        'compiled_path': relative_to_manifest('compiled_path'),
+        'compact_path': relative_to_manifest('compact_path'),
+        'preprocessing_path': relative_to_manifest('preprocessing_path'),
+        'preprocessing_fingerprint': manifest.get('preprocessing_fingerprint'),
+        'top_features': manifest.get('top_features'),
+        'source': str(manifest_path)
+    }
+
+
+def resolve_from_mlflow_db(roots=SEARCH_ROOTS):
+    db_path = _first_existing(MLFLOW_DB_FILE, roots)
+    if db_path is None:
+        return None
+    try:
+        with sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) as conn:
+            rows = conn.execute(
+                "SELECT model_id, experiment_id, artifact_location, source_run_id FROM logged_models "
+                "WHERE lifecycle_stage = 'active' ORDER BY creation_timestamp_ms DESC"
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f'Warning: could not query {db_path}: {e}')
+        return None
+
+    # Newest logged model whose artifacts are present on this host
+    for model_id, experiment_id, artifact_location, run_id in rows:
+        artifact_dir = _local_artifact_dir(artifact_location, experiment_id, model_id, roots)
+        if artifact_dir is not None and (artifact_dir / 'model.pkl').exists():
+            return {
+                'model_id': model_id,
+                'model_path': artifact_dir / 'model.pkl',
+                'compiled_path': _run_artifact(experiment_id, run_id, COMPILED_FOREST_DIR, roots),
+                'compact_path': _run_artifact(experiment_id, run_id, COMPACT_FOREST_DIR, roots),
+                # train.py logs the preprocessing as an artifact of the run that produced the model
+                'preprocessing_path': _run_artifact(experiment_id, run_id, PREPROCESSING_FILE, roots),
+                'top_features': None,
+                'source': str(db_path)
+            }
+    return None
+
+
+def _run_artifact(experiment_id, run_id, name, roots):
+    for root in roots:
+        candidate = Path(root) / 'mlruns' / str(experiment_id) / str(run_id) / 'artifacts' / name
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def resolve_model(model_id, roots=SEARCH_ROOTS):
+    # Entry for one logged model by its MLflow id, so several versions can be served side by side
+    if not MODEL_ID_PATTERN.fullmatch(model_id or ''):
+        return None
+    manifest = read_manifest(roots)
+    if manifest is not None and manifest['model_id'] == model_id:
+        return manifest
+
+    db_path = _first_existing(MLFLOW_DB_FILE, roots)
+    row = None
+    if db_path is not None:
+        try:
+            with sqlite3.connect(f'file:{db_path}?mode=ro', uri=True) as conn:
+                row = conn.execute(
+                    "SELECT experiment_id, artifact_location, source_run_id FROM logged_models "
+                    "WHERE model_id = ? AND lifecycle_stage = 'active'", (model_id,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f'Warning: could not query {db_path}: {e}')
+    if row is not None:
+        experiment_id, artifact_location, run_id = row
+        artifact_dir = _local_artifact_dir(artifact_location, experiment_id, model_id, roots)
+    else:
+        # Not in the database: look for the model directory in any experiment
+        experiment_id = run_id = None
+        artifact_dir = next((path for root in roots for path in (Path(root) / 'mlruns').glob(f'*/models/{model_id}/artifacts')), None)
+    if artifact_dir is None or not (artifact_dir / 'model.pkl').exists():
+        return None
+
+    def run_artifact(name):
+        return _run_artifact(experiment_id, run_id, name, roots) if run_id is not None else None
+
+    return {
+        'model_id': model_id,
+        'model_path': artifact_dir / 'model.pkl',
+        # train.py logs these next to the model in the run that produced it
+        'compiled_path': run_artifact(COMPILED_FOREST_DIR),
+        'compact_path': run_artifact(COMPACT_FOREST_DIR),
+        'preprocessing_path': run_artifact(PREPROCESSING_FILE),
+        'top_features': None,
+        'source': str(db_path) if row is not None else 'mlruns scan'
+    }
+
+
+def resolve_legacy(roots=SEARCH_ROOTS):
+    # Old behaviour: newest model.pkl anywhere under mlruns. Walks the whole store.
+    for root in roots:
+        candidates = list((Path(root) / 'mlruns').glob('**/model.pkl'))
+        if candidates:
+            latest = max(candidates, key=lambda p: p.stat().st_mtime)
+            return {'model_id': None, 'model_path': latest, 'compiled_path': None, 'preprocessing_path': None,
+                    'top_features': None, 'source': 'mlruns scan'}
+    return None
+
+
+def resolve_active_model(roots=SEARCH_ROOTS):
+    entry = read_manifest(roots) or resolve_from_mlflow_db(roots)
+    if entry is None:
+        entry = resolve_legacy(roots)
+        if entry is not None:
+            print(f'Warning: no {MODEL_MANIFEST_FILE} or usable {MLFLOW_DB_FILE}; fell back to scanning mlruns')
+    return entry
+
+
+def index_signature(roots=SEARCH_ROOTS):
+    # Cheap fingerprint of the index files, used to detect a newly trained model
+    signature = []
+    for name in (MODEL_MANIFEST_FILE, MLFLOW_DB_FILE):
+        path = _first_existing(name, roots)
+        signature.append((str(path), path.stat().st_mtime_ns) if path is not None else None)
+    return tuple(signature)
+
+
+def _load_preprocessing(entry, feature_names):
+    preprocessing_path = entry.get('preprocessing_path')
+    if preprocessing_path is None:
+        candidate = Path(entry['model_path']).parent / PREPROCESSING_FILE
+        preprocessing_path = candidate if candidate.exists() else None
+    if preprocessing_path is None:
+        return _load_scaler(Path(entry['model_path']))
+
+    preprocessor = Preprocessor.load(preprocessing_path)
+    # Refuse to serve with a transform that was not fitted for this model
+    expected = entry.get('preprocessing_fingerprint')
+    if expected is not None and preprocessor.fingerprint != expected:
+        raise ValueError(f'{preprocessing_path} does not match the model manifest (fingerprint {preprocessor.fingerprint} != {expected})')
+    if feature_names and preprocessor.feature_names != list(feature_names):
+        raise ValueError(f'{preprocessing_path} was fitted on {preprocessor.feature_names}, model expects {list(feature_names)}')
+    print(f'Preprocessing loaded from: {preprocessing_path}')
+    return preprocessor
+
+
+def _load_scaler(model_path):
+    # Only look next to the model: a scaler from another run would silently change every prediction
+    candidates = list(model_path.parent.glob('*scaler*.pkl')) + list(model_path.parent.glob('*StandardScaler*.pkl'))
+    if not candidates:
+        return None
+    scaler_path = max(candidates, key=lambda p: p.stat().st_mtime)
+    try:
+        with open(scaler_path, 'rb') as f:
+            scaler = pickle.load(f)
+        print(f'Scaler loaded from: {scaler_path}')
+        return scaler
+    except Exception as e:
+        print(f'Warning: found scaler at {scaler_path} but failed to load: {e}')
+        return None
+
+
+def load_model(entry, engine='sklearn', feature_names=None, fold_scaler=False, mmap=True, compact=False):
+    feature_names = entry.get('top_features') or feature_names
+    scaler = _load_preprocessing(entry, feature_names)
+    if not feature_names and isinstance(scaler, Preprocessor):
+        # The preprocessing was fitted on exactly the model's input columns
+        feature_names = scaler.feature_names
+    model = None
+    path = None
+
+    # Folding the scaler into split thresholds and compaction need the flat-array engine
+    if compact or (fold_scaler and isinstance(scaler, Preprocessor)):
+        engine = 'compiled'
+
+    if engine == 'compiled':
+        # Only exports recorded for this entry: the compiled_forest/ next to top_features.json belongs to
+        # whichever model was trained last, not necessarily this one. Without them the pickle is compiled below.
+        compiled_path = (entry.get('compact_path') if compact else None) or entry.get('compiled_path')
+        if compiled_path is not None and Path(compiled_path).exists():
+            try:
+                # The directory layout is memory-mapped, so workers on one host share its pages
+                model = CompiledForest.load(compiled_path, mmap=mmap)
+                path = compiled_path
+                print(f'Compiled forest loaded from: {compiled_path}')
+            except Exception as e:
+                print(f'Warning: failed to load compiled forest from {compiled_path}: {e}')
+
+    if model is None:
+        with open(entry['model_path'], 'rb') as f:
+            model = pickle.load(f)
+        path = entry['model_path']
+        print(f'Model loaded from: {path}')
+
+    if engine == 'compiled' and not isinstance(model, CompiledForest):
+        try:
+            model = CompiledForest.from_sklearn(model, feature_names=feature_names)
+            print(f'Compiled {model.n_trees} trees for serving')
+        except Exception as e:
+            print(f'Warning: could not compile model, serving it with sklearn: {e}')
+
+    if compact and isinstance(model, CompiledForest) and model.value.dtype != 'float32':
+        # No compact export next to this model: compact the full-precision forest in memory
+        model = model.compact()
+        print(f'Compacted the forest to {model.nbytes / 1e6:.1f} MB')
+
+    preprocessing_fingerprint = scaler.fingerprint if isinstance(scaler, Preprocessor) else None
+    scaler_folded = False
+    if fold_scaler and isinstance(scaler, Preprocessor) and isinstance(model, CompiledForest):
+        # Requests are validated as finite, so imputation is a no-op and the whole transform folds away
+        model = model.fold_scaler(scaler.mean, scaler.scale)
+        scaler = None
+        scaler_folded = True
+        print('Folded the StandardScaler into the split thresholds')
+
+    return LoadedModel(
+        model=model,
+        scaler=scaler,
+        path=path,
+        model_id=entry.get('model_id'),
+        engine='compiled' if isinstance(model, CompiledForest) else 'sklearn',
+        feature_names=feature_names,
+        source=entry.get('source'),
+        scaler_folded=scaler_folded,
+        compact=isinstance(model, CompiledForest) and model.value.dtype == 'float32',
+        preprocessing_fingerprint=preprocessing_fingerprint
+    )
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+
+class UnknownModel(KeyError):
+    pass
+
+
+def model_nbytes(loaded):
+    # Node arrays of a compiled forest; for a pickled estimator, the artifact size on
+    # disk, which tracks its unpickled tree arrays closely
+    nbytes = getattr(loaded.model, 'nbytes', None)
+    if nbytes is not None:
+        return int(nbytes)
+    if loaded.path is None:
+        return 0
+    path = Path(loaded.path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.iterdir())
+    return path.stat().st_size
+
+
+# Models loaded on demand by id and kept in LRU order within a memory budget.
+# serve.py keeps its default model outside the pool; this holds the extra
+# versions clients ask for (regional models, challengers, rollback candidates).
+# Evicted models are only dropped from the pool: requests already holding one
+# finish on it.
+class ModelPool:
+    def __init__(self, loader, memory_budget_bytes, size_fn=model_nbytes):
+        self.loader = loader
+        self.memory_budget_bytes = int(memory_budget_bytes)
+        self.size_fn = size_fn
+        self.loads = Counter()
+        self.load_errors = Counter()
+        self.hits = Counter()
+        self.evictions = Counter()
+        self.load_seconds = {}
+        self._models = OrderedDict()
+        self._load_locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, model_id):
+        return model_id in self._models
+
+    @property
+    def bytes_used(self):
+        with self._lock:
+            return sum(size for _, size in self._models.values())
+
+    def _lookup(self, model_id):
+        entry = self._models.get(model_id)
+        if entry is None:
+            return None
+        self._models.move_to_end(model_id)
+        self.hits[model_id] += 1
+        return entry[0]
+
+    def get(self, model_id):
+        with self._lock:
+            loaded = self._lookup(model_id)
+            if loaded is not None:
+                return loaded
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        # One load per model id: concurrent first requests wait for it instead of loading twice
+        with load_lock:
+            with self._lock:
+                loaded = self._lookup(model_id)
+                if loaded is not None:
+                    return loaded
+            started = time.perf_counter()
+            try:
+                loaded = self.loader(model_id)
+            except Exception:
+                with self._lock:
+                    self.load_errors[model_id] += 1
+                    self._load_locks.pop(model_id, None)
+                raise
+            size = self.size_fn(loaded)
+            with self._lock:
+                self._models[model_id] = (loaded, size)
+                self.loads[model_id] += 1
+                self.load_seconds[model_id] = time.perf_counter() - started
+                self._evict(keep=model_id)
+            return loaded
+
+    def _evict(self, keep):
+        # Least recently used first; the model just loaded stays even if it alone exceeds the budget
+        used = sum(size for _, size in self._models.values())
+        for model_id in list(self._models):
+            if used <= self.memory_budget_bytes:
+                break
+            if model_id == keep:
+                continue
+            _, size = self._models.pop(model_id)
+            self._load_locks.pop(model_id, None)
+            self.evictions[model_id] += 1
+            used -= size
+            print(f'Evicted model {model_id} from the pool ({size / 1e6:.1f} MB)')
+
+    def status(self):
+        with self._lock:
+            models = [
+                {
+                    'model_id': model_id,
+                    'bytes': size,
+                    'engine': loaded.engine,
+                    'loaded_at': loaded.loaded_at,
+                    'load_seconds': round(self.load_seconds.get(model_id, 0.0), 4),
+                    'hits': self.hits[model_id]
+                }
+                for model_id, (loaded, size) in reversed(self._models.items())
+            ]
+        return {
+            'memory_budget_bytes': self.memory_budget_bytes,
+            'bytes_used': sum(model['bytes'] for model in models),
+            'models': models
+        }
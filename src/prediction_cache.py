@@ -0,0 +1,72 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+# In-process LRU cache of predictions with an optional TTL. Entries are keyed
+# on the exact float64 bytes of a feature row; the cache is bound to one model
+# version and is cleared as soon as a lookup arrives for a different one.
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl_s=0.0):
+        self.max_entries = int(max_entries)
+        self.ttl_s = float(ttl_s)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._model_version = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(row):
+        # Canonical form: contiguous float64 with -0.0 folded into 0.0
+        row = np.ascontiguousarray(row, dtype=np.float64).ravel() + 0.0
+        return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+    def _bind(self, model_version):
+        if model_version != self._model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._model_version = model_version
+
+    def get(self, key, model_version):
+        with self._lock:
+            self._bind(model_version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value, model_version):
+        # Returns the number of entries evicted to stay within max_entries
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s > 0 else None
+        evicted = 0
+        with self._lock:
+            self._bind(model_version)
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            self.evictions += evicted
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._model_version = None
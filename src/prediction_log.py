@@ -0,0 +1,296 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+# Audit log of every scored row. serve.py appends to a bounded in-memory buffer on
+# the request path (no I/O there); a background thread drains it in bulk into
+# append-only segment files under one directory, which train.py can read back.
+
+BACKENDS = ('sqlite', 'parquet')
+# What log() does when the buffer is full: drop the new rows, overwrite the oldest
+# buffered ones, or wait up to block_timeout_s for the flusher and drop on timeout
+DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+_SQLITE_SCHEMA = ('CREATE TABLE IF NOT EXISTS predictions (request_id TEXT, row INTEGER, ts REAL, model_id TEXT, '
+                  'route TEXT, feature_names TEXT, features BLOB, prediction REAL)')
+
+
+class _SqliteSegment:
+    suffix = '.sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(_SQLITE_SCHEMA)
+
+    def write(self, entries):
+        records = []
+        for ts, request_id, model_id, route, feature_names, features, predictions, rows in entries:
+            names = ','.join(feature_names)
+            for row, values, prediction in zip(rows, features, predictions):
+                records.append((request_id, int(row), ts, model_id, route, names,
+                                np.ascontiguousarray(values, dtype='<f8').tobytes(), float(prediction)))
+        with self._conn:
+            self._conn.executemany('INSERT INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?)', records)
+        return len(records)
+
+    def close(self):
+        self._conn.close()
+
+
+class _ParquetSegment:
+    # Written as <name>.parquet.tmp and renamed on close, so readers only see complete files
+    suffix = '.parquet'
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.path = path
+        self._tmp_path = path.with_name(path.name + '.tmp')
+        self._schema = pa.schema([
+            ('request_id', pa.string()), ('row', pa.int32()), ('ts', pa.float64()), ('model_id', pa.string()),
+            ('route', pa.string()), ('feature_names', pa.string()), ('features', pa.list_(pa.float64())),
+            ('prediction', pa.float64())
+        ])
+        self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+
+    def write(self, entries):
+        pa = self._pa
+        columns = {name: [] for name in ('request_id', 'row', 'ts', 'model_id', 'route', 'feature_names', 'prediction')}
+        values, offsets = [], [0]
+        for ts, request_id, model_id, route, feature_names, features, predictions, rows in entries:
+            n = len(rows)
+            columns['request_id'] += [request_id] * n
+            columns['row'].append(np.asarray(rows, dtype=np.int32))
+            columns['ts'] += [ts] * n
+            columns['model_id'] += [model_id] * n
+            columns['route'] += [route] * n
+            columns['feature_names'] += [','.join(feature_names)] * n
+            columns['prediction'].append(np.asarray(predictions, dtype=np.float64))
+            features = np.asarray(features, dtype=np.float64).reshape(n, -1)
+            values.append(features.ravel())
+            offsets.extend(offsets[-1] + features.shape[1] * np.arange(1, n + 1))
+        features = pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), pa.array(np.concatenate(values)))
+        table = pa.table({
+            'request_id': columns['request_id'],
+            'row': np.concatenate(columns['row']),
+            'ts': columns['ts'],
+            'model_id': columns['model_id'],
+            'route': columns['route'],
+            'feature_names': columns['feature_names'],
+            'features': features,
+            'prediction': np.concatenate(columns['prediction'])
+        }, schema=self._schema)
+        self._writer.write_table(table)
+        return table.num_rows
+
+    def close(self):
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class PredictionLog:
+    def __init__(self, directory, backend='sqlite', capacity=100_000, drop_policy='drop_newest',
+                 flush_interval_s=1.0, flush_rows=10_000, rotate_rows=1_000_000, rotate_interval_s=3600.0,
+                 block_timeout_s=0.05):
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown prediction log backend {backend!r}; use one of {BACKENDS}')
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f'Unknown drop policy {drop_policy!r}; use one of {DROP_POLICIES}')
+        self.directory = Path(directory)
+        self.backend = backend
+        self.capacity = int(capacity)
+        self.drop_policy = drop_policy
+        self.flush_interval_s = float(flush_interval_s)
+        self.flush_rows = int(flush_rows)
+        self.rotate_rows = int(rotate_rows)
+        self.rotate_interval_s = float(rotate_interval_s)
+        self.block_timeout_s = float(block_timeout_s)
+
+        self.logged = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.segments = 0
+
+        self._entries = deque()
+        self._buffered_rows = 0
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._segment = None
+        self._segment_rows = 0
+        self._segment_opened = 0.0
+
+    @property
+    def buffered_rows(self):
+        return self._buffered_rows
+
+    @property
+    def blocking(self):
+        return self.drop_policy == 'block'
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='prediction-log-flusher', daemon=True)
+        self._thread.start()
+        return self
+
+    def log(self, request_id, model_id, route, feature_names, features, predictions, rows=None):
+        # Hot path: one deque append under a lock. `features` is (n, k) and is kept by reference,
+        # so callers must not modify it afterwards.
+        n = len(predictions)
+        if n == 0:
+            return True
+        entry = (time.time(), request_id, model_id, route, tuple(feature_names), features, predictions,
+                 rows if rows is not None else range(n))
+        with self._lock:
+            if self._buffered_rows + n > self.capacity:
+                if self.drop_policy == 'drop_newest' or n > self.capacity:
+                    self.dropped += n
+                    return False
+                if self.drop_policy == 'drop_oldest':
+                    while self._entries and self._buffered_rows + n > self.capacity:
+                        old = self._entries.popleft()
+                        self._buffered_rows -= len(old[6])
+                        self.dropped += len(old[6])
+                else:
+                    self._wakeup.set()
+                    deadline = time.monotonic() + self.block_timeout_s
+                    while self._buffered_rows + n > self.capacity:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._space.wait(remaining):
+                            self.dropped += n
+                            return False
+            self._entries.append(entry)
+            self._buffered_rows += n
+            self.logged += n
+            if self._buffered_rows >= self.flush_rows:
+                self._wakeup.set()
+        return True
+
+    def _drain(self):
+        with self._lock:
+            entries = list(self._entries)
+            self._entries.clear()
+            self._buffered_rows = 0
+            self._space.notify_all()
+        return entries
+
+    def _open_segment(self):
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        segment_cls = _SqliteSegment if self.backend == 'sqlite' else _ParquetSegment
+        # The pid keeps segments from several uvicorn workers sharing a directory apart
+        path = self.directory / f'predictions-{stamp}-{os.getpid()}-{self.segments:05d}{segment_cls.suffix}'
+        self._segment = segment_cls(path)
+        self._segment_rows = 0
+        self._segment_opened = time.monotonic()
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def flush(self):
+        entries = self._drain()
+        if not entries:
+            return 0
+        n_rows = sum(len(entry[6]) for entry in entries)
+        try:
+            if self._segment is not None and (self._segment_rows >= self.rotate_rows or
+                                              time.monotonic() - self._segment_opened >= self.rotate_interval_s):
+                self._close_segment()
+            if self._segment is None:
+                self._open_segment()
+            written = self._segment.write(entries)
+        except Exception as e:
+            self.flush_errors += 1
+            self.dropped += n_rows
+            print(f'Warning: failed to write {n_rows} prediction log rows: {e}')
+            return 0
+        self._segment_rows += written
+        self.flushed += written
+        return written
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        # Stop the flusher, write whatever is still buffered and seal the current segment
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self._close_segment()
+
+    def status(self):
+        return {
+            'backend': self.backend,
+            'directory': str(self.directory),
+            'drop_policy': self.drop_policy,
+            'capacity': self.capacity,
+            'buffered_rows': self._buffered_rows,
+            'logged': self.logged,
+            'dropped': self.dropped,
+            'flushed': self.flushed,
+            'flush_errors': self.flush_errors,
+            'segments': self.segments
+        }
+
+
+def _read_sqlite_segment(path):
+    with sqlite3.connect(f'file:{path}?mode=ro', uri=True) as conn:
+        rows = conn.execute('SELECT request_id, row, ts, model_id, route, feature_names, features, prediction '
+                            'FROM predictions').fetchall()
+    groups = {}
+    for request_id, row, ts, model_id, route, names, blob, prediction in rows:
+        groups.setdefault(names, []).append((request_id, row, ts, model_id, route, blob, prediction))
+    for names, records in groups.items():
+        request_ids, row_index, ts, model_ids, routes, blobs, predictions = zip(*records)
+        features = np.frombuffer(b''.join(blobs), dtype='<f8').reshape(len(records), -1)
+        yield names, features, {'request_id': request_ids, 'row': row_index, 'ts': ts, 'model_id': model_ids,
+                                'route': routes, 'prediction': predictions}
+
+
+def _read_parquet_segment(path):
+    import pyarrow.parquet as pq
+    frame = pq.read_table(path).to_pandas()
+    for names, group in frame.groupby('feature_names', sort=False):
+        features = np.stack(group['features'].to_numpy()) if len(group) else np.empty((0, 0))
+        yield names, features, group.drop(columns=['features', 'feature_names']).to_dict('list')
+
+
+def read_log(directory):
+    # All complete segments as one DataFrame: request_id, row, ts, model_id, route,
+    # prediction, plus one column per logged feature (NaN where a model did not use it)
+    import pandas as pd
+
+    frames = []
+    for path in sorted(Path(directory).glob('predictions-*')):
+        if path.suffix == '.sqlite':
+            groups = _read_sqlite_segment(path)
+        elif path.suffix == '.parquet':
+            groups = _read_parquet_segment(path)
+        else:
+            continue
+        for names, features, columns in groups:
+            frame = pd.DataFrame(columns)
+            feature_frame = pd.DataFrame(features, columns=names.split(',') if names else None, index=frame.index)
+            frames.append(pd.concat([frame, feature_frame], axis=1))
+    if not frames:
+        return pd.DataFrame(columns=['request_id', 'row', 'ts', 'model_id', 'route', 'prediction'])
+    return pd.concat(frames, ignore_index=True)
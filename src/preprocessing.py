@@ -0,0 +1,70 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+# Written by train.py next to the model artifacts and looked up by serve.py
+PREPROCESSING_FILE = 'preprocessing.json'
+PREPROCESSING_FORMAT_VERSION = 1
+
+
+# The fitted training-time preprocessing: mean imputation followed by the
+# StandardScaler affine transform. Stored as plain JSON so serving does not
+# need to unpickle sklearn objects to apply it.
+class Preprocessor:
+    def __init__(self, feature_names, fill_values, mean, scale):
+        self.feature_names = list(feature_names)
+        self.fill_values = np.asarray(fill_values, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def from_fitted(cls, feature_names, fill_values, scaler):
+        return cls(feature_names, fill_values, scaler.mean_, scaler.scale_)
+
+    def select(self, feature_names):
+        # Per-column transform, so a subset is exactly what refitting on those columns would give
+        index = [self.feature_names.index(name) for name in feature_names]
+        return Preprocessor(feature_names, self.fill_values[index], self.mean[index], self.scale[index])
+
+    @property
+    def fingerprint(self):
+        payload = json.dumps(self.to_dict(), sort_keys=True).encode()
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+    def impute(self, X):
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = np.broadcast_to(self.fill_values, X.shape)[missing]
+        return X
+
+    def transform(self, X):
+        # Same arithmetic as StandardScaler.transform, so results are bit-identical
+        X = self.impute(X)
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def to_dict(self):
+        return {
+            'format_version': PREPROCESSING_FORMAT_VERSION,
+            'feature_names': self.feature_names,
+            'fill_values': self.fill_values.tolist(),
+            'scaler_mean': self.mean.tolist(),
+            'scaler_scale': self.scale.tolist()
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return Path(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get('format_version') != PREPROCESSING_FORMAT_VERSION:
+            raise ValueError(f'Unsupported preprocessing format {data.get("format_version")} in {path}')
+        return cls(data['feature_names'], data['fill_values'], data['scaler_mean'], data['scaler_scale'])
@@ -0,0 +1,90 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# Minimal wall-clock sampling profiler. A background thread snapshots the stack
+# of every other thread every `interval_s` and counts identical stacks; the
+# result is exported in the "folded stacks" format read by flamegraph.pl,
+# speedscope and inferno. Only stacks with a frame matching `focus` are kept,
+# so the output concentrates on the predict path.
+class SamplingProfiler:
+    def __init__(self):
+        self.samples = Counter()
+        self.n_samples = 0
+        self.interval_s = None
+        self.focus = None
+        self.started_at = None
+        self.stopped_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration_s=30.0, interval_s=0.005, focus='predict'):
+        with self._lock:
+            if self.running:
+                raise RuntimeError('Profiler is already running')
+            self.samples = Counter()
+            self.n_samples = 0
+            self.interval_s = interval_s
+            self.focus = focus
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration_s,), name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @staticmethod
+    def _stack(frame):
+        # Root first, as the folded format expects; walking f_back avoids traceback's source lookups.
+        # No line numbers, so samples of one function aggregate into one flame graph box.
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            labels.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]})')
+            frame = frame.f_back
+        labels.reverse()
+        return labels
+
+    def _run(self, duration_s):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration_s
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._stack(frame)
+                if not self.focus or any(self.focus in label for label in stack):
+                    stacks.append(';'.join(stack))
+            with self._lock:
+                self.samples.update(stacks)
+                self.n_samples += 1
+            self._stop.wait(self.interval_s)
+        self.stopped_at = time.time()
+
+    def folded(self):
+        with self._lock:
+            stacks = self.samples.most_common()
+        return '\n'.join(f'{stack} {count}' for stack, count in stacks)
+
+    def status(self):
+        return {
+            'running': self.running,
+            'started_at': self.started_at,
+            'stopped_at': self.stopped_at,
+            'interval_s': self.interval_s,
+            'focus': self.focus,
+            'ticks': self.n_samples,
+            'distinct_stacks': len(self.samples)
+        }
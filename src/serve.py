@@ -1,21 +1,69 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import numpy as np
-import pickle
 import time
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, ValidationError
+import numpy as np
 import json
+import os
+import sys
+import threading
+import uuid
 from pathlib import Path
 from typing import Optional
 
+# Sibling modules are imported flat (as train.py does with data_prep), also under `uvicorn src.serve:app`
+_SRC_DIR = str(Path(__file__).resolve().parent)
+if _SRC_DIR not in sys.path:
+    sys.path.insert(0, _SRC_DIR)
+
+from batching import MicroBatcher
+from drift import DRIFT_PROFILE_FILE, DriftMonitor, load_profile
+from explain import PathExplainer
+from forest_engine import CompiledForest
+from model_index import LoadedModel, index_signature, load_model, resolve_active_model, resolve_model
+from model_pool import ModelPool, UnknownModel
+from prediction_cache import PredictionCache
+from prediction_log import PredictionLog
+import wire_formats
+from wire_formats import INTERVAL_COLUMNS, UnsupportedFormat
+
 try:
-    from prometheus_client import Counter, Histogram, make_asgi_app
+    from prometheus_client import REGISTRY, Counter, Gauge, Histogram, make_asgi_app
+    from starlette.routing import Match
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
     PROMETHEUS_AVAILABLE = True
 except ImportError:
     PROMETHEUS_AVAILABLE = False
     print('Warning: prometheus_client not available. Metrics will be disabled.')
 
+# Load the model in a background thread so the server accepts connections (and
+# answers the liveness probe) right away; /health reports ready once it is loaded
+STARTUP_IN_BACKGROUND = os.environ.get('STARTUP_IN_BACKGROUND', '1') == '1'
+startup_thread = None
+
+@asynccontextmanager
+async def lifespan(app):
+    # Model and feature config load here, not at import, so importing the module stays cheap
+    global startup_thread
+    if STARTUP_IN_BACKGROUND:
+        startup_thread = threading.Thread(target=startup, name='model-startup', daemon=True)
+        startup_thread.start()
+    else:
+        await run_in_threadpool(startup)
+    yield
+    if batcher is not None:
+        await batcher.stop()
+    if prediction_log is not None:
+        # Write out what is still buffered and seal the open segment
+        await run_in_threadpool(prediction_log.close)
+
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get('/')
 def root():
@@ -23,123 +71,956 @@ def root():
         'message': 'MLOps Boston House Price Prediction API',
         'endpoints': {
             'health': '/health',
+            'live': '/health/live',
             'predict': '/predict (POST)',
+            'predict_batch': '/predict/batch (POST)',
+            'explain': '/explain (POST)',
+            'explain_batch': '/explain/batch (POST)',
+            'models': '/models',
+            'reload': '/admin/reload (POST)',
+            'profile': '/admin/profile (GET, POST /start, POST /stop)',
             'docs': '/docs'
         }
     }
 
+def _metric(metric_cls, name, documentation, labelnames=(), **kwargs):
+    # Reuse an already registered collector so re-executing this module (tests, reloads) does not raise
+    existing = REGISTRY._names_to_collectors.get(name)
+    if existing is not None:
+        return existing
+    return metric_cls(name, documentation, labelnames, **kwargs)
+
+class _CallbackCollector:
+    # Exposes counters kept by a serving component, read at scrape time
+    def __init__(self, families_fn):
+        self.families_fn = families_fn
+
+    def collect(self):
+        return self.families_fn()
+
+def _register_callback_collector(name, families_fn):
+    if name not in REGISTRY._names_to_collectors:
+        REGISTRY.register(_CallbackCollector(families_fn))
+
 # Setup Prometheus metrics if available
 if PROMETHEUS_AVAILABLE:
-    requests_total = Counter('requests_total', 'Total number of requests', ['method', 'endpoint'])
-    request_duration = Histogram('request_duration_seconds', 'Duration of request processing in seconds', ['method', 'endpoint'])
+    requests_total = _metric(Counter, 'requests_total', 'Total number of requests', ['method', 'endpoint'])
+    request_duration = _metric(Histogram, 'request_duration_seconds', 'Duration of request processing in seconds', ['method', 'endpoint'])
     
+    predict_stage_duration = _metric(
+        Histogram, 'predict_stage_duration_seconds', 'Time spent in each stage of the predict path',
+        ['route', 'stage'],
+        buckets=(0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+    )
+
+    def _route_label(request):
+        # The matched route template, never the raw path, so label cardinality stays bounded
+        for route in app.routes:
+            match, _ = route.matches(request.scope)
+            if match == Match.FULL:
+                return route.path
+        return 'unmatched'
+
     @app.middleware('http')
     async def metrics_middleware(request, call_next):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        request.state.start_time = start_time
         response = await call_next(request)
-        duration = time.time() - start_time
-        
-        requests_total.labels(method=request.method, endpoint=request.url.path).inc()
-        request_duration.labels(method=request.method, endpoint=request.url.path).observe(duration)
+        duration = time.perf_counter() - start_time
+
+        endpoint = _route_label(request)
+        requests_total.labels(method=request.method, endpoint=endpoint).inc()
+        request_duration.labels(method=request.method, endpoint=endpoint).observe(duration)
         return response
     
+    model_reloads_total = _metric(Counter, 'model_reloads_total', 'Model hot reloads by result', ['result'])
+    microbatch_queue_depth = _metric(Gauge, 'microbatch_queue_depth', 'Rows waiting in the /predict micro-batch queue')
+    microbatch_batch_size = _metric(Histogram, 'microbatch_batch_size', 'Rows per coalesced model.predict call',
+                                    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+    microbatch_wait = _metric(Histogram, 'microbatch_wait_seconds', 'Time a row waited in the micro-batch queue',
+                              buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1))
+    model_predict_duration = _metric(
+        Histogram, 'model_predict_duration_seconds', 'Preprocessing + model time per call, by served model',
+        ['model_id'],
+        buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+    )
+
     # Mount metrics endpoint
     metrics_app = make_asgi_app()
     app.mount('/metrics', metrics_app)
 
-# Load top features configuration
+@contextmanager
+def _stage(route, stage):
+    # Times one stage of the predict path with a monotonic clock
+    if not PROMETHEUS_AVAILABLE:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        predict_stage_duration.labels(route=route, stage=stage).observe(time.perf_counter() - start)
+
+def _observe_parse(request, route):
+    # Body parsing and validation run between the middleware and the handler
+    start_time = getattr(request.state, 'start_time', None)
+    if PROMETHEUS_AVAILABLE and start_time is not None:
+        predict_stage_duration.labels(route=route, stage='parse').observe(time.perf_counter() - start_time)
+
+# Top features configuration, loaded by startup()
 top_features = []
 feature_names_map = {}
-config_paths = [Path('../top_features.json'), Path('top_features.json')]
-for config_path in config_paths:
-    if config_path.exists():
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-            top_features = config.get('top_features', [])
-            feature_names_map = config.get('feature_names', {})
-        print(f'Loaded {len(top_features)} top features from {config_path}')
-        break
-
-if not top_features:
+
+def _load_feature_config():
+    config_paths = [Path('../top_features.json'), Path('top_features.json')]
+    for config_path in config_paths:
+        if config_path.exists():
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+            print(f'Loaded {len(config.get("top_features", []))} top features from {config_path}')
+            return config.get('top_features', []), config.get('feature_names', {})
     print('Warning: top_features.json not found')
+    return [], {}
+
+# Model engine: 'sklearn' serves the unpickled estimator, 'compiled' serves the
+# flat-array CompiledForest exported by train.py (compiled from the pickle if no export is found)
+SERVING_ENGINE = os.environ.get('SERVING_ENGINE', 'sklearn')
+
+# Fold the training StandardScaler into the split thresholds at load time (implies the compiled engine)
+FOLD_SCALER = os.environ.get('FOLD_SCALER', '0') == '1'
 
-# Find the latest model saved (looking for the pickled sklearn model)
-model = None
-scaler: Optional[object] = None
+# Memory-map the compiled forest's node arrays read-only, so uvicorn workers share one copy
+MODEL_MMAP = os.environ.get('MODEL_MMAP', '1') == '1'
 
-# MLflow saves models in a specific directory structure
-# Look for the model.pkl file in the mlruns hierarchy
-model_candidates = list(Path('../mlruns').glob('**/model.pkl'))
-if not model_candidates:
-    model_candidates = list(Path('mlruns').glob('**/model.pkl'))
+# Serve the compact forest exported by train.py (float32 values, small index types) on memory-constrained nodes
+MODEL_COMPACT = os.environ.get('MODEL_COMPACT', '0') == '1'
 
-if model_candidates:
-    # Use the most recently modified model file
-    latest_model = max(model_candidates, key=lambda p: p.stat().st_mtime)
+# Poll the model index every N seconds and hot-reload when it changes (0 disables the watcher)
+MODEL_WATCH_INTERVAL_S = float(os.environ.get('MODEL_WATCH_INTERVAL_S', '0'))
+
+def _load_active_model():
+    # Resolve the active model from model_manifest.json or mlflow.db instead of walking mlruns
+    entry = resolve_active_model()
+    if entry is None:
+        print('Warning: No model.pkl found in mlruns directory')
+        return None
     try:
-        with open(latest_model, 'rb') as f:
-            model = pickle.load(f)
-        print(f'Model loaded from: {latest_model}')
-        # Try to locate a scaler (StandardScaler) near the model artifacts
+        return load_model(entry, engine=SERVING_ENGINE, feature_names=top_features, fold_scaler=FOLD_SCALER, mmap=MODEL_MMAP,
+                          compact=MODEL_COMPACT)
+    except Exception as e:
+        print(f'Error loading model from {entry["model_path"]}: {e}')
+        return None
+
+# The model being served, set by startup(). Handlers read this reference once per
+# request and reloads replace it with a single assignment, so in-flight requests
+# finish on the model they started with.
+active_model: Optional[LoadedModel] = None
+
+_reload_lock = threading.Lock()
+reload_status = {'state': 'idle', 'last_reload': None, 'last_error': None, 'index_signature': None}
+
+# Filled in as the process starts; reported by /health and printed once ready
+startup_report = {'import_seconds': None, 'feature_config_seconds': None, 'model_load_seconds': None,
+                  'startup_seconds': None, 'sklearn_imported': None}
+
+def reload_model():
+    global active_model, top_features, feature_names_map
+    # Loading happens outside the request path; only the final swap touches shared state
+    with _reload_lock:
+        reload_status['state'] = 'loading'
         try:
-            scaler_candidates = list(latest_model.parent.glob('**/*scaler*.pkl')) + list(latest_model.parent.glob('**/*StandardScaler*.pkl'))
-            if not scaler_candidates:
-                # fallback to searching mlruns root if not found next to model
-                scaler_candidates = list(Path('../mlruns').glob('**/*scaler*.pkl')) + list(Path('mlruns').glob('**/*scaler*.pkl'))
-            if scaler_candidates:
-                scaler_path = max(scaler_candidates, key=lambda p: p.stat().st_mtime)
-                try:
-                    with open(scaler_path, 'rb') as sf:
-                        scaler = pickle.load(sf)
-                    print(f'Scaler loaded from: {scaler_path}')
-                except Exception as e:
-                    print(f'Warning: found scaler at {scaler_path} but failed to load: {e}')
+            signature = index_signature()
+            # train.py rewrites top_features.json (and its Portuguese names) with every model
+            config_features, names_map = _load_feature_config()
+            new_model = _load_active_model()
+            if new_model is None:
+                raise RuntimeError('no model could be resolved from the model index')
+            _warm_explainer(new_model)
+            top_features = new_model.feature_names or config_features or top_features
+            feature_names_map = names_map
+            active_model = new_model
+            # train.py writes a new drift profile with every model
+            _reset_drift_monitor()
+            reload_status.update(state='idle', last_reload=time.time(), last_error=None, index_signature=signature)
+            if PROMETHEUS_AVAILABLE:
+                model_reloads_total.labels(result='success').inc()
+            print(f'Reloaded model {new_model.model_id or new_model.path} (version {new_model.version})')
+            return new_model
         except Exception as e:
-            print(f'Warning while searching for scaler: {e}')
+            reload_status.update(state='failed', last_error=str(e))
+            if PROMETHEUS_AVAILABLE:
+                model_reloads_total.labels(result='error').inc()
+            print(f'Error reloading model: {e}')
+            return None
+
+def _watch_model_index():
+    while True:
+        time.sleep(MODEL_WATCH_INTERVAL_S)
+        if index_signature() != reload_status['index_signature']:
+            reload_model()
+
+def startup():
+    global active_model, top_features, feature_names_map, prediction_log
+    started = time.perf_counter()
+    top_features, feature_names_map = _load_feature_config()
+    config_loaded = time.perf_counter()
+
+    reload_status['index_signature'] = index_signature()
+    active_model = _load_active_model()
+    if active_model is not None and active_model.feature_names and not top_features:
+        top_features = active_model.feature_names
+    _warm_explainer(active_model)
+    model_loaded = time.perf_counter()
+    _reset_drift_monitor()
+
+    if MODEL_WATCH_INTERVAL_S > 0:
+        threading.Thread(target=_watch_model_index, name='model-index-watcher', daemon=True).start()
+
+    if PREDICTION_LOG_DIR and prediction_log is None:
+        prediction_log = PredictionLog(
+            PREDICTION_LOG_DIR,
+            backend=PREDICTION_LOG_BACKEND,
+            capacity=PREDICTION_LOG_CAPACITY,
+            drop_policy=PREDICTION_LOG_POLICY,
+            flush_interval_s=PREDICTION_LOG_FLUSH_S,
+            rotate_rows=PREDICTION_LOG_ROTATE_ROWS,
+            rotate_interval_s=PREDICTION_LOG_ROTATE_S
+        ).start()
+        print(f'Logging predictions to {PREDICTION_LOG_DIR} ({PREDICTION_LOG_BACKEND}, {PREDICTION_LOG_POLICY})')
+
+    startup_report.update(
+        feature_config_seconds=round(config_loaded - started, 4),
+        model_load_seconds=round(model_loaded - config_loaded, 4),
+        startup_seconds=round(model_loaded - started, 4),
+        # The compiled engine serves without ever importing scikit-learn
+        sklearn_imported='sklearn' in sys.modules
+    )
+    print(f'Startup: import {startup_report["import_seconds"]}s, feature config '
+          f'{startup_report["feature_config_seconds"]}s, model load {startup_report["model_load_seconds"]}s '
+          f'(sklearn imported: {startup_report["sklearn_imported"]})')
+
+# Extra model versions picked per request (X-Model-Id header or `model_id` in the body),
+# loaded on first use and evicted least-recently-used past this budget (0 disables selection)
+MODEL_POOL_MEMORY_MB = float(os.environ.get('MODEL_POOL_MEMORY_MB', '1024'))
+
+def _load_pooled_model(model_id):
+    entry = resolve_model(model_id)
+    if entry is None:
+        raise UnknownModel(model_id)
+    loaded = load_model(entry, engine=SERVING_ENGINE, fold_scaler=FOLD_SCALER, mmap=MODEL_MMAP, compact=MODEL_COMPACT)
+    if not loaded.feature_names:
+        # Models trained before preprocessing.json existed use the served feature order
+        loaded.feature_names = list(top_features)
+    return loaded
+
+model_pool = ModelPool(_load_pooled_model, MODEL_POOL_MEMORY_MB * 1e6) if MODEL_POOL_MEMORY_MB > 0 else None
+
+def _model_pool_families():
+    pool = model_pool
+    for name, doc, attr in [
+        ('model_pool_loads', 'Models loaded into the pool', 'loads'),
+        ('model_pool_load_errors', 'Failed pool loads', 'load_errors'),
+        ('model_pool_hits', 'Requests served by an already loaded pooled model', 'hits'),
+        ('model_pool_evictions', 'Models evicted to stay within MODEL_POOL_MEMORY_MB', 'evictions')
+    ]:
+        family = CounterMetricFamily(name, doc, labels=['model_id'])
+        for model_id, value in (getattr(pool, attr).items() if pool is not None else ()):
+            family.add_metric([model_id], value)
+        yield family
+    load_seconds = GaugeMetricFamily('model_pool_load_seconds', 'Duration of the last load of each pooled model',
+                                     labels=['model_id'])
+    for model_id, value in (pool.load_seconds.items() if pool is not None else ()):
+        load_seconds.add_metric([model_id], value)
+    yield load_seconds
+    yield GaugeMetricFamily('model_pool_models', 'Models currently in the pool', value=len(pool) if pool is not None else 0)
+    yield GaugeMetricFamily('model_pool_bytes', 'Estimated memory held by pooled models',
+                            value=pool.bytes_used if pool is not None else 0)
+
+if PROMETHEUS_AVAILABLE:
+    _register_callback_collector('model_pool_loads', _model_pool_families)
+
+# Per-feature drift of live /predict inputs against the training profile saved by train.py
+DRIFT_MONITORING = os.environ.get('DRIFT_MONITORING', '1') == '1'
+DRIFT_WINDOW_S = float(os.environ.get('DRIFT_WINDOW_S', '3600'))
+DRIFT_MIN_ROWS = int(os.environ.get('DRIFT_MIN_ROWS', '100'))
+
+drift_monitor = None
+
+def _reset_drift_monitor():
+    global drift_monitor
+    drift_monitor = None
+    if not DRIFT_MONITORING:
+        return
+    for profile_path in [Path('..') / DRIFT_PROFILE_FILE, Path(DRIFT_PROFILE_FILE)]:
+        if profile_path.exists():
+            break
+    else:
+        print(f'Warning: {DRIFT_PROFILE_FILE} not found; drift monitoring disabled')
+        return
+    try:
+        profile = load_profile(profile_path)
     except Exception as e:
-        print(f'Error loading model from {latest_model}: {e}')
-else:
-    print('Warning: No model.pkl found in mlruns directory')
+        print(f'Warning: could not load {profile_path}: {e}')
+        return
+    profile_features = [feature['name'] for feature in profile['features']]
+    if profile_features != list(top_features):
+        print(f'Warning: {profile_path} describes {profile_features}, not the served features; drift monitoring disabled')
+        return
+    drift_monitor = DriftMonitor(profile, window_s=DRIFT_WINDOW_S, min_rows=DRIFT_MIN_ROWS)
+    print(f'Drift monitoring against {profile_path} ({profile["n_rows"]} training rows)')
+
+def _observe_drift(current, features_array):
+    # Only the active model's inputs are compared with its training profile
+    monitor = drift_monitor
+    if monitor is not None and current is active_model:
+        monitor.observe(features_array)
+
+def _drift_families():
+    monitor = drift_monitor
+    scores = monitor.scores() if monitor is not None else {}
+    families = {
+        'psi': GaugeMetricFamily('feature_drift_psi', 'Population stability index of live inputs vs the training profile',
+                                 labels=['feature']),
+        'ks': GaugeMetricFamily('feature_drift_ks', 'Largest CDF gap (binned KS statistic) vs the training profile',
+                                labels=['feature']),
+        'out_of_range': GaugeMetricFamily('feature_drift_out_of_range_ratio',
+                                          'Share of live values outside the training min/max', labels=['feature']),
+        'rows': GaugeMetricFamily('feature_drift_window_rows', 'Rows in the current drift window', labels=['feature'])
+    }
+    for feature, values in scores.items():
+        for key, family in families.items():
+            family.add_metric([feature], values[key])
+    yield from families.values()
+    yield CounterMetricFamily('drift_rows_observed', 'Rows compared with the drift profile',
+                              value=monitor.rows_observed if monitor is not None else 0)
+
+if PROMETHEUS_AVAILABLE:
+    _register_callback_collector('feature_drift_psi', _drift_families)
+
+# Opt-in audit log of every scored row: buffered in memory on the request path and
+# flushed in bulk by a background thread into segment files under this directory
+PREDICTION_LOG_DIR = os.environ.get('PREDICTION_LOG_DIR')
+PREDICTION_LOG_BACKEND = os.environ.get('PREDICTION_LOG_BACKEND', 'sqlite')
+PREDICTION_LOG_CAPACITY = int(os.environ.get('PREDICTION_LOG_CAPACITY', '100000'))
+PREDICTION_LOG_POLICY = os.environ.get('PREDICTION_LOG_POLICY', 'drop_newest')
+PREDICTION_LOG_FLUSH_S = float(os.environ.get('PREDICTION_LOG_FLUSH_S', '1'))
+PREDICTION_LOG_ROTATE_ROWS = int(os.environ.get('PREDICTION_LOG_ROTATE_ROWS', '1000000'))
+PREDICTION_LOG_ROTATE_S = float(os.environ.get('PREDICTION_LOG_ROTATE_S', '3600'))
+
+# Created by startup() when PREDICTION_LOG_DIR is set
+prediction_log = None
+
+def _prediction_log_families():
+    log = prediction_log
+    for name, doc, attr in [
+        ('prediction_log_logged', 'Rows accepted into the prediction log buffer', 'logged'),
+        ('prediction_log_dropped', 'Rows dropped because the buffer was full or a write failed', 'dropped'),
+        ('prediction_log_flushed', 'Rows written to prediction log segments', 'flushed'),
+        ('prediction_log_flush_errors', 'Failed prediction log writes', 'flush_errors'),
+        ('prediction_log_segments', 'Prediction log segment files opened', 'segments')
+    ]:
+        yield CounterMetricFamily(name, doc, value=getattr(log, attr) if log is not None else 0)
+    yield GaugeMetricFamily('prediction_log_buffered_rows', 'Rows waiting to be flushed',
+                            value=log.buffered_rows if log is not None else 0)
+
+if PROMETHEUS_AVAILABLE:
+    _register_callback_collector('prediction_log_logged', _prediction_log_families)
+
+def _request_id(request):
+    # Joins logged rows with outcomes later (e.g. the sale price for train.py); a client may supply its own
+    supplied = request.headers.get('x-request-id')
+    if supplied and len(supplied) <= 128:
+        return supplied
+    return uuid.uuid4().hex
+
+def _log_predictions(request_id, current, route, features_array, predictions, rows=None):
+    log = prediction_log
+    if log is not None:
+        log.log(request_id, current.model_id, route, current.feature_names or top_features, features_array,
+                predictions, rows)
+
+# Upper bound on rows accepted by /predict/batch and rows per vectorized call
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '10000'))
+PREDICT_CHUNK_SIZE = int(os.environ.get('PREDICT_CHUNK_SIZE', '1024'))
+
+# Opt-in coalescing of concurrent /predict calls into one model.predict per time window
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '0') == '1'
+MICROBATCH_WINDOW_MS = float(os.environ.get('MICROBATCH_WINDOW_MS', '2'))
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', '64'))
+
+# Opt-in LRU/TTL cache of predictions keyed on the feature row (0 entries disables it)
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', '0'))
+PREDICTION_CACHE_TTL_S = float(os.environ.get('PREDICTION_CACHE_TTL_S', '0'))
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S) if PREDICTION_CACHE_SIZE > 0 else None
+
+def _prediction_cache_families():
+    cache = prediction_cache
+    for name, doc, attr in [
+        ('prediction_cache_hits', 'Predictions served from the cache', 'hits'),
+        ('prediction_cache_misses', 'Cache lookups that ran the model', 'misses'),
+        ('prediction_cache_evictions', 'Entries evicted by the size bound or TTL', 'evictions'),
+        ('prediction_cache_invalidations', 'Cache flushes caused by a model change', 'invalidations')
+    ]:
+        yield CounterMetricFamily(name, doc, value=getattr(cache, attr) if cache is not None else 0)
+    yield GaugeMetricFamily('prediction_cache_entries', 'Entries currently cached', value=len(cache) if cache is not None else 0)
+
+if PROMETHEUS_AVAILABLE:
+    _register_callback_collector('prediction_cache_hits', _prediction_cache_families)
+
+# /explain: path-based per-feature contributions, built when a model loads and cached per
+# model version like predictions (EXPLAIN_CACHE_SIZE=0 disables the cache)
+EXPLAIN_PRECOMPUTE = os.environ.get('EXPLAIN_PRECOMPUTE', '1') == '1'
+EXPLAIN_CACHE_SIZE = int(os.environ.get('EXPLAIN_CACHE_SIZE', '10000'))
+explanation_cache = PredictionCache(EXPLAIN_CACHE_SIZE, PREDICTION_CACHE_TTL_S) if EXPLAIN_CACHE_SIZE > 0 else None
+
+def _explanation_cache_families():
+    cache = explanation_cache
+    for name, doc, attr in [
+        ('explanation_cache_hits', 'Explanations served from the cache', 'hits'),
+        ('explanation_cache_misses', 'Explanation lookups that missed the cache', 'misses')
+    ]:
+        yield CounterMetricFamily(name, doc, value=getattr(cache, attr) if cache is not None else 0)
+
+if PROMETHEUS_AVAILABLE:
+    _register_callback_collector('explanation_cache_hits', _explanation_cache_families)
 
 class InputData(BaseModel):
     features: list[float]
+    model_id: Optional[str] = None
+
+class BatchInputData(BaseModel):
+    rows: list[list[float]]
+    model_id: Optional[str] = None
+
+@app.get('/health/live')
+def live():
+    # Liveness: the process is up and serving HTTP, whether or not a model is loaded
+    return {'status': 'alive'}
 
 @app.get('/health')
 def health():
-    return {
-        'status': 'healthy', 
-        'model_loaded': model is not None,
+    # Readiness: 503 until a model is loaded, so no traffic is routed to a cold instance
+    current = active_model
+    body = {
+        'status': 'healthy' if current is not None else 'loading',
+        'model_loaded': current is not None,
+        'model_id': current.model_id if current is not None else None,
+        'model_version': current.version if current is not None else None,
+        'model_source': current.source if current is not None else None,
+        'engine': current.engine if current is not None else SERVING_ENGINE,
         'top_features': top_features,
         'n_features': len(top_features),
-        'scaler_loaded': scaler is not None
+        'scaler_loaded': current is not None and current.scaler is not None,
+        'scaler_folded': current is not None and current.scaler_folded,
+        'model_compact': current is not None and current.compact,
+        'prediction_cache_enabled': prediction_cache is not None,
+        'prediction_log': prediction_log.status() if prediction_log is not None else None,
+        'reload': {key: value for key, value in reload_status.items() if key != 'index_signature'},
+        'startup': startup_report
     }
+    if current is None:
+        return JSONResponse(status_code=503, content=body)
+    return body
 
-@app.post('/predict')
-def predict(input_data: InputData):
-    if model is None:
+def _check_ready():
+    # Snapshot the served model once so the whole request uses one consistent version
+    current = active_model
+    if current is None:
         raise HTTPException(status_code=500, detail='Model not loaded')
 
     if not top_features:
         raise HTTPException(status_code=500, detail='Feature configuration not loaded (top_features.json)')
+    return current
+
+async def _select_model(request, model_id=None):
+    # The active model unless the request names another one, which comes from the pool
+    model_id = model_id or request.headers.get('x-model-id')
+    current = active_model
+    if not model_id or (current is not None and model_id == current.model_id):
+        return _check_ready()
+    if model_pool is None:
+        raise HTTPException(status_code=400, detail='Model selection is disabled (MODEL_POOL_MEMORY_MB=0)')
+    try:
+        return await run_in_threadpool(model_pool.get, model_id)
+    except UnknownModel:
+        raise HTTPException(status_code=404, detail=f'Unknown model {model_id!r}')
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Failed to load model {model_id}: {e}')
+
+async def _read_model_and_request(request, route, model_cls):
+    # Resolve the model before reading the body (binary payloads are decoded against its
+    # features); a JSON body may still name the model itself
+    current = await _select_model(request)
+    payload = await _read_request(request, route, model_cls, current.feature_names or top_features)
+    body_model_id = getattr(payload, 'model_id', None)
+    if body_model_id and body_model_id != current.model_id:
+        header_model_id = request.headers.get('x-model-id')
+        if header_model_id and header_model_id != body_model_id:
+            raise HTTPException(status_code=400, detail=f'X-Model-Id {header_model_id!r} does not match model_id {body_model_id!r}')
+        current = await _select_model(request, body_model_id)
+    return current, payload
+
+def _uses_cache(current):
+    # The cache is bound to one model version; pooled models bypass it instead of flushing it
+    return prediction_cache is not None and current is active_model
+
+def _compiled_forest(current):
+    # Per-tree predictions and explanations come from the flat-array engine; a sklearn-served
+    # model is compiled once per loaded version, on the first request that needs it
+    if isinstance(current.model, CompiledForest):
+        return current.model
+    forest = current.compiled_forest
+    if forest is None:
+        forest = CompiledForest.from_sklearn(current.model, feature_names=current.feature_names)
+        current.compiled_forest = forest
+    return forest
+
+def _explainer(current):
+    explainer = current.explainer
+    if explainer is None:
+        started = time.perf_counter()
+        explainer = PathExplainer(_compiled_forest(current))
+        current.explainer = explainer
+        print(f'Built path explainer for {current.model_id or current.path} in {time.perf_counter() - started:.3f}s '
+              f'({explainer.nbytes / 1e6:.1f} MB)')
+    return explainer
+
+def _warm_explainer(current):
+    # Precomputed when a model loads, so the first /explain does not pay for it
+    if not EXPLAIN_PRECOMPUTE or current is None:
+        return
+    try:
+        _explainer(current)
+    except Exception as e:
+        print(f'Warning: could not build the path explainer: {e}')
+
+def _scale(features_array, current, route):
+    if current.scaler is None:
+        return features_array
+    try:
+        with _stage(route, 'scaler'):
+            return current.scaler.transform(features_array)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Scaler transform error: {e}')
+
+def _predict_array(features_array, current=None, route='/predict', interval=None):
+    # Scale and predict a 2-D array of rows with a single vectorized call each. With an
+    # interval level, returns {'mean', 'lower', 'upper', 'std'} arrays from one traversal
+    # of the per-tree leaf values instead of the predictions.
+    current = current or active_model
+    started = time.perf_counter()
+    features_array = _scale(features_array, current, route)
+    with _stage(route, 'predict'):
+        if interval is None:
+            predictions = np.asarray(current.model.predict(features_array), dtype=float)
+        else:
+            predictions = _compiled_forest(current).predict_interval(features_array, level=interval)
+    if PROMETHEUS_AVAILABLE:
+        model_predict_duration.labels(model_id=current.model_id or 'unknown').observe(time.perf_counter() - started)
+    return predictions
+
+def _record_microbatch(batch_size, queue_depth, waits):
+    if PROMETHEUS_AVAILABLE:
+        microbatch_batch_size.observe(batch_size)
+        microbatch_queue_depth.set(queue_depth)
+        for wait in waits:
+            microbatch_wait.observe(wait)
+
+batcher = None
+if MICROBATCH_ENABLED:
+    batcher = MicroBatcher(
+        predict_fn=lambda batch: _predict_array(batch),
+        max_batch_size=MICROBATCH_MAX_SIZE,
+        max_wait_s=MICROBATCH_WINDOW_MS / 1000.0,
+        on_batch=_record_microbatch
+    )
 
-    if len(input_data.features) != len(top_features):
-        raise HTTPException(status_code=400, detail=f'Expected {len(top_features)} features, got {len(input_data.features)}')
+def _body_docs(model_cls):
+    # The handlers read the raw body themselves, so describe the accepted payloads explicitly
+    binary = {'schema': {'type': 'string', 'format': 'binary'}}
+    content = {wire_formats.JSON: {'schema': model_cls.model_json_schema()}}
+    content.update({fmt: binary for fmt in (wire_formats.NPY, wire_formats.RAW, wire_formats.MSGPACK, wire_formats.ARROW)})
+    return {'requestBody': {'required': True, 'content': content}}
 
+async def _read_request(request, route, model_cls, feature_names):
+    # JSON is validated by pydantic straight from the raw bytes; binary formats are
+    # decoded into a (rows, features) array checked against the selected model's features
+    body = await request.body()
     try:
-        features_array = np.array(input_data.features).reshape(1, -1)
-        if scaler is not None:
+        fmt = wire_formats.media_type(request.headers.get('content-type'))
+        if fmt == wire_formats.JSON:
             try:
-                features_array = scaler.transform(features_array)
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f'Scaler transform error: {e}')
+                payload = model_cls.model_validate_json(body)
+            except ValidationError as e:
+                raise RequestValidationError(e.errors(include_url=False))
+        else:
+            payload = wire_formats.decode_rows(body, fmt, feature_names, dtype_header=request.headers.get('x-dtype'),
+                                               names_header=request.headers.get('x-feature-names'))
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f'Invalid request body: {e}')
+    _observe_parse(request, route)
+    return payload
+
+# ?interval=0.9 on the predict endpoints adds the central 90% range (lower/upper) and the
+# standard deviation (std) of the per-tree predictions to every row
+_INTERVAL_QUERY = Query(None, gt=0, lt=1, description='Coverage of the per-tree prediction range, e.g. 0.9')
+
+@app.post('/predict', openapi_extra=_body_docs(InputData))
+async def predict(request: Request, interval: Optional[float] = _INTERVAL_QUERY):
+    current, payload = await _read_model_and_request(request, '/predict', InputData)
+    n_features = len(current.feature_names or top_features)
+
+    if isinstance(payload, InputData):
+        if len(payload.features) != n_features:
+            raise HTTPException(status_code=400, detail=f'Expected {n_features} features, got {len(payload.features)}')
+        with _stage('/predict', 'array'):
+            features_array = np.array(payload.features).reshape(1, -1)
+    else:
+        if payload.shape[0] != 1:
+            raise HTTPException(status_code=400, detail=f'Expected 1 row, got {payload.shape[0]}; use /predict/batch')
+        features_array = payload
+    # JSON accepts NaN/Infinity too; rejecting them keeps the answer independent of FOLD_SCALER
+    if not np.isfinite(features_array).all():
+        raise HTTPException(status_code=400, detail='Features must be finite numbers')
+
+    _observe_drift(current, features_array)
+    accept = request.headers.get('accept')
+    request_id = _request_id(request)
+    use_cache = _uses_cache(current)
+    try:
+        if interval is not None:
+            # The cache and the micro-batcher only carry the mean, so intervals skip both
+            result = await run_in_threadpool(_predict_array, features_array, current, '/predict', interval)
+            prediction = float(result['mean'][0])
+            await _log_single(request_id, current, features_array, prediction)
+            content = {'prediction': prediction, **{name: float(result[name][0]) for name in INTERVAL_COLUMNS},
+                       'interval': interval}
+            return _respond('/predict', content, accept, current, request_id)
+
+        if use_cache:
+            cache_key = PredictionCache.key(features_array)
+            cached = prediction_cache.get(cache_key, current.version)
+            if cached is not None:
+                await _log_single(request_id, current, features_array, cached)
+                return _respond('/predict', {'prediction': cached}, accept, current, request_id)
+
+        # The micro-batcher predicts with whatever model is active when the batch flushes
+        prediction = None
+        if batcher is not None and current is active_model:
+            if PROMETHEUS_AVAILABLE:
+                microbatch_queue_depth.set(batcher.queue_depth + 1)
+            prediction = await batcher.submit(features_array[0])
+            if active_model is not current:
+                # A reload landed while the row was queued: the batch may have used the new model,
+                # so answer with the one this request (its id, log entry and cache version) is bound to
+                prediction = None
+        if prediction is None:
+            prediction = (await run_in_threadpool(_predict_array, features_array, current))[0]
 
-        prediction = model.predict(features_array)
-        return {'prediction': float(prediction[0])}
+        if use_cache:
+            prediction_cache.put(cache_key, float(prediction), current.version)
+        await _log_single(request_id, current, features_array, float(prediction))
+        return _respond('/predict', {'prediction': float(prediction)}, accept, current, request_id)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+async def _log_single(request_id, current, features_array, prediction):
+    # Only the 'block' policy can wait, and never on the event loop
+    log = prediction_log
+    if log is not None and log.blocking:
+        await run_in_threadpool(_log_predictions, request_id, current, '/predict', features_array, [prediction])
+    else:
+        _log_predictions(request_id, current, '/predict', features_array, [prediction])
+
+def _respond(route, content, accept=None, current=None, request_id=None):
+    # Encoded here rather than by FastAPI so serialization is timed as its own stage, in the
+    # format asked for in Accept (JSON via orjson when available)
+    with _stage(route, 'serialize'):
+        try:
+            body, media_type = wire_formats.encode(content, accept)
+        except UnsupportedFormat as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        headers = {}
+        if current is not None and current.model_id:
+            headers['X-Model-Id'] = current.model_id
+        if request_id is not None:
+            headers['X-Request-Id'] = request_id
+        binary = media_type not in (wire_formats.JSON, wire_formats.MSGPACK)
+        if 'n_errors' in content and binary:
+            # Binary bodies hold only the predictions (NaN for failed rows)
+            headers['X-Prediction-Errors'] = str(content['n_errors'])
+        if 'interval' in content and binary:
+            headers['X-Columns'] = ','.join(wire_formats.response_columns(content))
+        return Response(content=body, media_type=media_type, headers=headers)
+
+@app.post('/predict/batch', openapi_extra=_body_docs(BatchInputData))
+async def predict_batch(request: Request, interval: Optional[float] = _INTERVAL_QUERY):
+    current, payload = await _read_model_and_request(request, '/predict/batch', BatchInputData)
+    request_id = _request_id(request)
+    content = await run_in_threadpool(_predict_rows, payload, current, request_id, interval)
+    return _respond('/predict/batch', content, request.headers.get('accept'), current, request_id)
+
+def _validate_rows(payload, n_features, route):
+    # Returns (n_rows, features_array, valid_index, errors): the finite rows of the right
+    # width stacked in one array, their positions in the request, and one error per other row
+    errors = []
+    if isinstance(payload, BatchInputData):
+        rows = payload.rows
+        if len(rows) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f'Batch of {len(rows)} rows exceeds MAX_BATCH_SIZE={MAX_BATCH_SIZE}')
+
+        # Validate all rows in one pass: wrong-length rows are reported, the rest are stacked
+        valid_index = []
+        for i, row in enumerate(rows):
+            if len(row) != n_features:
+                errors.append({'index': i, 'detail': f'Expected {n_features} features, got {len(row)}'})
+            else:
+                valid_index.append(i)
+        n_rows = len(rows)
+        features_array = np.empty((0, n_features))
+        if valid_index:
+            with _stage(route, 'array'):
+                features_array = np.array([rows[i] for i in valid_index], dtype=float).reshape(-1, n_features)
+    else:
+        # Binary payloads arrive as one array whose width was already checked
+        n_rows = len(payload)
+        if n_rows > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f'Batch of {n_rows} rows exceeds MAX_BATCH_SIZE={MAX_BATCH_SIZE}')
+        valid_index = list(range(n_rows))
+        features_array = payload
+
+    finite = np.isfinite(features_array).all(axis=1)
+    for i in np.asarray(valid_index, dtype=np.intp)[~finite]:
+        errors.append({'index': int(i), 'detail': 'Features must be finite numbers'})
+    return n_rows, features_array[finite], np.asarray(valid_index, dtype=np.intp)[finite], errors
+
+def _predict_rows(payload, current, request_id=None, interval=None):
+    n_features = len(current.feature_names or top_features)
+    use_cache = _uses_cache(current) and interval is None
+    n_rows, features_array, valid_index, errors = _validate_rows(payload, n_features, '/predict/batch')
+
+    predictions = [None] * n_rows
+    extra_columns = {name: [None] * n_rows for name in INTERVAL_COLUMNS} if interval is not None else {}
+    if len(valid_index):
+        # Every scored row is logged, including those answered from the cache
+        logged_features, logged_index = features_array, valid_index
+        _observe_drift(current, features_array)
+
+        if use_cache:
+            # Answer repeated rows from the cache and only run the model on the misses
+            cache_keys = [PredictionCache.key(row) for row in features_array]
+            missed = np.ones(len(cache_keys), dtype=bool)
+            for j, key in enumerate(cache_keys):
+                cached = prediction_cache.get(key, current.version)
+                if cached is not None:
+                    predictions[valid_index[j]] = cached
+                    missed[j] = False
+            features_array = features_array[missed]
+            valid_index = valid_index[missed]
+            cache_keys = [key for key, miss in zip(cache_keys, missed) if miss]
+
+        try:
+            for start in range(0, len(features_array), PREDICT_CHUNK_SIZE):
+                chunk = features_array[start:start + PREDICT_CHUNK_SIZE]
+                chunk_pred = _predict_array(chunk, current, route='/predict/batch', interval=interval)
+                if interval is not None:
+                    for name, column in extra_columns.items():
+                        for i, value in zip(valid_index[start:start + PREDICT_CHUNK_SIZE], chunk_pred[name]):
+                            column[i] = float(value)
+                    chunk_pred = chunk_pred['mean']
+                for i, value in zip(valid_index[start:start + PREDICT_CHUNK_SIZE], chunk_pred):
+                    predictions[i] = float(value)
+            if use_cache:
+                for key, i in zip(cache_keys, valid_index):
+                    prediction_cache.put(key, predictions[i], current.version)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        _log_predictions(request_id, current, '/predict/batch', logged_features,
+                         [predictions[i] for i in logged_index], logged_index)
+
+    errors.sort(key=lambda err: err['index'])
+    content = {
+        'predictions': predictions,
+        **extra_columns,
+        'errors': errors,
+        'n_rows': n_rows,
+        'n_errors': len(errors)
+    }
+    if interval is not None:
+        content['interval'] = interval
+    return content
+
+def _explain_accept(request):
+    # Contributions are a (rows, features) matrix: only the structured formats can carry them
+    accept = request.headers.get('accept')
+    fmt = wire_formats.accepted_type(accept)
+    if fmt not in (wire_formats.JSON, wire_formats.MSGPACK):
+        raise HTTPException(status_code=406, detail='Explanations are returned as JSON or MessagePack')
+    return accept
+
+def _explain_rows(features_array, current, route):
+    # (predictions, contributions) for every row; the active model's repeated rows come from
+    # the explanation cache, the rest from one explainer call per chunk
+    n_rows = len(features_array)
+    predictions = np.empty(n_rows)
+    contributions = np.empty((n_rows, features_array.shape[1]))
+    use_cache = explanation_cache is not None and current is active_model
+    missed = np.ones(n_rows, dtype=bool)
+    if use_cache:
+        cache_keys = [PredictionCache.key(row) for row in features_array]
+        for j, key in enumerate(cache_keys):
+            cached = explanation_cache.get(key, current.version)
+            if cached is not None:
+                predictions[j], contributions[j] = cached
+                missed[j] = False
+
+    missed_index = np.flatnonzero(missed)
+    for start in range(0, len(missed_index), PREDICT_CHUNK_SIZE):
+        index = missed_index[start:start + PREDICT_CHUNK_SIZE]
+        scaled = _scale(features_array[index], current, route)
+        with _stage(route, 'explain'):
+            predictions[index], contributions[index] = _explainer(current).explain(scaled)
+        if use_cache:
+            for j in index:
+                explanation_cache.put(cache_keys[j], (float(predictions[j]), contributions[j].copy()), current.version)
+    return predictions, contributions
+
+def _explanation_features(current):
+    # Base value plus the feature keys and their Portuguese names from top_features.json
+    features = list(current.feature_names or top_features)
+    return {
+        'base_value': _explainer(current).bias,
+        'features': features,
+        'feature_names': [feature_names_map.get(feature, feature) for feature in features]
+    }
+
+@app.post('/explain', openapi_extra=_body_docs(InputData))
+async def explain(request: Request):
+    # Per-feature contributions to one prediction: prediction == base_value + sum(contributions)
+    current, payload = await _read_model_and_request(request, '/explain', InputData)
+    accept = _explain_accept(request)
+    n_features = len(current.feature_names or top_features)
+    if isinstance(payload, InputData):
+        if len(payload.features) != n_features:
+            raise HTTPException(status_code=400, detail=f'Expected {n_features} features, got {len(payload.features)}')
+        features_array = np.array(payload.features, dtype=float).reshape(1, -1)
+    else:
+        if payload.shape[0] != 1:
+            raise HTTPException(status_code=400, detail=f'Expected 1 row, got {payload.shape[0]}; use /explain/batch')
+        features_array = payload
+    if not np.isfinite(features_array).all():
+        raise HTTPException(status_code=400, detail='Features must be finite numbers')
+
+    try:
+        predictions, contributions = await run_in_threadpool(_explain_rows, features_array, current, '/explain')
+        content = {
+            'prediction': float(predictions[0]),
+            **_explanation_features(current),
+            'values': features_array[0].tolist(),
+            'contributions': contributions[0].tolist()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Explanation error: {e}')
+    return _respond('/explain', content, accept, current, _request_id(request))
+
+@app.post('/explain/batch', openapi_extra=_body_docs(BatchInputData))
+async def explain_batch(request: Request):
+    current, payload = await _read_model_and_request(request, '/explain/batch', BatchInputData)
+    accept = _explain_accept(request)
+    content = await run_in_threadpool(_explain_batch, payload, current)
+    return _respond('/explain/batch', content, accept, current, _request_id(request))
+
+def _explain_batch(payload, current):
+    n_features = len(current.feature_names or top_features)
+    n_rows, features_array, valid_index, errors = _validate_rows(payload, n_features, '/explain/batch')
+    predictions = [None] * n_rows
+    contributions = [None] * n_rows
+    try:
+        if len(valid_index):
+            row_predictions, row_contributions = _explain_rows(features_array, current, '/explain/batch')
+            for i, prediction, row in zip(valid_index, row_predictions, row_contributions):
+                predictions[i] = float(prediction)
+                contributions[i] = row.tolist()
+        features = _explanation_features(current)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f'Explanation error: {e}')
+
+    errors.sort(key=lambda err: err['index'])
+    return {
+        'predictions': predictions,
+        **features,
+        'contributions': contributions,
+        'errors': errors,
+        'n_rows': n_rows,
+        'n_errors': len(errors)
+    }
+
+@app.get('/models')
+def models():
+    # The active model plus the versions currently held by the pool, most recently used first
+    current = active_model
+    return {
+        'active_model_id': current.model_id if current is not None else None,
+        'pool': model_pool.status() if model_pool is not None else None
+    }
+
+@app.post('/admin/reload')
+def admin_reload(wait: bool = False):
+    # Load the model currently named by the index and swap it in; by default in the background
+    if wait:
+        new_model = reload_model()
+        if new_model is None:
+            raise HTTPException(status_code=500, detail=f'Reload failed: {reload_status["last_error"]}')
+        return {'status': 'reloaded', 'model_id': new_model.model_id, 'model_version': new_model.version}
+
+    threading.Thread(target=reload_model, name='model-reload', daemon=True).start()
+    return {'status': 'reloading'}
+
+# Sampling profiler for the predict path, created on first use through the admin endpoint
+profiler = None
+
+@app.post('/admin/profile/start')
+def admin_profile_start(duration_s: float = 30.0, interval_ms: float = 5.0, focus: str = 'predict'):
+    # Samples every thread's stack for up to duration_s; keeps stacks with a frame matching `focus`
+    global profiler
+    if profiler is None:
+        from profiling import SamplingProfiler
+        profiler = SamplingProfiler()
+    try:
+        profiler.start(duration_s=duration_s, interval_s=interval_ms / 1000.0, focus=focus or None)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+@app.post('/admin/profile/stop')
+def admin_profile_stop():
+    if profiler is None:
+        raise HTTPException(status_code=404, detail='Profiler has not been started')
+    profiler.stop()
+    return profiler.status()
+
+@app.get('/admin/profile')
+def admin_profile(format: str = 'folded'):
+    # Folded stacks ("frame;frame;frame count"), ready for flamegraph.pl or speedscope
+    if profiler is None:
+        raise HTTPException(status_code=404, detail='Profiler has not been started')
+    if format == 'json':
+        return profiler.status()
+    return PlainTextResponse(profiler.folded())
+
+startup_report['import_seconds'] = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host='0.0.0.0', port=8000)
\ No newline at end of file
@@ -0,0 +1,42 @@
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# Training arrays handed to ProcessPoolExecutor workers (hyperparameter search, cross-validation):
+# written once as .npy files, then opened by every worker as read-only memmaps, so all
+# processes map the same pages instead of each receiving a pickled copy per task.
+arrays = {}
+
+
+@contextmanager
+def shared_directory(prefix, **named_arrays):
+    directory = tempfile.mkdtemp(prefix=prefix)
+    try:
+        for name, array in named_arrays.items():
+            np.save(Path(directory) / f'{name}.npy', np.ascontiguousarray(array))
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def attach(directory):
+    # Pool initializer: maps every array of the shared directory into this process
+    for path in Path(directory).glob('*.npy'):
+        arrays[path.stem] = np.load(path, mmap_mode='r')
+
+
+def map_shared(fn, directory, n_workers, *iterables):
+    # fn over the zipped iterables in a pool of n_workers processes attached to `directory`,
+    # or in this process when n_workers == 1
+    if n_workers == 1:
+        attach(directory)
+        try:
+            return list(map(fn, *iterables))
+        finally:
+            arrays.clear()
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=attach, initargs=(directory,)) as pool:
+        return list(pool.map(fn, *iterables))
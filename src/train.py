@@ -1,4 +1,12 @@
-from data_prep import load_and_prepare_data
+from cross_validation import cross_validate, log_cv_results
+from data_prep import load_dataset, prepare_data
+from drift import DRIFT_PROFILE_FILE, build_reference_profile, save_profile
+from feature_ranking import RANKING_METHODS, rank_features, ranking_agreement
+from hyperparameter_search import SEARCH_MODES, candidate_configurations, log_search_results, run_search
+from forest_engine import COMPACT_FOREST_DIR, COMPILED_FOREST_DIR, CompiledForest
+from model_index import MODEL_MANIFEST_FILE, resolve_active_model, write_manifest
+from prediction_log import read_log
+from preprocessing import PREPROCESSING_FILE, Preprocessor
 
 from sklearn.ensemble import RandomForestRegressor  
 from sklearn.metrics import (mean_squared_error, 
@@ -7,121 +15,632 @@ from sklearn.metrics import (mean_squared_error,
                              mean_absolute_percentage_error)
 import mlflow
 import mlflow.sklearn
+import argparse
 import json
+import os
+import pickle
+import sys
+import time
 import warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+   import resource
+except ImportError:  # Windows
+   resource = None
 
 # Suppress specific warnings for cleaner output (MLflow 3.x & sklearn)
 warnings.filterwarnings(action='ignore', category=UserWarning, module='sklearn')
 warnings.filterwarnings(action='ignore', module='mlflow')
 
-def train_and_evaluate_model():
+# Brazilian Portuguese names shown by the Streamlit app for the selected features
+FEATURE_TRANSLATIONS = {
+   'OverallQual': 'Qualidade Geral (1-10)',
+   'GrLivArea': 'Área de Convivência (m²)',
+   'TotalBsmtSF': 'Área Total do Porão (m²)',
+   'BsmtFinSF1': 'Área do Porão Acabada (m²)',
+   '2ndFlrSF': 'Área do 2º Piso (m²)',
+   '1stFlrSF': 'Área do 1º Piso (m²)',
+   'LotArea': 'Tamanho do Terreno (m²)',
+   'GarageCars': 'Capacidade da Garagem (Vagas)',
+   'GarageArea': 'Área da Garagem (m²)',
+   'YearBuilt': 'Ano de Construção',
+   'FullBath': 'Banheiros Completos',
+   'TotRmsAbvGrd': 'Total de Cômodos (acima do solo)',
+   'YearRemodAdd': 'Ano de Remodelação',
+   'Fireplaces': 'Lareiras',
+   'LotFrontage': 'Frente do Terreno (m)',
+   'WoodDeckSF': 'Área de Deck de Madeira (m²)',
+   'OpenPorchSF': 'Área de Varanda Aberta (m²)'
+}
+
+def _peak_rss_mb():
+   if resource is None:
+      return None
+   peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+   # ru_maxrss is reported in bytes on macOS and in KiB on Linux
+   return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class StageTimer:
+   # Wall time and process peak RSS recorded at the end of each training stage
+   def __init__(self):
+      self.seconds = {}
+      self.peak_rss_mb = {}
+
+   @contextmanager
+   def stage(self, name):
+      start = time.perf_counter()
+      try:
+         yield
+      finally:
+         self.seconds[name] = time.perf_counter() - start
+         self.peak_rss_mb[name] = _peak_rss_mb()
+
+   def as_metrics(self):
+      metrics = {f'stage_{name}_seconds': seconds for name, seconds in self.seconds.items()}
+      peaks = [peak for peak in self.peak_rss_mb.values() if peak is not None]
+      if peaks:
+         metrics['peak_rss_mb'] = max(peaks)
+      return metrics
+
+   def report(self):
+      print('=' * 54)
+      print('\t\tSTAGE TIMINGS')
+      for name, seconds in self.seconds.items():
+         peak = self.peak_rss_mb[name]
+         peak_text = f' | peak RSS {peak:.0f} MB' if peak is not None else ''
+         print(f'{name:<10} {seconds:8.3f}s{peak_text}')
+      print('=' * 54 + '\n')
+
+# Name under which a model selected by the hyperparameter search is registered
+REGISTERED_MODEL_NAME = os.environ.get('REGISTERED_MODEL_NAME', 'house-price-random-forest')
+
+def fit_final_model(X_train, y_train, n_estimators=100, random_state=42, **params):
+   model = RandomForestRegressor(n_estimators=n_estimators, random_state=random_state, **params)
+   model.fit(X=X_train, y=y_train)
+   return model
+
+def evaluate_model(model, X_test, y_test):
+   y_pred = model.predict(X=X_test)
+   return {
+      'mse': mean_squared_error(y_true=y_test, y_pred=y_pred),
+      'r2': r2_score(y_true=y_test, y_pred=y_pred),
+      'mae': mean_absolute_error(y_true=y_test, y_pred=y_pred),
+      'mape': mean_absolute_percentage_error(y_true=y_test, y_pred=y_pred)
+   }
+
+def _artifact_bytes(path):
+   path = Path(path)
+   if path.is_dir():
+      return sum(p.stat().st_size for p in path.iterdir())
+   return path.stat().st_size
+
+def _load_seconds(load, repeat=3):
+   best = float('inf')
+   for _ in range(repeat):
+      start = time.perf_counter()
+      load()
+      best = min(best, time.perf_counter() - start)
+   return best
+
+def compaction_report(model, compiled_path, compact_path, X_test, y_test, metrics):
+   # Artifact size, load time and accuracy of the pickled estimator, the compiled
+   # export and its compact copy, so compacted models can be picked per node
+   pickled = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+   compact_forest = CompiledForest.load(compact_path, mmap=False)
+   compact_metrics = evaluate_model(compact_forest, X_test, y_test)
+   return {
+      'artifact_bytes_pickle': len(pickled),
+      'artifact_bytes_compiled': _artifact_bytes(compiled_path),
+      'artifact_bytes_compact': _artifact_bytes(compact_path),
+      'load_seconds_pickle': _load_seconds(lambda: pickle.loads(pickled)),
+      'load_seconds_compiled': _load_seconds(lambda: CompiledForest.load(compiled_path, mmap=False)),
+      'load_seconds_compact': _load_seconds(lambda: CompiledForest.load(compact_path, mmap=False)),
+      'compact_mse': compact_metrics['mse'],
+      'compact_r2': compact_metrics['r2'],
+      'compact_mse_delta': compact_metrics['mse'] - metrics['mse'],
+      'compact_r2_delta': compact_metrics['r2'] - metrics['r2'],
+      'compact_n_trees': compact_forest.n_trees,
+      'compact_max_depth': compact_forest.max_depth
+   }
+
+def load_logged_training_rows(log_dir, labels_path, feature_names, preprocessor, target='SalePrice'):
+   # Rows scored by serve.py (PREDICTION_LOG_DIR) joined on request_id/row with their
+   # observed prices; the logged predictions themselves are never used as labels
+   logged = read_log(log_dir)
+   labels = pd.read_csv(labels_path, dtype={'request_id': str})
+   if 'row' not in labels.columns:
+      labels['row'] = 0
+   joined = logged.merge(labels[['request_id', 'row', target]], on=['request_id', 'row'])
+   missing = [name for name in feature_names if name not in joined.columns]
+   if missing:
+      print(f'Warning: the prediction log has no {missing} columns; ignoring it')
+      return np.empty((0, len(feature_names))), np.empty(0)
+   # Rows scored by a model with another feature set lack some of these columns
+   joined = joined.dropna(subset=list(feature_names) + [target])
+   print(f'Prediction log: {len(logged)} logged rows, {len(joined)} with an observed {target}')
+   X_extra = preprocessor.transform(joined[list(feature_names)].to_numpy(dtype=np.float64))
+   return X_extra, joined[target].to_numpy(dtype=np.float64)
+
+def read_new_rows(path, target='SalePrice'):
+   # Newly labelled sales: a CSV with any of the dataset's numeric columns plus the target.
+   # Columns it lacks are imputed by the preprocessing like any other missing value.
+   frame = pd.read_csv(path)
+   if target not in frame.columns:
+      raise ValueError(f'{path} has no {target} column')
+   frame = frame.dropna(subset=[target])
+   return frame.drop(columns=[target]).select_dtypes('number'), frame[target].to_numpy(dtype=np.float64)
+
+def export_serving_artifacts(model, feature_names, preprocessor, timer, compact_max_trees=None,
+                             compact_max_depth=None, compact_target_mb=None):
+   # Persist the fitted imputation + scaler so serving applies exactly this transform
+   preprocessing_path = preprocessor.save(PREPROCESSING_FILE)
+   print(f'Saved preprocessing to {preprocessing_path}')
+
+   # Export the forest as flat NumPy node arrays (memory-mappable .npy files) for the compiled serving engine
+   compiled = CompiledForest.from_sklearn(model, feature_names=feature_names)
+   compiled_path = compiled.save(COMPILED_FOREST_DIR)
+   print(f'Saved compiled forest to {compiled_path}')
+
+   # Compact copy for memory-constrained nodes (served with MODEL_COMPACT=1): float32
+   # thresholds/values, smallest integer index types, optionally pruned to a size
+   with timer.stage('compact'):
+      target_bytes = compact_target_mb * 1e6 if compact_target_mb else None
+      compact_path = compiled.compact(max_trees=compact_max_trees, max_depth=compact_max_depth,
+                                      target_bytes=target_bytes).save(COMPACT_FOREST_DIR)
+   print(f'Saved compact forest to {compact_path}')
+   return compiled_path, compact_path, preprocessing_path
+
+def print_metrics(metrics):
+   print(f'\n=== Final Model Performance (with top 10 features) ===')
+   print('=' * 54)
+   print('\t\tMETRICS')
+   print(f"Mean Squared Error: {metrics['mse']:.4f}")
+   print(f"R^2 Score: {metrics['r2']:.4f}")
+   print(f"Mean Absolute Error: {metrics['mae']:.4f}")
+   print(f"Mean Absolute Percentage Error: {metrics['mape']:.4f}")
+   print('=' * 54 + '\n')
+
+def print_compaction(compaction):
+   print(f"Compact forest: {compaction['artifact_bytes_compact'] / 1e6:.1f} MB "
+         f"(compiled {compaction['artifact_bytes_compiled'] / 1e6:.1f} MB, pickle {compaction['artifact_bytes_pickle'] / 1e6:.1f} MB), "
+         f"load {compaction['load_seconds_compact'] * 1e3:.1f} ms, "
+         f"MSE delta {compaction['compact_mse_delta']:+.4f}, R^2 delta {compaction['compact_r2_delta']:+.6f}")
+
+def log_model_version(timer, run_metrics, params, model, feature_names, preprocessor, compiled_path, compact_path,
+                      preprocessing_path, drift_profile_path=None, search_results=None, cv_results=None,
+                      registered_model_name=None):
+   # Log one trained version to MLflow and point serving at it through the manifest
+   try:
+      with timer.stage('log'), mlflow.start_run() as run:
+         # Batched calls: one SQLite write for all metrics and one for all params.
+         # Timings of every stage before this one, plus the peak memory so far
+         mlflow.log_metrics({**run_metrics, **timer.as_metrics()})
+         mlflow.log_params(params)
+         if search_results is not None:
+            log_search_results(mlflow, search_results)
+         if cv_results is not None:
+            log_cv_results(mlflow, cv_results)
+
+         # Updated for MLflow 3.x compatibility; the search winner is registered as a new version
+         model_info = mlflow.sklearn.log_model(
+            sk_model=model,
+            name='random_forest_model',
+            registered_model_name=registered_model_name
+         )
+         mlflow.log_artifacts(str(compiled_path), artifact_path=COMPILED_FOREST_DIR)
+         mlflow.log_artifacts(str(compact_path), artifact_path=COMPACT_FOREST_DIR)
+         mlflow.log_artifact(str(preprocessing_path))
+         if drift_profile_path is not None:
+            mlflow.log_artifact(str(drift_profile_path))
+
+      logged_model = mlflow.get_logged_model(model_info.model_id)
+      model_dir = Path(logged_model.artifact_location.replace('file://', ''))
+      # The run's own copy of the serving exports: the repo-root ones are overwritten by the next training
+      run_artifacts = Path(run.info.artifact_uri.replace('file://', ''))
+   except Exception as e:
+      print(f'MLflow logging error: {e}')
+      print('Model training completed without MLflow logging.')
+      return None
+
+   # Point serving at this model without it having to scan mlruns. Outside the MLflow error
+   # handling: if the manifest cannot be written the run fails instead of serving staying on
+   # the previous model unnoticed.
+   manifest_path = write_manifest(
+      MODEL_MANIFEST_FILE,
+      model_id=model_info.model_id,
+      run_id=run.info.run_id,
+      model_path=model_dir / 'model.pkl',
+      compiled_path=run_artifacts / COMPILED_FOREST_DIR,
+      compact_path=run_artifacts / COMPACT_FOREST_DIR,
+      top_features=feature_names,
+      preprocessing_path=run_artifacts / Path(preprocessing_path).name,
+      preprocessing_fingerprint=preprocessor.fingerprint
+   )
+   print(f'Saved model manifest to {manifest_path}')
+   return model_info.model_id
+
+def train_and_evaluate_model(cache_dir=None, ranking_method='full', compare_ranking=False, search=None,
+                             search_iterations=20, search_workers=None, compact_max_trees=None,
+                             compact_max_depth=None, compact_target_mb=None, prediction_log_dir=None,
+                             prediction_labels=None, new_data=None, cv_folds=0, cv_repeats=1, cv_workers=None,
+                             cv_measure_serial=False):
+   # Stages are memoized on their inputs under cache_dir (None disables caching)
+   memory = joblib.Memory(cache_dir, verbose=0)
+   timer = StageTimer()
+
    # Step 1: Load data with ALL numeric features
    print('\n=== Step 1: Loading data with all numeric features ===')
-   X_train, X_test, y_train, y_test, all_feature_names = load_and_prepare_data()
+   with timer.stage('load'):
+      X, y, _ = load_dataset()
+
+   with timer.stage('impute'):
+      X_train, X_test, y_train, y_test, all_feature_names, full_preprocessor = \
+         prepare_data(X, y, return_preprocessor=True)
    print(f'Total features available: {len(all_feature_names)}')
    print(f'Features: {all_feature_names}')
 
+   # Newly labelled sales join the training split before ranking, so a shift in what
+   # drives prices can change the selected features
+   n_new_rows = 0
+   if new_data:
+      X_new, y_new = read_new_rows(new_data)
+      n_new_rows = len(y_new)
+      X_train = np.vstack([X_train, full_preprocessor.transform(
+         X_new.reindex(columns=all_feature_names).to_numpy(dtype=np.float64))])
+      y_train = np.concatenate([np.asarray(y_train, dtype=np.float64), y_new])
+      print(f'Added {n_new_rows} rows from {new_data} to the training split')
+
    # Step 2: Train initial model to identify important features
-   print('\n=== Step 2: Training initial model with all features ===')
-   initial_model = RandomForestRegressor(
-      bootstrap=True, 
-      max_depth=50,
-      n_estimators=500, 
-      n_jobs=-1,
-      random_state=42
-   )
-   initial_model.fit(X=X_train, y=y_train)
+   print(f'\n=== Step 2: Ranking all features (method: {ranking_method}) ===')
+   with timer.stage('rank'):
+      sorted_importance, ranking_info = memory.cache(rank_features)(
+         X_train, y_train, all_feature_names, method=ranking_method, top_k=10
+      )
+   print(f'Ranking details: {ranking_info}')
+
+   # Optionally measure how much selection quality the fast ranking gave up
+   agreement = None
+   if compare_ranking and ranking_method != 'full':
+      with timer.stage('rank_full'):
+         full_importance, _ = memory.cache(rank_features)(X_train, y_train, all_feature_names, method='full', top_k=10)
+      agreement = ranking_agreement(sorted_importance, full_importance, top_k=10)
+      print(f"Agreement with the full ranking: top-10 overlap {agreement['top_k_overlap']:.0%}, "
+            f"Spearman {agreement['spearman']:.3f}, missing {agreement['missing']}")
 
    # Step 3: Get top 10 features based on feature importance
    print('\n=== Step 3: Extracting top 10 most important features ===')
-   feature_importance = initial_model.feature_importances_
-   importance_dict = {
-      name: score for name, score in zip(all_feature_names, feature_importance)
-   }
-   sorted_importance = sorted(importance_dict.items(), key=lambda x: x[1], reverse=True)
-   
    top_10_features = [name for name, score in sorted_importance[:10]]
    for i, (name, score) in enumerate(sorted_importance[:10], 1):
       print(f'{i}. {name}: {score:.4f}')
    
    # Save top 10 features and their Brazilian Portuguese names to JSON
-   feature_translations = {
-      'OverallQual': 'Qualidade Geral (1-10)',
-      'GrLivArea': 'Área de Convivência (m²)',
-      'TotalBsmtSF': 'Área Total do Porão (m²)',
-      'BsmtFinSF1': 'Área do Porão Acabada (m²)',
-      '2ndFlrSF': 'Área do 2º Piso (m²)',
-      '1stFlrSF': 'Área do 1º Piso (m²)',
-      'LotArea': 'Tamanho do Terreno (m²)',
-      'GarageCars': 'Capacidade da Garagem (Vagas)',
-      'GarageArea': 'Área da Garagem (m²)',
-      'YearBuilt': 'Ano de Construção',
-      'FullBath': 'Banheiros Completos',
-      'TotRmsAbvGrd': 'Total de Cômodos (acima do solo)',
-      'YearRemodAdd': 'Ano de Remodelação',
-      'Fireplaces': 'Lareiras',
-      'LotFrontage': 'Frente do Terreno (m)',
-      'WoodDeckSF': 'Área de Deck de Madeira (m²)',
-      'OpenPorchSF': 'Área de Varanda Aberta (m²)'
-   }
-   
    features_config = {
       'top_features': top_10_features,
-      'feature_names': {f: feature_translations.get(f, f) for f in top_10_features}
+      'feature_names': {f: FEATURE_TRANSLATIONS.get(f, f) for f in top_10_features}
    }
    
    with open('top_features.json', 'w') as f:
       json.dump(features_config, f, indent=2)
    print(f'\nSaved top 10 features to top_features.json')
 
-   # Step 4: Reload data with only top 10 features and retrain
+   # Step 4: Retrain with only the top 10 columns of the data already in memory
    print('\n=== Step 4: Retraining model with only top 10 features ===')
-   X_train_top10, X_test_top10, y_train_top10, y_test_top10, feature_names = \
-      load_and_prepare_data(selected_features=top_10_features)
-   
-   # Train final model with top 10 features
-   model = RandomForestRegressor(n_estimators=100, random_state=42)
-   model.fit(X=X_train_top10, y=y_train_top10)
+   # Imputation and scaling are per column, so slicing the prepared arrays is
+   # identical to preparing the 10 columns from scratch
+   top_index = [all_feature_names.index(name) for name in top_10_features]
+   X_train_top10 = X_train[:, top_index]
+   X_test_top10 = X_test[:, top_index]
+   preprocessor = full_preprocessor.select(top_10_features)
+
+   # Labelled rows from the serving prediction log join the training split only; the test split is untouched
+   n_logged_rows = 0
+   if prediction_log_dir:
+      with timer.stage('pred_log'):
+         X_extra, y_extra = load_logged_training_rows(prediction_log_dir, prediction_labels, top_10_features,
+                                                      preprocessor)
+      n_logged_rows = len(y_extra)
+      if n_logged_rows:
+         X_train_top10 = np.vstack([X_train_top10, X_extra])
+         y_train = np.concatenate([np.asarray(y_train, dtype=np.float64), y_extra])
+         print(f'Added {n_logged_rows} rows from the prediction log to the training split')
+
+   # Optionally pick the forest configuration with a parallel search on a validation split
+   best_params = {'n_estimators': 100}
+   search_results = None
+   if search:
+      with timer.stage('search'):
+         configurations = candidate_configurations(search, n_iter=search_iterations, random_state=42)
+         print(f'Searching {len(configurations)} RandomForest configurations ({search})')
+         search_results = run_search(X_train_top10, y_train, configurations, n_workers=search_workers)
+      best_params, best_metrics = search_results[0]
+      print(f"Best configuration: {best_params} (validation MSE {best_metrics['val_mse']:.4f})")
+
+   with timer.stage('refit'):
+      # Train final model with top 10 features
+      model = memory.cache(fit_final_model)(X_train_top10, y_train, random_state=42, **best_params)
 
-   # Make predictions
-   y_pred = model.predict(X=X_test_top10)
+   compiled_path, compact_path, preprocessing_path = export_serving_artifacts(
+      model, top_10_features, preprocessor, timer, compact_max_trees=compact_max_trees,
+      compact_max_depth=compact_max_depth, compact_target_mb=compact_target_mb)
+
+   # Reference distribution of the training inputs, in the raw units /predict receives,
+   # for the serving drift monitor
+   X_train_raw = X_train_top10 * preprocessor.scale + preprocessor.mean
+   drift_profile_path = save_profile(build_reference_profile(X_train_raw, top_10_features), DRIFT_PROFILE_FILE)
+   print(f'Saved drift profile to {drift_profile_path}')
 
    # Evaluate the model
-   mse = mean_squared_error(y_true=y_test_top10, y_pred=y_pred)
-   r2 = r2_score(y_true=y_test_top10, y_pred=y_pred)
-   mae = mean_absolute_error(y_true=y_test_top10, y_pred=y_pred)
-   mape = mean_absolute_percentage_error(y_true=y_test_top10, y_pred=y_pred)
+   with timer.stage('evaluate'):
+      metrics = evaluate_model(model, X_test_top10, y_test)
+   print_metrics(metrics)
 
-   print(f'\n=== Final Model Performance (with top 10 features) ===')
-   print('=' * 54)
-   print('\t\tMETRICS')
-   print(f'Mean Squared Error: {mse:.4f}')
-   print(f'R^2 Score: {r2:.4f}')
-   print(f'Mean Absolute Error: {mae:.4f}')
-   print(f'Mean Absolute Percentage Error: {mape:.4f}')
-   print('=' * 54 + '\n')
+   compaction = compaction_report(model, compiled_path, compact_path, X_test_top10, y_test, metrics)
+   print_compaction(compaction)
+
+   # The single holdout above is noisy; k-fold CV of the same configuration over all
+   # rows gives a steadier estimate. Folds run in parallel on memory-mapped arrays.
+   cv_results, cv_summary = None, {}
+   if cv_folds:
+      with timer.stage('cv'):
+         cv_results, cv_summary = cross_validate(
+            np.vstack([X_train_top10, X_test_top10]), np.concatenate([np.asarray(y_train), np.asarray(y_test)]),
+            best_params, n_splits=cv_folds, n_repeats=cv_repeats, n_workers=cv_workers,
+            measure_serial=cv_measure_serial)
+      print(f"{cv_folds}-fold CV x{cv_repeats}: MSE {cv_summary['cv_mse_mean']:.4f} ± {cv_summary['cv_mse_std']:.4f}, "
+            f"R^2 {cv_summary['cv_r2_mean']:.4f} ± {cv_summary['cv_r2_std']:.4f} "
+            f"in {cv_summary['cv_wall_seconds']:.2f}s on {cv_summary['cv_workers']} workers "
+            f"(speedup {cv_summary['cv_speedup']:.1f}x over {cv_summary['cv_serial_seconds']:.2f}s serial)")
 
    # Log metrics with MLflow
-   try:
-      with mlflow.start_run():
-         mlflow.log_metric('mse', mse)
-         mlflow.log_metric('r2', r2)
-         mlflow.log_metric('mae', mae)
-         mlflow.log_metric('mape', mape)
-
-         mlflow.log_param('model_type', 'RandomForestRegressor')
-         mlflow.log_param('n_estimators', 100)
-         mlflow.log_param('n_features', len(top_10_features))
-         mlflow.log_param('top_features', ','.join(top_10_features))
-         # Updated for MLflow 3.x compatibility
-         mlflow.sklearn.log_model(sk_model=model, name='random_forest_model')
-   except Exception as e:
-      print(f'MLflow logging error: {e}')
-      print('Model training completed without MLflow logging.')
+   run_metrics = {**metrics, **compaction, **cv_summary, 'new_data_rows': n_new_rows}
+   if agreement is not None:
+      run_metrics['ranking_top_k_overlap'] = agreement['top_k_overlap']
+      run_metrics['ranking_spearman'] = agreement['spearman']
+   params = {
+      'model_type': 'RandomForestRegressor',
+      'training_mode': 'full',
+      **best_params,
+      'n_features': len(top_10_features),
+      'top_features': ','.join(top_10_features),
+      'preprocessing_fingerprint': preprocessor.fingerprint,
+      'ranking_method': ranking_method,
+      'search': search or 'none',
+      'compact_max_trees': compact_max_trees,
+      'compact_max_depth': compact_max_depth,
+      'compact_target_mb': compact_target_mb,
+      'prediction_log_rows': n_logged_rows
+   }
+   log_model_version(timer, run_metrics, params, model, top_10_features, preprocessor, compiled_path, compact_path,
+                     preprocessing_path, drift_profile_path=drift_profile_path, search_results=search_results,
+                     cv_results=cv_results, registered_model_name=REGISTERED_MODEL_NAME if search else None)
+
+   timer.report()
+   return model, metrics
+
+# Below this many new rows the ranking check is skipped: a handful of sales cannot rank 36 features
+RANKING_CHECK_MIN_ROWS = 200
+
+def ranking_check(X_new, y_new, top_features, min_overlap=0.6, min_rows=RANKING_CHECK_MIN_ROWS):
+   # Rank the columns of the new rows with the fast subsample forest and compare the
+   # top 10 with the served features. Returns (shifted, agreement or None when skipped)
+   columns = [name for name in X_new.columns if X_new[name].notna().any()]
+   if len(y_new) < min_rows:
+      print(f'Ranking check skipped: {len(y_new)} new rows (needs {min_rows})')
+      return False, None
+   if not set(top_features) < set(columns):
+      print('Ranking check skipped: the new rows need the served features plus other columns to compare against')
+      return False, None
+   X_rank = X_new[columns].fillna(X_new[columns].median()).to_numpy(dtype=np.float64)
+   ranking, _ = rank_features(X_rank, y_new, columns, method='subsample', top_k=len(top_features))
+   # The served ranking only survives as an order, which is all ranking_agreement uses
+   agreement = ranking_agreement(ranking, [(name, 0.0) for name in top_features], top_k=len(top_features))
+   print(f"Ranking check: top-{len(top_features)} overlap {agreement['top_k_overlap']:.0%}, "
+         f"Spearman {agreement['spearman']:.3f}, missing {agreement['missing']}")
+   return agreement['top_k_overlap'] < min_overlap, agreement
+
+def extend_forest(model, X_new, y_new, n_new_trees=20, max_trees=None):
+   # warm_start fits only the added trees, on the new rows; the existing trees are kept
+   # as they are. With max_trees the oldest trees are then dropped, so the forest
+   # slides towards recent data at a constant size. Returns the number of trees dropped.
+   n_trees = len(model.estimators_)
+   model.set_params(warm_start=True, n_estimators=n_trees + n_new_trees)
+   model.fit(X=X_new, y=y_new)
+   n_dropped = 0
+   if max_trees is not None and len(model.estimators_) > max_trees:
+      n_dropped = len(model.estimators_) - max_trees
+      # estimators_ is in fitting order, oldest first
+      model.estimators_ = model.estimators_[n_dropped:]
+      model.set_params(n_estimators=len(model.estimators_))
+   model.set_params(warm_start=False)
+   return n_dropped
+
+def train_incrementally(new_data=None, prediction_log_dir=None, prediction_labels=None, n_new_trees=20,
+                        max_trees=None, holdout=0.2, min_ranking_overlap=0.6, compact_max_trees=None,
+                        compact_max_depth=None, compact_target_mb=None, **full_training):
+   # Extend the served forest with trees fitted on newly labelled rows only, keeping its
+   # features and preprocessing, so the cost follows the new data rather than the history.
+   # Falls back to train_and_evaluate_model when the ranking check finds the features moved.
+   timer = StageTimer()
+   print('\n=== Incremental training: extending the served model ===')
+   with timer.stage('load'):
+      entry = resolve_active_model()
+      if entry is None or entry.get('preprocessing_path') is None:
+         raise FileNotFoundError(f'Incremental training needs a served model with its {PREPROCESSING_FILE}; '
+                                 f'run a full training first')
+      with open(entry['model_path'], 'rb') as f:
+         model = pickle.load(f)
+      preprocessor = Preprocessor.load(entry['preprocessing_path'])
+      top_features = entry.get('top_features') or preprocessor.feature_names
+   if not isinstance(model, RandomForestRegressor):
+      raise TypeError(f'Incremental training extends a RandomForestRegressor, found {type(model).__name__}')
+   print(f"Served model {entry.get('model_id')}: {len(model.estimators_)} trees on {top_features}")
+
+   X_new = np.empty((0, len(top_features)))
+   y_new = np.empty(0)
+   agreement = None
+   if new_data:
+      frame, y_frame = read_new_rows(new_data)
+      with timer.stage('rank_check'):
+         shifted, agreement = ranking_check(frame, y_frame, top_features, min_overlap=min_ranking_overlap)
+      if shifted:
+         print(f'The top features have shifted (overlap below {min_ranking_overlap:.0%}); running a full training')
+         return train_and_evaluate_model(new_data=new_data, prediction_log_dir=prediction_log_dir,
+                                         prediction_labels=prediction_labels, compact_max_trees=compact_max_trees,
+                                         compact_max_depth=compact_max_depth, compact_target_mb=compact_target_mb,
+                                         **full_training)
+      X_new = preprocessor.transform(frame.reindex(columns=top_features).to_numpy(dtype=np.float64))
+      y_new = y_frame
+   if prediction_log_dir:
+      with timer.stage('pred_log'):
+         X_logged, y_logged = load_logged_training_rows(prediction_log_dir, prediction_labels, top_features,
+                                                        preprocessor)
+      X_new = np.vstack([X_new, X_logged])
+      y_new = np.concatenate([y_new, y_logged])
+   if len(y_new) == 0:
+      raise ValueError('No new labelled rows; pass --new-data and/or --prediction-log')
+
+   # Recent rows held out to compare the served and the extended model on the data that prompted the update
+   rng = np.random.RandomState(42)
+   order = rng.permutation(len(y_new))
+   n_holdout = int(len(y_new) * holdout) if len(y_new) * holdout >= 5 else 0
+   test_index, train_index = order[:n_holdout], order[n_holdout:]
+   previous_metrics = evaluate_model(model, X_new[test_index], y_new[test_index]) if n_holdout else None
+
+   n_trees_before = len(model.estimators_)
+   with timer.stage('refit'):
+      n_dropped = extend_forest(model, X_new[train_index], y_new[train_index], n_new_trees=n_new_trees,
+                                max_trees=max_trees)
+   print(f'Added {n_new_trees} trees fitted on {len(train_index)} new rows, dropped the {n_dropped} oldest '
+         f'({n_trees_before} -> {len(model.estimators_)} trees)')
+
+   compiled_path, compact_path, preprocessing_path = export_serving_artifacts(
+      model, top_features, preprocessor, timer, compact_max_trees=compact_max_trees,
+      compact_max_depth=compact_max_depth, compact_target_mb=compact_target_mb)
+
+   run_metrics = {
+      'new_data_rows': len(y_new),
+      'holdout_rows': n_holdout,
+      'n_trees': len(model.estimators_),
+      'n_trees_added': n_new_trees,
+      'n_trees_dropped': n_dropped
+   }
+   metrics = None
+   if n_holdout:
+      with timer.stage('evaluate'):
+         metrics = evaluate_model(model, X_new[test_index], y_new[test_index])
+      print_metrics(metrics)
+      print(f"Served model on the same rows: MSE {previous_metrics['mse']:.4f}, R^2 {previous_metrics['r2']:.4f}")
+      compaction = compaction_report(model, compiled_path, compact_path, X_new[test_index], y_new[test_index],
+                                     metrics)
+      print_compaction(compaction)
+      run_metrics.update(metrics)
+      run_metrics.update({f'previous_{name}': value for name, value in previous_metrics.items()})
+      run_metrics.update(compaction)
+   if agreement is not None:
+      run_metrics['ranking_top_k_overlap'] = agreement['top_k_overlap']
+      run_metrics['ranking_spearman'] = agreement['spearman']
+
+   # The drift profile still describes the data the bulk of the forest was trained on
+   drift_profile_path = Path(DRIFT_PROFILE_FILE)
+   params = {
+      'model_type': 'RandomForestRegressor',
+      'training_mode': 'incremental',
+      'parent_model_id': entry.get('model_id'),
+      'n_estimators': len(model.estimators_),
+      'n_features': len(top_features),
+      'top_features': ','.join(top_features),
+      'preprocessing_fingerprint': preprocessor.fingerprint,
+      'max_trees': max_trees,
+      'compact_max_trees': compact_max_trees,
+      'compact_max_depth': compact_max_depth,
+      'compact_target_mb': compact_target_mb
+   }
+   log_model_version(timer, run_metrics, params, model, top_features, preprocessor, compiled_path, compact_path,
+                     preprocessing_path, drift_profile_path=drift_profile_path if drift_profile_path.exists() else None)
+
+   timer.report()
+   return model, metrics
 
 if __name__ == '__main__':
    # Configure MLflow to use local SQLite database storage
    mlflow.set_tracking_uri(uri='sqlite:///mlflow.db')
    mlflow.set_experiment('House Price Prediction')
    
-   train_and_evaluate_model()
\ No newline at end of file
+   parser = argparse.ArgumentParser(description='Train the house price model')
+   parser.add_argument('--cache-dir', default=os.environ.get('TRAIN_CACHE_DIR'),
+                       help='Memoize the ranking and refit stages on their inputs in this directory')
+   parser.add_argument('--ranking', choices=RANKING_METHODS, default=os.environ.get('FEATURE_RANKING', 'full'),
+                       help='Feature ranking strategy used to pick the top 10 features')
+   parser.add_argument('--compare-ranking', action='store_true',
+                       help='Also run the full ranking and report how well the selected one agrees with it')
+   parser.add_argument('--search', choices=SEARCH_MODES,
+                       help='Pick the RandomForest configuration with a parallel grid or random search')
+   parser.add_argument('--search-iterations', type=int, default=20,
+                       help='Number of configurations sampled by --search random')
+   parser.add_argument('--search-workers', type=int,
+                       help='Worker processes for the search (default: all CPUs)')
+   parser.add_argument('--compact-max-trees', type=int,
+                       help='Keep only this many trees in the compact forest')
+   parser.add_argument('--compact-max-depth', type=int,
+                       help='Cut the compact forest trees at this depth')
+   parser.add_argument('--compact-target-mb', type=float,
+                       help='Lower the compact forest depth until its node arrays fit in this many MB')
+   parser.add_argument('--prediction-log',
+                       help='Directory written by serve.py (PREDICTION_LOG_DIR) to add scored rows to the training split')
+   parser.add_argument('--prediction-labels',
+                       help='CSV with request_id, row and SalePrice for the logged rows (required with --prediction-log)')
+   parser.add_argument('--cv-folds', type=int, default=int(os.environ.get('CV_FOLDS', '0')),
+                       help='Also evaluate the final configuration with k-fold CV over all rows (0 disables)')
+   parser.add_argument('--cv-repeats', type=int, default=1,
+                       help='Repeat the k-fold split this many times with different shuffles')
+   parser.add_argument('--cv-workers', type=int,
+                       help='Worker processes for the CV folds (default: all CPUs)')
+   parser.add_argument('--cv-measure-serial', action='store_true',
+                       help='Also run the folds serially to measure the real speedup')
+   parser.add_argument('--new-data',
+                       help='CSV of newly labelled sales (numeric columns plus SalePrice) added to the training split')
+   parser.add_argument('--incremental', action='store_true',
+                       help='Extend the served model with trees fitted on the new rows only, keeping its features')
+   parser.add_argument('--new-trees', type=int, default=20,
+                       help='Trees added by --incremental')
+   parser.add_argument('--max-trees', type=int,
+                       help='With --incremental, drop the oldest trees beyond this many')
+   parser.add_argument('--min-ranking-overlap', type=float, default=0.6,
+                       help='With --incremental, run a full training when the new rows keep less of the top 10')
+   args = parser.parse_args()
+   if args.prediction_log and not args.prediction_labels:
+      parser.error('--prediction-log needs --prediction-labels: logged predictions are not labels')
+   if args.incremental and not (args.new_data or args.prediction_log):
+      parser.error('--incremental needs new rows from --new-data and/or --prediction-log')
+
+   training_args = dict(
+      compact_max_trees=args.compact_max_trees,
+      compact_max_depth=args.compact_max_depth,
+      compact_target_mb=args.compact_target_mb,
+      prediction_log_dir=args.prediction_log,
+      prediction_labels=args.prediction_labels,
+      new_data=args.new_data
+   )
+   full_training_args = dict(
+      cache_dir=args.cache_dir,
+      ranking_method=args.ranking,
+      compare_ranking=args.compare_ranking,
+      search=args.search,
+      search_iterations=args.search_iterations,
+      search_workers=args.search_workers,
+      cv_folds=args.cv_folds,
+      cv_repeats=args.cv_repeats,
+      cv_workers=args.cv_workers,
+      cv_measure_serial=args.cv_measure_serial
+   )
+   if args.incremental:
+      train_incrementally(n_new_trees=args.new_trees, max_trees=args.max_trees,
+                          min_ranking_overlap=args.min_ranking_overlap, **training_args, **full_training_args)
+   else:
+      train_and_evaluate_model(**training_args, **full_training_args)
\ No newline at end of file
@@ -0,0 +1,219 @@
+import io
+import json
+
+import numpy as np
+
+# Media types accepted by the predict endpoints besides JSON. Binary payloads
+# are decoded straight into NumPy arrays (zero-copy where the layout allows),
+# skipping pydantic's per-float validation.
+JSON = 'application/json'
+NPY = 'application/x-npy'
+RAW = 'application/octet-stream'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+_ALIASES = {
+    'application/json': JSON,
+    'application/x-npy': NPY,
+    'application/npy': NPY,
+    'application/octet-stream': RAW,
+    'application/msgpack': MSGPACK,
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.apache.arrow.stream': ARROW
+}
+
+# Extra per-row columns of a response with prediction intervals, after 'prediction'
+INTERVAL_COLUMNS = ('lower', 'upper', 'std')
+
+# Raw buffers are little-endian float32 unless the client says otherwise in X-Dtype
+RAW_DTYPES = {'float32': np.dtype('<f4'), 'float64': np.dtype('<f8')}
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+def media_type(header, default=JSON):
+    # 'application/x-npy; charset=...' -> NPY; None/'*/*' -> default
+    if not header:
+        return default
+    for part in header.split(','):
+        name = part.split(';', 1)[0].strip().lower()
+        if name in _ALIASES:
+            return _ALIASES[name]
+        if name in ('*/*', 'application/*'):
+            return default
+    raise UnsupportedFormat(f'Unsupported media type {header!r}; use one of {sorted(set(_ALIASES.values()))}')
+
+
+def accepted_type(header, default=JSON):
+    # Response format for an Accept header: the known type with the highest q-value (listed
+    # order breaks ties), never one sent with q=0. With nothing usable the response is
+    # `default`, as a server may ignore Accept rather than fail the request.
+    candidates = []
+    for position, part in enumerate(header.split(',') if header else []):
+        name, *params = [piece.strip() for piece in part.split(';')]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            candidates.append((-q, position, name.lower()))
+    for _, _, name in sorted(candidates):
+        if name in _ALIASES:
+            return _ALIASES[name]
+        if name in ('*/*', 'application/*'):
+            return default
+    return default
+
+
+def _check_shape(array, n_features):
+    if array.ndim == 1:
+        array = array.reshape(1, -1)
+    if array.ndim != 2 or array.shape[1] != n_features:
+        raise ValueError(f'Expected rows of {n_features} features, got shape {array.shape}')
+    if array.dtype.kind != 'f':
+        array = array.astype(np.float64)
+    return array
+
+
+def _check_names(names, feature_names):
+    if names is not None and list(names) != list(feature_names):
+        raise ValueError(f'Feature names {list(names)} do not match the model features {list(feature_names)}')
+
+
+def _decode_npy(body):
+    # Parse the .npy header and view the payload in place instead of np.load's copy
+    stream = io.BytesIO(body)
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    if dtype.hasobject:
+        raise ValueError('Object arrays are not accepted')
+    array = np.frombuffer(body, dtype=dtype, count=int(np.prod(shape)), offset=stream.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _decode_msgpack(body, feature_names):
+    # {"rows": [[...], ...]} / {"features": [...]}, or a packed buffer:
+    # {"data": <bin>, "dtype": "float32", "shape": [n, k], "feature_names": [...]}
+    try:
+        import msgpack
+    except ImportError:
+        raise UnsupportedFormat('MessagePack payloads require the msgpack package')
+    payload = msgpack.unpackb(body, raw=False)
+    if not isinstance(payload, dict):
+        raise ValueError('MessagePack body must be a map')
+    _check_names(payload.get('feature_names'), feature_names)
+    if 'data' in payload:
+        dtype = RAW_DTYPES.get(payload.get('dtype', 'float32'))
+        if dtype is None:
+            raise ValueError(f'Unsupported dtype {payload.get("dtype")!r}')
+        array = np.frombuffer(payload['data'], dtype=dtype)
+        return array.reshape(payload.get('shape', (-1, len(feature_names))))
+    rows = payload.get('rows', [payload['features']] if 'features' in payload else None)
+    if rows is None:
+        raise ValueError("MessagePack body needs 'rows', 'features' or 'data'")
+    return np.asarray(rows, dtype=np.float64)
+
+
+def _decode_arrow(body, feature_names):
+    # One column per feature, named like top_features
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UnsupportedFormat('Arrow payloads require the pyarrow package')
+    table = pa.ipc.open_stream(body).read_all()
+    missing = [name for name in feature_names if name not in table.column_names]
+    if missing:
+        raise ValueError(f'Arrow table is missing feature columns {missing}')
+    columns = [table.column(name).to_numpy() for name in feature_names]
+    return np.column_stack(columns) if columns else np.empty((table.num_rows, 0))
+
+
+def decode_rows(body, content_type, feature_names, dtype_header=None, names_header=None):
+    # Returns a (n_rows, n_features) float array from a binary body
+    fmt = media_type(content_type)
+    if fmt == NPY:
+        array = _decode_npy(body)
+    elif fmt == RAW:
+        dtype = RAW_DTYPES.get((dtype_header or 'float32').lower())
+        if dtype is None:
+            raise ValueError(f'Unsupported X-Dtype {dtype_header!r}; use float32 or float64')
+        if len(body) % (dtype.itemsize * len(feature_names)):
+            raise ValueError(f'Body of {len(body)} bytes is not a whole number of {len(feature_names)}-feature rows')
+        array = np.frombuffer(body, dtype=dtype).reshape(-1, len(feature_names))
+    elif fmt == MSGPACK:
+        array = _decode_msgpack(body, feature_names)
+    elif fmt == ARROW:
+        array = _decode_arrow(body, feature_names)
+    else:
+        raise UnsupportedFormat(f'{fmt} is not a binary format')
+    if names_header:
+        _check_names([name.strip() for name in names_header.split(',')], feature_names)
+    return _check_shape(array, len(feature_names))
+
+
+def dumps_json(content):
+    # orjson when installed (several times faster, handles NumPy scalars), stdlib json otherwise
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, separators=(',', ':')).encode()
+
+
+def response_columns(content):
+    # Names of the per-row columns a binary response carries
+    return ('prediction',) + tuple(name for name in INTERVAL_COLUMNS if name in content)
+
+
+def _column(values):
+    if not isinstance(values, list):
+        values = [values]
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def encode(content, accept):
+    # Returns (body, media_type). Binary formats carry the predictions only (plus the
+    # interval columns when asked for: an (n, 4) array for NPY/raw, one column each in
+    # Arrow), with NaN (null in Arrow) for rows that failed; JSON and MessagePack carry
+    # the whole response.
+    fmt = accepted_type(accept)
+    if fmt == JSON:
+        return dumps_json(content), JSON
+    if fmt == MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            raise UnsupportedFormat('MessagePack responses require the msgpack package')
+        return msgpack.packb(content), MSGPACK
+
+    columns = {'prediction': _column(content['predictions'] if 'predictions' in content else content['prediction'])}
+    for name in response_columns(content)[1:]:
+        columns[name] = _column(content[name])
+    values = columns['prediction'] if len(columns) == 1 else np.column_stack(list(columns.values()))
+    if fmt == NPY:
+        stream = io.BytesIO()
+        np.save(stream, values)
+        return stream.getvalue(), NPY
+    if fmt == RAW:
+        return values.astype('<f8').tobytes(), RAW
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UnsupportedFormat('Arrow responses require the pyarrow package')
+    table = pa.table({name: pa.array(column, from_pandas=True) for name, column in columns.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes(), ARROW
@@ -0,0 +1,56 @@
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+
+def test_score_file_streams_chunks_through_worker_pool(tmp_path, monkeypatch):
+    # Worker processes import the module by name, as when run from src/
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.delitem(sys.modules, 'batch_score', raising=False)
+    import batch_score
+    from model_index import write_manifest
+    from preprocessing import Preprocessor
+
+    features = ['A', 'B', 'C']
+    rng = np.random.RandomState(0)
+    X = rng.randn(40, 3)
+    preprocessor = Preprocessor(features, fill_values=[0.5, -0.5, 0.0], mean=[0.1, 0.2, 0.3], scale=[1.0, 2.0, 4.0])
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(preprocessor.transform(X), X.sum(axis=1))
+
+    model_path = tmp_path / 'model.pkl'
+    with open(model_path, 'wb') as f:
+        pickle.dump(model, f)
+    preprocessing_path = preprocessor.save(tmp_path / 'preprocessing.json')
+    write_manifest(tmp_path / 'model_manifest.json', model_id='m-1', run_id='r-1', model_path=model_path,
+                   top_features=features, preprocessing_path=preprocessing_path,
+                   preprocessing_fingerprint=preprocessor.fingerprint)
+
+    # Extra columns are ignored, missing values take the training fill values
+    frame = pd.DataFrame(X, columns=features)
+    frame.loc[3, 'B'] = np.nan
+    frame.insert(0, 'Id', np.arange(100, 140))
+    frame['Street'] = 'Pave'
+    input_path = tmp_path / 'listings.csv'
+    frame.to_csv(input_path, index=False)
+
+    X_expected = X.copy()
+    X_expected[3, 1] = -0.5
+    expected = model.predict(preprocessor.transform(X_expected))
+
+    for n_workers in (1, 2):
+        output_path = tmp_path / f'scored_{n_workers}.csv'
+        report = batch_score.score_file(input_path, output_path, chunk_size=7, n_workers=n_workers, roots=(tmp_path,))
+        scored = pd.read_csv(output_path)
+        assert report['rows'] == 40
+        assert list(scored.columns) == ['Id', 'prediction']
+        assert scored['Id'].tolist() == list(range(100, 140))
+        np.testing.assert_allclose(scored['prediction'].to_numpy(), expected)
+
+    with pytest.raises(ValueError):
+        frame.drop(columns=['C']).to_csv(input_path, index=False)
+        batch_score.score_file(input_path, tmp_path / 'out.csv', n_workers=1, roots=(tmp_path,))
@@ -0,0 +1,95 @@
+import asyncio
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_microbatcher_coalesces_concurrent_rows():
+    mod = load_module(Path('src') / 'batching.py', 'batching')
+    calls = []
+    observed = []
+
+    def predict_fn(X):
+        calls.append(X.shape[0])
+        return X.sum(axis=1)
+
+    batcher = mod.MicroBatcher(
+        predict_fn, max_batch_size=8, max_wait_s=0.05,
+        on_batch=lambda size, depth, waits: observed.append((size, len(waits)))
+    )
+
+    async def run():
+        rows = [np.full(10, i, dtype=float) for i in range(20)]
+        results = await asyncio.gather(*(batcher.submit(row) for row in rows))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+
+    # every caller gets its own row's prediction back
+    assert results == [10.0 * i for i in range(20)]
+    # 20 concurrent rows with max_batch_size=8 -> 3 model calls
+    assert calls == [8, 8, 4]
+    assert observed == [(8, 8), (8, 8), (4, 4)]
+    assert batcher.rows == 20 and batcher.batches == 3
+
+
+def test_microbatcher_propagates_errors():
+    mod = load_module(Path('src') / 'batching.py', 'batching')
+
+    def predict_fn(X):
+        raise ValueError('boom')
+
+    batcher = mod.MicroBatcher(predict_fn, max_batch_size=4, max_wait_s=0.001)
+
+    async def run():
+        try:
+            await batcher.submit(np.zeros(10))
+        finally:
+            await batcher.stop()
+
+    try:
+        asyncio.run(run())
+    except ValueError as e:
+        assert str(e) == 'boom'
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_microbatcher_keeps_running_after_a_failed_batch():
+    mod = load_module(Path('src') / 'batching.py', 'batching')
+    calls = []
+
+    def predict_fn(X):
+        calls.append(X.shape[0])
+        if len(calls) == 1:
+            raise RuntimeError('model crashed')
+        return X.sum(axis=1)
+
+    batcher = mod.MicroBatcher(predict_fn, max_batch_size=4, max_wait_s=0.001)
+
+    async def run():
+        try:
+            first = await asyncio.gather(batcher.submit(np.ones(3)), batcher.submit(np.ones(3)),
+                                         return_exceptions=True)
+            # rows of mismatched width fail inside the batcher, not in predict_fn
+            mismatched = await asyncio.gather(batcher.submit(np.ones(3)), batcher.submit(np.ones(2)),
+                                              return_exceptions=True)
+            second = await asyncio.wait_for(batcher.submit(np.full(3, 2.0)), timeout=1.0)
+        finally:
+            await batcher.stop()
+        return first, mismatched, second
+
+    first, mismatched, second = asyncio.run(run())
+    assert all(isinstance(e, RuntimeError) for e in first)
+    assert all(isinstance(e, ValueError) for e in mismatched)
+    assert second == 6.0
+    assert calls == [2, 1]
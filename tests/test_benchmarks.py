@@ -0,0 +1,42 @@
+from pathlib import Path
+import importlib.util
+
+import pytest
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_summary_statistics_and_regression_check():
+    mod = load_module(Path('benchmarks') / 'run_benchmarks.py', 'run_benchmarks')
+
+    stats = mod.summarize([0.004, 0.001, 0.002, 0.003, 0.010])
+    assert stats['n'] == 5
+    assert stats['min_ms'] == pytest.approx(1.0)
+    assert stats['median_ms'] == pytest.approx(3.0)
+    assert stats['mean_ms'] == pytest.approx(4.0)
+    assert stats['p95_ms'] == pytest.approx(10.0)
+
+    calls = []
+    measured = mod.measure(lambda: calls.append(1), warmup=2, repeat=5)
+    assert len(calls) == 7 and measured['n'] == 5
+
+    baseline = {'results': {'slow': {'median_ms': 10.0}, 'noisy': {'median_ms': 0.004}, 'fast': {'median_ms': 10.0}}}
+    results = {'slow': {'median_ms': 13.0}, 'noisy': {'median_ms': 0.008}, 'fast': {'median_ms': 11.0},
+               'new': {'median_ms': 1.0}}
+    regressions = mod.compare_to_baseline(results, baseline, threshold=0.25)
+    # 'noisy' doubled but by only 4 microseconds; 'new' has no baseline
+    assert [name for name, *_ in regressions] == ['slow']
+
+
+def test_synthetic_dataset_is_offline_and_shaped_like_house_prices():
+    mod = load_module(Path('benchmarks') / 'run_benchmarks.py', 'run_benchmarks')
+    X, y = mod.synthetic_housing()
+    assert X.shape == (1460, 36) and len(y) == 1460
+    assert X.isna().any().any()
+    X_again, _ = mod.synthetic_housing()
+    assert X.equals(X_again)
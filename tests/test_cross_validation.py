@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+
+def test_folds_run_in_a_process_pool_and_match_serial(monkeypatch):
+    # Worker processes import the module by name, as train.py does from src/
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.delitem(sys.modules, 'cross_validation', raising=False)
+    import cross_validation as mod
+
+    folds = mod.fold_assignments(103, n_splits=5, n_repeats=2)
+    assert folds.shape == (2, 103)
+    # every row is tested exactly once per repetition, with a different shuffle each time
+    for repeat in folds:
+        assert sorted(np.bincount(repeat)) == [20, 20, 21, 21, 21]
+    assert not np.array_equal(folds[0], folds[1])
+
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 4)
+    y = 3 * X[:, 0] + np.sin(3 * X[:, 1]) + 10
+    params = {'n_estimators': 10}
+
+    results, summary = mod.cross_validate(X, y, params, n_splits=4, n_repeats=2, n_workers=2, measure_serial=True)
+    assert [(fold['repeat'], fold['fold']) for fold in results] == [(r, f) for r in range(2) for f in range(4)]
+    assert all(fold['rows'] == 50 for fold in results)
+    assert summary['cv_workers'] == 2 and summary['cv_folds'] == 4 and summary['cv_repeats'] == 2
+    assert summary['cv_r2_mean'] > 0.5 and summary['cv_mse_std'] > 0
+    assert summary['cv_serial_measured'] == 1
+    assert summary['cv_speedup'] == pytest.approx(summary['cv_serial_seconds'] / summary['cv_wall_seconds'])
+
+    # same folds and seeds, so the pool and the in-process path agree
+    serial_results, serial_summary = mod.cross_validate(X, y, params, n_splits=4, n_repeats=2, n_workers=1)
+    assert [fold['mse'] for fold in serial_results] == pytest.approx([fold['mse'] for fold in results])
+    assert serial_summary['cv_mse_mean'] == pytest.approx(summary['cv_mse_mean'])
+
+
+def test_fold_metrics_are_logged_as_steps(monkeypatch):
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    import cross_validation as mod
+    calls = []
+
+    class FakeMlflow:
+        def log_metrics(self, metrics, step=None):
+            calls.append((step, metrics))
+
+    folds = [{'mse': 1.0, 'r2': 0.5, 'mae': 0.8, 'mape': 0.1, 'fit_seconds': 0.2},
+             {'mse': 3.0, 'r2': 0.3, 'mae': 1.2, 'mape': 0.2, 'fit_seconds': 0.3}]
+    mod.log_cv_results(FakeMlflow(), folds)
+    assert [step for step, _ in calls] == [0, 1]
+    assert calls[1][1]['cv_fold_mse'] == 3.0 and set(calls[0][1]) == {
+        'cv_fold_mse', 'cv_fold_r2', 'cv_fold_mae', 'cv_fold_mape', 'cv_fold_fit_seconds'}
+    assert mod.summarize_folds(folds)['cv_mse_mean'] == 2.0
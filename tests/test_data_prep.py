@@ -11,7 +11,11 @@ def load_module(path: Path, name: str):
     return mod
 
 
-def test_load_and_prepare_numeric_selection(tmp_path):
+def test_load_and_prepare_numeric_selection(tmp_path, monkeypatch):
+    # data_prep imports its sibling modules flat, as when run from src/
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.setenv('DATA_CACHE_DIR', str(tmp_path / 'cache'))
+
     # Prepare a dummy housing Bunch-like object
     df = pd.DataFrame({
         'Id': [1, 2, 3, 4, 5],
@@ -45,3 +49,91 @@ def test_load_and_prepare_numeric_selection(tmp_path):
     assert X_test.shape[0] == 2
     assert y_train.shape[0] == 3
     assert y_test.shape[0] == 2
+
+
+def test_return_preprocessor_reproduces_transform(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.setenv('DATA_CACHE_DIR', str(tmp_path / 'cache'))
+    df = pd.DataFrame({
+        'num1': [1.0, 2.0, np.nan, 4.0, 5.0, 6.0],
+        'num2': [10, 20, 30, 40, 50, 60],
+    })
+
+    class Bunch:
+        pass
+
+    bunch = Bunch()
+    bunch.data = df
+    bunch.feature_names = list(df.columns)
+    bunch.target = np.arange(6) * 100.0
+    bunch.DESCR = 'dummy'
+
+    mod = load_module(Path('src') / 'data_prep.py', 'data_prep')
+    mod.fetch_openml = lambda name, as_frame=True: bunch
+
+    X_train, X_test, y_train, y_test, feature_names, preprocessor = mod.load_and_prepare_data(
+        test_size=0.5, random_state=0, return_preprocessor=True)
+
+    # applying the saved preprocessing to the raw rows gives the training-time arrays
+    raw = df.loc[:, feature_names].values
+    transformed = preprocessor.transform(raw)
+    assert preprocessor.feature_names == ['num1', 'num2']
+    assert preprocessor.fill_values[0] == df['num1'].mean()
+    for row in np.vstack([X_train, X_test]):
+        assert np.isclose(transformed, row).all(axis=1).any()
+
+
+def test_dataset_cache_offline_and_integrity(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.setenv('DATA_CACHE_DIR', str(tmp_path / 'cache'))
+    df = pd.DataFrame({'Id': [1, 2, 3, 4], 'num1': [1.0, np.nan, 3.0, 4.0], 'cat': ['a', 'b', 'a', 'b']})
+
+    class Bunch:
+        pass
+
+    bunch = Bunch()
+    bunch.data = df
+    bunch.feature_names = list(df.columns)
+    bunch.target = np.array([10.0, 20.0, 30.0, 40.0])
+    bunch.DESCR = 'dummy'
+
+    mod = load_module(Path('src') / 'data_prep.py', 'data_prep')
+    calls = []
+    mod.fetch_openml = lambda name, as_frame=True: calls.append(name) or bunch
+
+    X, y, descr = mod.load_dataset()
+    assert list(X.columns) == ['num1'] and descr == 'dummy'
+
+    # second load is served from disk, without touching OpenML (works offline)
+    def offline(*args, **kwargs):
+        raise OSError('no network')
+    mod.fetch_openml = offline
+    X_cached, y_cached, _ = mod.load_dataset(mmap=True)
+    assert calls == ['house_prices']
+    assert np.array_equal(X_cached.values, X.values, equal_nan=True)
+    assert np.array_equal(y_cached.values, y.values)
+
+    # a corrupted cache entry fails the checksum and is refetched
+    entry = next(p for p in (tmp_path / 'cache').iterdir() if p.is_dir())
+    (entry / 'target.npy').write_bytes(b'corrupt')
+    mod.fetch_openml = lambda name, as_frame=True: calls.append(name) or bunch
+    X_again, _, _ = mod.load_dataset()
+    assert calls == ['house_prices', 'house_prices']
+    assert np.array_equal(X_again.values, X.values, equal_nan=True)
+
+
+def test_dataset_from_local_csv(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.setenv('DATA_CACHE_DIR', str(tmp_path / 'cache'))
+    csv_path = tmp_path / 'listings.csv'
+    pd.DataFrame({'Id': [1, 2], 'GrLivArea': [1500, 2000], 'SalePrice': [100000, 150000]}).to_csv(csv_path, index=False)
+
+    mod = load_module(Path('src') / 'data_prep.py', 'data_prep')
+    X, y, _ = mod.load_dataset(source=csv_path)
+    assert list(X.columns) == ['GrLivArea']
+    assert list(y) == [100000.0, 150000.0]
+
+    # editing the file changes its content address
+    pd.DataFrame({'GrLivArea': [900], 'SalePrice': [50000]}).to_csv(csv_path, index=False)
+    X2, y2, _ = mod.load_dataset(source=csv_path)
+    assert list(y2) == [50000.0]
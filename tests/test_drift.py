@@ -0,0 +1,79 @@
+from pathlib import Path
+import importlib.util
+import math
+
+import numpy as np
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def reference_data(n_rows=5000, seed=0):
+    rng = np.random.RandomState(seed)
+    # one continuous and one discrete feature, like GrLivArea and OverallQual
+    return np.column_stack([rng.lognormal(7.2, 0.3, n_rows), rng.randint(1, 11, n_rows)]).astype(float)
+
+
+def test_profile_roundtrip_and_no_drift_on_reference_data(tmp_path):
+    mod = load_module(Path('src') / 'drift.py', 'drift')
+    X = reference_data()
+    profile = mod.build_reference_profile(X, ['GrLivArea', 'OverallQual'])
+
+    # discrete features get one bin per value instead of 20 quantile bins
+    assert len(profile['features'][1]['edges']) <= 10
+    path = mod.save_profile(profile, tmp_path / 'drift_profile.json')
+    monitor = mod.DriftMonitor(mod.load_profile(path), min_rows=100)
+
+    monitor.observe(reference_data(seed=1))
+    scores = monitor.scores()
+    assert set(scores) == {'GrLivArea', 'OverallQual'}
+    for values in scores.values():
+        assert values['rows'] == 5000
+        assert values['psi'] < 0.02
+        assert values['ks'] < 0.05
+        assert values['out_of_range'] < 0.01
+
+
+def test_shifted_inputs_score_high_and_small_windows_are_nan():
+    mod = load_module(Path('src') / 'drift.py', 'drift')
+    monitor = mod.DriftMonitor(mod.build_reference_profile(reference_data(), ['GrLivArea', 'OverallQual']),
+                               min_rows=100)
+
+    shifted = reference_data(n_rows=50, seed=2)
+    shifted[:, 0] *= 1.8
+    monitor.observe(shifted)
+    assert math.isnan(monitor.scores()['GrLivArea']['psi'])
+
+    for row in reference_data(n_rows=200, seed=3) * [1.8, 1.0]:
+        monitor.observe(row)
+    scores = monitor.scores()
+    assert monitor.rows_observed == 250
+    assert scores['GrLivArea']['psi'] > 1.0
+    assert scores['GrLivArea']['ks'] > 0.5
+    assert scores['GrLivArea']['out_of_range'] > 0.02
+    assert scores['OverallQual']['psi'] < 0.2
+
+
+def test_windows_rotate_so_old_traffic_ages_out(monkeypatch):
+    mod = load_module(Path('src') / 'drift.py', 'drift')
+    clock = [1000.0]
+    monkeypatch.setattr(mod.time, 'monotonic', lambda: clock[0])
+    monitor = mod.DriftMonitor(mod.build_reference_profile(reference_data(), ['GrLivArea', 'OverallQual']),
+                               window_s=60, min_rows=1)
+
+    monitor.observe(reference_data(n_rows=100))
+    clock[0] += 61
+    monitor.observe(reference_data(n_rows=30, seed=4))
+    # the previous window still counts
+    assert monitor.scores()['GrLivArea']['rows'] == 130
+
+    clock[0] += 61
+    assert monitor.scores()['GrLivArea']['rows'] == 30
+
+    # a silent gap of two windows clears everything
+    clock[0] += 200
+    assert monitor.scores()['GrLivArea']['rows'] == 0
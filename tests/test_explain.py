@@ -0,0 +1,49 @@
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_contributions_add_up_to_the_prediction(monkeypatch):
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    from forest_engine import CompiledForest
+    mod = load_module(Path('src') / 'explain.py', 'explain')
+
+    rng = np.random.RandomState(0)
+    X = rng.randn(300, 5)
+    # only the first two features matter
+    y = 10 * X[:, 0] + 5 * (X[:, 1] > 0)
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+    forest = CompiledForest.from_sklearn(model)
+    explainer = mod.PathExplainer(forest)
+
+    predictions, contributions = explainer.explain(X[:50])
+    assert contributions.shape == (50, 5)
+    np.testing.assert_allclose(predictions, model.predict(X[:50]), rtol=1e-9)
+    np.testing.assert_allclose(explainer.bias + contributions.sum(axis=1), predictions, rtol=1e-9)
+    # the bias is the mean of the training targets each tree saw
+    np.testing.assert_allclose(explainer.bias, np.mean([tree.tree_.value[0, 0, 0] for tree in model.estimators_]))
+    mean_abs = np.abs(contributions).mean(axis=0)
+    assert mean_abs[0] > mean_abs[1] > 3 * mean_abs[2:].max()
+    # a single tree credits each split's value change to its feature
+    tree = mod.PathExplainer(CompiledForest.from_sklearn(model.estimators_[0]))
+    _, single = tree.explain(X[:1])
+    path = model.estimators_[0].decision_path(X[:1]).indices
+    values = model.estimators_[0].tree_.value[:, 0, 0]
+    features = model.estimators_[0].tree_.feature
+    expected = np.zeros(5)
+    for parent, child in zip(path[:-1], path[1:]):
+        expected[features[parent]] += values[child] - values[parent]
+    np.testing.assert_allclose(single[0], expected, rtol=1e-9, atol=1e-9)
+
+    # compact forests are explained the same way
+    compact = mod.PathExplainer(forest.compact())
+    np.testing.assert_allclose(compact.explain(X[:5])[1], contributions[:5], rtol=1e-4, atol=1e-3)
@@ -0,0 +1,48 @@
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+import pytest
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def make_data(n_samples=300, n_features=15):
+    # Only the first 3 columns drive the target, with clearly ordered weights
+    rng = np.random.RandomState(0)
+    X = rng.randn(n_samples, n_features)
+    y = 5 * X[:, 0] + 3 * X[:, 1] + 2 * X[:, 2] + 0.1 * rng.randn(n_samples)
+    return X, y, [f'F{i}' for i in range(n_features)]
+
+
+@pytest.mark.parametrize('method', ['subsample', 'hgb', 'incremental'])
+def test_fast_rankings_find_the_informative_features(method):
+    mod = load_module(Path('src') / 'feature_ranking.py', 'feature_ranking')
+    X, y, names = make_data()
+
+    ranking, info = mod.rank_features(X, y, names, method=method, top_k=3)
+    assert [name for name, _ in ranking[:3]] == ['F0', 'F1', 'F2']
+    assert sorted(name for name, _ in ranking) == sorted(names)
+    if method == 'incremental':
+        # stops well before the 500 trees of the full method
+        assert info['n_estimators'] < 500
+
+
+def test_ranking_agreement_and_unknown_method():
+    mod = load_module(Path('src') / 'feature_ranking.py', 'feature_ranking')
+    reference = [('A', 0.5), ('B', 0.3), ('C', 0.15), ('D', 0.05)]
+
+    same = mod.ranking_agreement(reference, reference, top_k=2)
+    assert same['top_k_overlap'] == 1.0 and same['top_k_exact'] and same['spearman'] == pytest.approx(1.0)
+
+    swapped = mod.ranking_agreement([('A', 0.5), ('C', 0.3), ('B', 0.15), ('D', 0.05)], reference, top_k=2)
+    assert swapped['top_k_overlap'] == 0.5
+    assert swapped['missing'] == ['B']
+
+    with pytest.raises(ValueError):
+        mod.rank_features(np.zeros((4, 2)), np.zeros(4), ['A', 'B'], method='bogus')
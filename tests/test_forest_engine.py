@@ -0,0 +1,142 @@
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def make_forest(n_estimators=10):
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 10)
+    y = X @ rng.rand(10) * 100 + rng.randn(200)
+    model = RandomForestRegressor(n_estimators=n_estimators, random_state=42).fit(X, y)
+    return model, rng.randn(50, 10)
+
+
+def test_compiled_forest_matches_sklearn(tmp_path):
+    mod = load_module(Path('src') / 'forest_engine.py', 'forest_engine')
+    model, X = make_forest()
+
+    compiled = mod.CompiledForest.from_sklearn(model, feature_names=[f'F{i}' for i in range(10)])
+    assert compiled.n_trees == 10
+    np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=1e-9)
+    # single 1-D row behaves like a (1, n_features) batch
+    np.testing.assert_allclose(compiled.predict(X[0]), model.predict(X[:1]), rtol=1e-9)
+
+    # round-trip through the .npz export
+    path = compiled.save(tmp_path / 'forest.npz')
+    loaded = mod.CompiledForest.load(path)
+    assert loaded.feature_names == compiled.feature_names
+    np.testing.assert_allclose(loaded.predict(X), model.predict(X), rtol=1e-9)
+
+    # and through the directory layout, whose node arrays are memory-mapped read-only
+    mapped = mod.CompiledForest.load(compiled.save(tmp_path / 'forest'))
+    assert isinstance(mapped.threshold, np.memmap) and isinstance(mapped._children, np.memmap)
+    assert not mapped.threshold.flags.writeable
+    np.testing.assert_allclose(mapped.predict(X), model.predict(X), rtol=1e-9)
+    folded = mapped.fold_scaler(np.zeros(10), np.ones(10))
+    assert folded._children is mapped._children
+
+
+def test_reexport_leaves_mapped_forests_untouched(tmp_path):
+    mod = load_module(Path('src') / 'forest_engine.py', 'forest_engine')
+    model, X = make_forest()
+    path = tmp_path / 'compiled_forest'
+    mapped = mod.CompiledForest.load(mod.CompiledForest.from_sklearn(model).save(path))
+    expected = mapped.predict(X)
+
+    # the next training exports to the same directory while a worker still maps the old one
+    retrained = RandomForestRegressor(n_estimators=5, max_depth=3, random_state=1).fit(X, -X[:, 0])
+    mod.CompiledForest.from_sklearn(retrained).save(path)
+    np.testing.assert_array_equal(mapped.predict(X), expected)
+    assert mod.CompiledForest.load(path).n_trees == 5
+    assert [p.name for p in tmp_path.iterdir()] == ['compiled_forest']
+
+
+def test_compiled_forest_rejects_wrong_width():
+    mod = load_module(Path('src') / 'forest_engine.py', 'forest_engine')
+    model, X = make_forest(n_estimators=2)
+    compiled = mod.CompiledForest.from_sklearn(model)
+    try:
+        compiled.predict(X[:, :5])
+    except ValueError as e:
+        assert 'Expected 10 features' in str(e)
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_folded_scaler_matches_scaled_pipeline():
+    from sklearn.preprocessing import StandardScaler
+
+    mod = load_module(Path('src') / 'forest_engine.py', 'forest_engine')
+    rng = np.random.RandomState(1)
+    scale = np.array([10, 3000, 2000, 1000, 800, 1500, 20000, 900, 120, 4])
+    X_raw = np.round(rng.rand(300, 10) * scale)
+    y = X_raw @ rng.rand(10)
+    scaler = StandardScaler().fit(X_raw)
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(scaler.transform(X_raw), y)
+
+    folded = mod.CompiledForest.from_sklearn(model).fold_scaler(scaler.mean_, scaler.scale_)
+    X = np.vstack([X_raw, np.round(rng.rand(500, 10) * scale)])
+    # raw features through the folded forest == sklearn on scaled features
+    np.testing.assert_allclose(folded.predict(X), model.predict(scaler.transform(X)), rtol=1e-9)
+
+
+def test_compact_forest_shrinks_and_prunes(tmp_path):
+    mod = load_module(Path('src') / 'forest_engine.py', 'forest_engine')
+    model, X = make_forest()
+    compiled = mod.CompiledForest.from_sklearn(model)
+
+    compact = mod.CompiledForest.load(compiled.compact().save(tmp_path / 'compact'))
+    assert compact.threshold.dtype == np.float32 and compact.value.dtype == np.float32
+    assert compact.feature.dtype == np.uint8 and compact._children.dtype == np.uint16
+    assert compact.nbytes < compiled.nbytes / 2
+    # thresholds are rounded down to float32, so every split decision is unchanged
+    np.testing.assert_array_equal(compact.leaves(X), compiled.leaves(X))
+    np.testing.assert_allclose(compact.predict(X), model.predict(X), rtol=1e-6)
+
+    # keeping the first trees == averaging those sklearn trees
+    few = compiled.compact(max_trees=3)
+    expected = np.mean([tree.predict(X) for tree in model.estimators_[:3]], axis=0)
+    assert few.n_trees == 3
+    np.testing.assert_allclose(few.predict(X), expected, rtol=1e-6)
+
+    # cutting at depth 2 predicts the mean of the depth-2 node each row reaches
+    shallow = compiled.compact(max_depth=2)
+    tree = model.estimators_[0].tree_
+    node = np.zeros(len(X), dtype=int)
+    for _ in range(2):
+        inner = tree.children_left[node] != -1
+        right = X[np.arange(len(X)), tree.feature[node]].astype(np.float32) > tree.threshold[node]
+        node = np.where(inner, np.where(right, tree.children_right[node], tree.children_left[node]), node)
+    np.testing.assert_allclose(shallow.value.take(shallow.leaves(X))[:, 0], tree.value[node, 0, 0], rtol=1e-6)
+    assert shallow.max_depth == 2 and shallow.n_nodes <= 7 * compiled.n_trees
+
+    assert compiled.compact(target_bytes=compact.nbytes / 4).nbytes <= compact.nbytes / 4
+
+
+def test_prediction_intervals_come_from_the_per_tree_values():
+    mod = load_module(Path('src') / 'forest_engine.py', 'forest_engine')
+    model, X = make_forest(n_estimators=50)
+    compiled = mod.CompiledForest.from_sklearn(model)
+
+    per_tree = np.column_stack([tree.predict(X) for tree in model.estimators_])
+    np.testing.assert_allclose(compiled.tree_values(X), per_tree, rtol=1e-9)
+
+    result = compiled.predict_interval(X, level=0.8)
+    np.testing.assert_allclose(result['mean'], model.predict(X), rtol=1e-9)
+    np.testing.assert_allclose(result['lower'], np.quantile(per_tree, 0.1, axis=1), rtol=1e-9)
+    np.testing.assert_allclose(result['upper'], np.quantile(per_tree, 0.9, axis=1), rtol=1e-9)
+    np.testing.assert_allclose(result['std'], per_tree.std(axis=1), rtol=1e-9)
+    assert (result['lower'] <= result['mean']).all() and (result['mean'] <= result['upper']).all()
+
+    # the compact float32 forest gives the same ranges to float32 precision
+    compact = compiled.compact().predict_interval(X, level=0.8)
+    np.testing.assert_allclose(compact['upper'], result['upper'], rtol=1e-5)
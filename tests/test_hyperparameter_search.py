@@ -0,0 +1,66 @@
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+import pytest
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_search_ranks_configurations_in_a_process_pool(monkeypatch):
+    # Worker processes import the module by name, as train.py does from src/
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.delitem(sys.modules, 'hyperparameter_search', raising=False)
+    import hyperparameter_search as mod
+
+    grid = {'n_estimators': [5, 20], 'max_depth': [1, None]}
+    configurations = mod.candidate_configurations('grid', param_grid=grid)
+    assert len(configurations) == 4
+    assert len(mod.candidate_configurations('random', param_grid=grid, n_iter=10)) == 4
+    with pytest.raises(ValueError):
+        mod.candidate_configurations('bogus')
+
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 4)
+    y = 3 * X[:, 0] + np.sin(3 * X[:, 1])
+
+    results = mod.run_search(X, y, configurations, n_workers=2)
+    assert len(results) == 4
+    mses = [metrics['val_mse'] for _, metrics in results]
+    assert mses == sorted(mses)
+    # depth-1 stumps cannot beat full-depth trees here
+    assert results[0][0]['max_depth'] is None
+    # same split and seeds, so the pool and the in-process path agree
+    assert mod.run_search(X, y, configurations, n_workers=1)[0][1]['val_mse'] == pytest.approx(mses[0])
+
+
+def test_search_results_are_logged_in_batches(monkeypatch):
+    # hyperparameter_search imports shared_arrays flat, as train.py does
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    mod = load_module(Path('src') / 'hyperparameter_search.py', 'hyperparameter_search_logging')
+    calls = []
+
+    class FakeMlflow:
+        @contextmanager
+        def start_run(self, run_name=None, nested=False):
+            calls.append(('start_run', run_name, nested))
+            yield
+
+        def log_params(self, params):
+            calls.append(('log_params', params))
+
+        def log_metrics(self, metrics):
+            calls.append(('log_metrics', metrics))
+
+    mod.log_search_results(FakeMlflow(), [({'max_depth': None}, {'val_mse': 1.0}), ({'max_depth': 2}, {'val_mse': 2.0})])
+
+    assert [call[0] for call in calls] == ['start_run', 'log_params', 'log_metrics'] * 2
+    assert calls[1] == ('log_params', {'max_depth': 'None'})
+    assert calls[5] == ('log_metrics', {'val_mse': 2.0, 'search_rank': 2})
@@ -0,0 +1,186 @@
+import json
+import os
+import pickle
+import sqlite3
+from pathlib import Path
+import importlib.util
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def load_model_index(monkeypatch):
+    # model_index imports forest_engine flat, as serve.py and train.py do
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    return load_module(Path('src') / 'model_index.py', 'model_index')
+
+
+def make_model_dir(root: Path, model_id: str):
+    artifacts = root / 'mlruns' / '1' / 'models' / model_id / 'artifacts'
+    artifacts.mkdir(parents=True)
+    with open(artifacts / 'model.pkl', 'wb') as f:
+        pickle.dump({'model_id': model_id}, f)
+    return artifacts
+
+
+def test_resolves_newest_model_from_mlflow_db(tmp_path, monkeypatch):
+    mod = load_model_index(monkeypatch)
+    make_model_dir(tmp_path, 'm-old')
+    make_model_dir(tmp_path, 'm-new')
+
+    # artifact_location points at the training machine, as in the committed mlflow.db
+    with sqlite3.connect(tmp_path / 'mlflow.db') as conn:
+        conn.execute('CREATE TABLE logged_models (model_id TEXT, experiment_id INTEGER, artifact_location TEXT, '
+                     'creation_timestamp_ms INTEGER, lifecycle_stage TEXT, source_run_id TEXT)')
+        conn.executemany('INSERT INTO logged_models VALUES (?, 1, ?, ?, ?, ?)', [
+            ('m-old', '/elsewhere/mlruns/1/models/m-old/artifacts', 1, 'active', 'r-old'),
+            ('m-new', '/elsewhere/mlruns/1/models/m-new/artifacts', 2, 'active', 'r-new'),
+            ('m-gone', '/elsewhere/mlruns/1/models/m-gone/artifacts', 3, 'active', 'r-gone'),
+            ('m-deleted', '/elsewhere/mlruns/1/models/m-deleted/artifacts', 4, 'deleted', 'r-deleted'),
+        ])
+
+    # the run that logged m-new also logged its preprocessing
+    run_artifacts = tmp_path / 'mlruns' / '1' / 'r-new' / 'artifacts'
+    run_artifacts.mkdir(parents=True)
+    from preprocessing import Preprocessor
+    Preprocessor(['A'], [0.0], [1.0], [2.0]).save(run_artifacts / 'preprocessing.json')
+
+    entry = mod.resolve_active_model(roots=(tmp_path,))
+    assert entry['model_id'] == 'm-new'
+    assert entry['model_path'] == tmp_path / 'mlruns' / '1' / 'models' / 'm-new' / 'artifacts' / 'model.pkl'
+
+    assert entry['preprocessing_path'] == run_artifacts / 'preprocessing.json'
+
+    loaded = mod.load_model(entry)
+    assert loaded.model == {'model_id': 'm-new'}
+    assert loaded.scaler.feature_names == ['A']
+    assert loaded.version == f"m-new@{mod.artifact_digest(entry['model_path'])}@{loaded.scaler.fingerprint}"
+
+    # any logged version can be resolved by id, with its run's preprocessing and feature order
+    other = mod.resolve_model('m-new', roots=(tmp_path,))
+    assert other['preprocessing_path'] == run_artifacts / 'preprocessing.json'
+    assert mod.load_model(other).feature_names == ['A']
+    assert mod.resolve_model('m-old', roots=(tmp_path,))['model_path'].parent.parent.name == 'm-old'
+    assert mod.resolve_model('m-gone', roots=(tmp_path,)) is None
+    assert mod.resolve_model('../m-new', roots=(tmp_path,)) is None
+
+
+def test_manifest_takes_precedence(tmp_path, monkeypatch):
+    mod = load_model_index(monkeypatch)
+    artifacts = make_model_dir(tmp_path, 'm-manifest')
+    mod.write_manifest(tmp_path / mod.MODEL_MANIFEST_FILE, model_id='m-manifest', run_id='r1',
+                       model_path=artifacts / 'model.pkl', top_features=['A', 'B'])
+
+    signature = mod.index_signature(roots=(tmp_path,))
+    entry = mod.resolve_active_model(roots=(tmp_path,))
+    assert entry['model_id'] == 'm-manifest'
+    assert entry['top_features'] == ['A', 'B']
+
+    # rewriting the manifest changes the signature the watcher polls
+    (tmp_path / mod.MODEL_MANIFEST_FILE).write_text(json.dumps({'model_path': str(artifacts / 'model.pkl')}))
+    os.utime(tmp_path / mod.MODEL_MANIFEST_FILE, ns=(1, 1))
+    assert mod.index_signature(roots=(tmp_path,)) != signature
+
+
+def test_mismatched_preprocessing_is_rejected(tmp_path, monkeypatch):
+    mod = load_model_index(monkeypatch)
+    from preprocessing import Preprocessor
+
+    artifacts = make_model_dir(tmp_path, 'm-pre')
+    preprocessor = Preprocessor(['A', 'B'], [0.0, 0.0], [1.0, 2.0], [3.0, 4.0])
+    preprocessing_path = preprocessor.save(tmp_path / 'preprocessing.json')
+    mod.write_manifest(tmp_path / mod.MODEL_MANIFEST_FILE, model_id='m-pre', run_id='r1',
+                       model_path=artifacts / 'model.pkl', top_features=['A', 'B'],
+                       preprocessing_path=preprocessing_path, preprocessing_fingerprint=preprocessor.fingerprint)
+
+    entry = mod.resolve_active_model(roots=(tmp_path,))
+    loaded = mod.load_model(entry)
+    assert loaded.scaler.feature_names == ['A', 'B']
+
+    # a preprocessing file rewritten after training no longer matches the manifest
+    Preprocessor(['A', 'B'], [0.0, 0.0], [9.0, 9.0], [3.0, 4.0]).save(preprocessing_path)
+    try:
+        mod.load_model(entry)
+    except ValueError as e:
+        assert 'does not match' in str(e)
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_compact_forest_is_served_when_requested(tmp_path, monkeypatch):
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+
+    mod = load_model_index(monkeypatch)
+    from forest_engine import CompiledForest
+
+    X = np.random.RandomState(0).randn(50, 2)
+    model = RandomForestRegressor(n_estimators=3, random_state=0).fit(X, X[:, 0])
+    artifacts = tmp_path / 'artifacts'
+    artifacts.mkdir()
+    with open(artifacts / 'model.pkl', 'wb') as f:
+        pickle.dump(model, f)
+    mod.write_manifest(tmp_path / mod.MODEL_MANIFEST_FILE, model_id='m-small', run_id='r1',
+                       model_path=artifacts / 'model.pkl', top_features=['A', 'B'])
+
+    # without an export the full forest is compacted in memory
+    entry = mod.resolve_active_model(roots=(tmp_path,))
+    loaded = mod.load_model(entry, compact=True)
+    assert loaded.engine == 'compiled' and loaded.compact
+    assert loaded.model.value.dtype == np.float32
+
+    # an exported compact forest listed in the manifest is loaded as is
+    compact_path = CompiledForest.from_sklearn(model).compact(max_trees=1).save(tmp_path / 'compact')
+    mod.write_manifest(tmp_path / mod.MODEL_MANIFEST_FILE, model_id='m-small', run_id='r1',
+                       model_path=artifacts / 'model.pkl', top_features=['A', 'B'], compact_path=compact_path)
+    entry = mod.resolve_active_model(roots=(tmp_path,))
+    loaded = mod.load_model(entry, compact=True)
+    assert loaded.path == compact_path and loaded.model.n_trees == 1
+    assert not mod.load_model(entry).compact
+
+
+def test_pooled_model_never_borrows_another_models_forest(tmp_path, monkeypatch):
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+
+    mod = load_model_index(monkeypatch)
+    from forest_engine import COMPACT_FOREST_DIR, COMPILED_FOREST_DIR, CompiledForest
+    from preprocessing import Preprocessor
+
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 2) * 10 + 5
+    model_a = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, X[:, 0])
+    model_b = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, -10 * X[:, 1])
+    preprocessor = Preprocessor(['A', 'B'], [5.0, 5.0], [5.0, 5.0], [10.0, 10.0])
+
+    # Model A is the last one trained: its exports sit at the project root, as train.py leaves them
+    monkeypatch.chdir(tmp_path)
+    artifacts_a = make_model_dir(tmp_path, 'm-A')
+    with open(artifacts_a / 'model.pkl', 'wb') as f:
+        pickle.dump(model_a, f)
+    compiled_a = CompiledForest.from_sklearn(model_a).save(tmp_path / COMPILED_FOREST_DIR)
+    CompiledForest.from_sklearn(model_a).compact().save(tmp_path / COMPACT_FOREST_DIR)
+    mod.write_manifest(tmp_path / mod.MODEL_MANIFEST_FILE, model_id='m-A', run_id='r-A',
+                       model_path=artifacts_a / 'model.pkl', top_features=['A', 'B'], compiled_path=compiled_a)
+
+    # Model B only exists in mlruns, found by id with no exports recorded
+    artifacts_b = make_model_dir(tmp_path, 'm-B')
+    with open(artifacts_b / 'model.pkl', 'wb') as f:
+        pickle.dump(model_b, f)
+    preprocessor.save(artifacts_b / 'preprocessing.json')
+    entry = mod.resolve_model('m-B', roots=(tmp_path,))
+    assert entry['compiled_path'] is None and entry['compact_path'] is None
+
+    rows = X[:3]
+    expected = model_b.predict(preprocessor.transform(rows))
+    for options in ({'engine': 'compiled'}, {'compact': True}, {'fold_scaler': True}):
+        loaded = mod.load_model(entry, **options)
+        assert loaded.engine == 'compiled' and loaded.path == artifacts_b / 'model.pkl'
+        scaler = loaded.scaler
+        prediction = loaded.model.predict(scaler.transform(rows) if scaler is not None else rows)
+        np.testing.assert_allclose(prediction, expected, rtol=1e-5)
+
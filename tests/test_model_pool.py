@@ -0,0 +1,59 @@
+import threading
+import time
+from pathlib import Path
+import importlib.util
+
+import pytest
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class FakeModel:
+    def __init__(self, model_id):
+        self.model_id = model_id
+        self.engine = 'sklearn'
+        self.loaded_at = time.time()
+
+
+def test_pool_loads_lazily_and_evicts_lru_within_budget():
+    mod = load_module(Path('src') / 'model_pool.py', 'model_pool')
+    sizes = {'m-a': 40, 'm-b': 40, 'm-c': 40, 'm-big': 500}
+    loaded = []
+
+    def loader(model_id):
+        if model_id not in sizes:
+            raise mod.UnknownModel(model_id)
+        loaded.append(model_id)
+        time.sleep(0.05)
+        return FakeModel(model_id)
+
+    pool = mod.ModelPool(loader, memory_budget_bytes=100, size_fn=lambda m: sizes[m.model_id])
+
+    # concurrent first requests share one load
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get('m-a'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loaded == ['m-a'] and all(model is results[0] for model in results)
+    assert pool.hits['m-a'] == 3
+
+    pool.get('m-b')
+    pool.get('m-a')  # m-b becomes least recently used
+    pool.get('m-c')
+    assert 'm-b' not in pool and 'm-a' in pool and 'm-c' in pool
+    assert pool.evictions == {'m-b': 1} and pool.bytes_used == 80
+
+    # a model larger than the whole budget is still served, alone
+    pool.get('m-big')
+    assert len(pool) == 1 and pool.status()['models'][0]['model_id'] == 'm-big'
+
+    with pytest.raises(KeyError):
+        pool.get('m-missing')
+    assert pool.load_errors['m-missing'] == 1 and 'm-missing' not in pool
@@ -0,0 +1,44 @@
+import time
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def test_cache_lru_bound_and_model_invalidation():
+    mod = load_module(Path('src') / 'prediction_cache.py', 'prediction_cache')
+    cache = mod.PredictionCache(max_entries=2)
+    k1, k2, k3 = (mod.PredictionCache.key(np.full(10, i)) for i in range(3))
+
+    # keys are canonical: ints, floats and -0.0 hash the same
+    assert mod.PredictionCache.key([0] * 10) == mod.PredictionCache.key(np.full(10, -0.0))
+
+    assert cache.get(k1, 'v1') is None
+    cache.put(k1, 1.0, 'v1')
+    cache.put(k2, 2.0, 'v1')
+    assert cache.get(k1, 'v1') == 1.0  # k1 becomes most recently used
+    assert cache.put(k3, 3.0, 'v1') == 1  # evicts k2
+    assert cache.get(k2, 'v1') is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+
+    # a different model version flushes every entry
+    assert cache.get(k1, 'v2') is None
+    assert len(cache) == 0 and cache.invalidations == 1
+
+
+def test_cache_ttl_expiry():
+    mod = load_module(Path('src') / 'prediction_cache.py', 'prediction_cache')
+    cache = mod.PredictionCache(max_entries=10, ttl_s=0.01)
+    key = mod.PredictionCache.key([1.0] * 10)
+    cache.put(key, 5.0, 'v1')
+    assert cache.get(key, 'v1') == 5.0
+    time.sleep(0.02)
+    assert cache.get(key, 'v1') is None
+    assert cache.evictions == 1
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+
+def load_prediction_log(monkeypatch):
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    monkeypatch.delitem(sys.modules, 'prediction_log', raising=False)
+    import prediction_log
+    return prediction_log
+
+
+def test_buffer_drop_policies(tmp_path, monkeypatch):
+    mod = load_prediction_log(monkeypatch)
+    rows = np.ones((2, 3))
+
+    # not started: nothing drains the buffer
+    log = mod.PredictionLog(tmp_path, capacity=5, drop_policy='drop_newest')
+    assert log.log('r1', 'm-1', '/predict/batch', ['A', 'B', 'C'], rows, [1.0, 2.0])
+    assert log.log('r2', 'm-1', '/predict/batch', ['A', 'B', 'C'], rows, [3.0, 4.0])
+    assert not log.log('r3', 'm-1', '/predict/batch', ['A', 'B', 'C'], rows, [5.0, 6.0])
+    assert (log.logged, log.dropped, log.buffered_rows) == (4, 2, 4)
+
+    log = mod.PredictionLog(tmp_path, capacity=5, drop_policy='drop_oldest')
+    for i in range(3):
+        log.log(f'r{i}', 'm-1', '/predict/batch', ['A', 'B', 'C'], rows, [1.0, 2.0])
+    assert [entry[1] for entry in log._entries] == ['r1', 'r2'] and log.dropped == 2
+
+    log = mod.PredictionLog(tmp_path, capacity=2, drop_policy='block', block_timeout_s=0.01)
+    log.log('r1', 'm-1', '/predict/batch', ['A', 'B', 'C'], rows, [1.0, 2.0])
+    assert not log.log('r2', 'm-1', '/predict', ['A', 'B', 'C'], rows[:1], [3.0])
+    assert log.dropped == 1
+
+    with pytest.raises(ValueError):
+        mod.PredictionLog(tmp_path, drop_policy='spill')
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_flush_rotation_and_read_back(tmp_path, monkeypatch, backend):
+    mod = load_prediction_log(monkeypatch)
+    log = mod.PredictionLog(tmp_path, backend=backend, flush_interval_s=60, rotate_rows=3).start()
+    log.log('r1', 'm-1', '/predict/batch', ['A', 'B'], np.array([[1.0, 2.0], [3.0, 4.0]]), [10.0, 20.0],
+            rows=np.array([0, 2]))
+    log.flush()
+    log.log('r2', 'm-1', '/predict', ['A', 'B'], np.array([[5.0, 6.0]]), [30.0])
+    log.flush()
+    # the first segment holds 3 rows by now, so this one opens a new segment
+    log.log('r3', 'm-2', '/predict', ['C'], np.array([[7.0]]), [40.0])
+    log.close()
+
+    assert (log.logged, log.flushed, log.dropped, log.segments) == (4, 4, 0, 2)
+    frame = mod.read_log(tmp_path).sort_values(['request_id', 'row'])
+    assert frame['request_id'].tolist() == ['r1', 'r1', 'r2', 'r3']
+    assert frame['row'].tolist() == [0, 2, 0, 0]
+    assert frame['prediction'].tolist() == [10.0, 20.0, 30.0, 40.0]
+    assert frame['A'].tolist()[:3] == [1.0, 3.0, 5.0] and np.isnan(frame['A'].iloc[3])
+    assert frame['C'].iloc[3] == 7.0
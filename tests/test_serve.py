@@ -5,6 +5,8 @@ import pickle
 from pathlib import Path
 
 from fastapi.testclient import TestClient
+import numpy as np
+import pytest
 import importlib.util
 
 # Load src/serve.py as a module (works even if `src` is not a package on sys.path)
@@ -75,6 +77,9 @@ def test_health_and_predict(tmp_path):
     serve.__spec__ = spec
     spec.loader.exec_module(serve)
 
+    # importing loads nothing; the lifespan handler calls startup() when the server starts
+    assert serve.active_model is None
+    serve.startup()
     client = TestClient(serve.app)
 
     # health should report model_loaded True and n_features 10
@@ -97,3 +102,460 @@ def test_health_and_predict(tmp_path):
 
     # cleanup
     teardown_test_env(repo_root)
+
+
+class RowSumModel:
+    def predict(self, X):
+        # one prediction per row, like a real regressor
+        return X.sum(axis=1)
+
+
+class DoubledRowSumModel:
+    def predict(self, X):
+        return 2 * X.sum(axis=1)
+
+
+FEATURES = [f"F{i}" for i in range(1, 11)]
+
+
+@pytest.fixture
+def serve_model(monkeypatch):
+    # Serves `model` (RowSumModel by default, or a ready LoadedModel) as the active model over
+    # F1..F10 for one test; keyword arguments go to LoadedModel
+    def install(model=None, features=FEATURES, **loaded_kwargs):
+        if not isinstance(model, serve.LoadedModel):
+            model = serve.LoadedModel(RowSumModel() if model is None else model, **loaded_kwargs)
+        monkeypatch.setattr(serve, "active_model", model)
+        monkeypatch.setattr(serve, "top_features", list(features))
+        return model
+    return install
+
+
+@pytest.fixture
+def no_active_model(monkeypatch):
+    # Nothing loaded yet, as before startup
+    monkeypatch.setattr(serve, "active_model", None)
+    monkeypatch.setattr(serve, "top_features", [])
+
+
+def test_predict_batch(monkeypatch, serve_model):
+    serve_model()
+    monkeypatch.setattr(serve, "PREDICT_CHUNK_SIZE", 2)
+
+    client = TestClient(serve.app)
+    rows = [[1] * 10, [2] * 10, [1] * 5, [3] * 10]
+    r = client.post("/predict/batch", json={"rows": rows})
+    assert r.status_code == 200
+    j = r.json()
+    assert j["predictions"] == [10.0, 20.0, None, 30.0]
+    assert j["n_errors"] == 1
+    assert j["errors"][0]["index"] == 2
+
+    # batches over the configured limit are rejected as a whole
+    monkeypatch.setattr(serve, "MAX_BATCH_SIZE", 3)
+    r2 = client.post("/predict/batch", json={"rows": rows})
+    assert r2.status_code == 413
+
+
+def test_predict_rejects_non_finite_json_features(serve_model):
+    serve_model()
+    client = TestClient(serve.app)
+
+    # Python's json (and so the JSON body parser) accepts the NaN/Infinity literals
+    for literal in ("NaN", "Infinity", "-Infinity"):
+        body = '{"features": [1, 2, 3, 4, 5, 6, 7, 8, 9, %s]}' % literal
+        r = client.post("/predict", content=body, headers={"Content-Type": "application/json"})
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Features must be finite numbers"
+
+
+def test_predict_through_microbatcher(monkeypatch, serve_model):
+    serve_model()
+    batcher = serve.MicroBatcher(serve._predict_array, max_batch_size=4, max_wait_s=0.001)
+    monkeypatch.setattr(serve, "batcher", batcher)
+
+    client = TestClient(serve.app)
+    r = client.post("/predict", json={"features": [2] * 10})
+    assert r.status_code == 200
+    assert r.json()["prediction"] == 20.0
+    assert batcher.rows == 1
+
+
+def test_microbatched_predict_answers_with_its_own_model_across_a_reload(tmp_path, monkeypatch, serve_model):
+    from prediction_cache import PredictionCache
+    (tmp_path / "old.pkl").write_bytes(b"old")
+    (tmp_path / "new.pkl").write_bytes(b"new")
+    old = serve.LoadedModel(RowSumModel(), path=tmp_path / "old.pkl", model_id="m-old")
+    new = serve.LoadedModel(DoubledRowSumModel(), path=tmp_path / "new.pkl", model_id="m-new")
+    serve_model(old)
+    monkeypatch.setattr(serve, "prediction_cache", PredictionCache(10))
+
+    def reload_then_predict(batch):
+        # the reload lands while the row waits in the queue
+        serve.active_model = new
+        return serve._predict_array(batch)
+
+    monkeypatch.setattr(serve, "batcher", serve.MicroBatcher(reload_then_predict, max_batch_size=4, max_wait_s=0.001))
+    r = TestClient(serve.app).post("/predict", json={"features": [2] * 10})
+    assert r.json()["prediction"] == 20.0 and r.headers["X-Model-Id"] == "m-old"
+    cache_key = serve.PredictionCache.key(np.array([[2.0] * 10]))
+    assert serve.prediction_cache.get(cache_key, old.version) == 20.0
+
+
+def test_predict_uses_prediction_cache(monkeypatch, serve_model):
+    model = RowSumModel()
+    calls = []
+    monkeypatch.setattr(model, "predict", lambda X: calls.append(len(X)) or X.sum(axis=1))
+    loaded = serve.LoadedModel(model)
+    loaded.version = "test@1"
+    serve_model(loaded)
+    cache = serve.PredictionCache(max_entries=100)
+    monkeypatch.setattr(serve, "prediction_cache", cache)
+
+    client = TestClient(serve.app)
+    for _ in range(3):
+        r = client.post("/predict", json={"features": [1] * 10})
+        assert r.json()["prediction"] == 10.0
+    r = client.post("/predict/batch", json={"rows": [[1] * 10, [2] * 10]})
+    assert r.json()["predictions"] == [10.0, 20.0]
+
+    # the model ran once for the repeated single row and once for the unseen batch row
+    assert calls == [1, 1]
+    assert cache.hits == 3 and cache.misses == 2
+
+
+def test_admin_reload_swaps_model(tmp_path, monkeypatch, no_active_model):
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, "wb") as f:
+        pickle.dump(RowSumModel(), f)
+    entry = {"model_id": "m-test", "model_path": model_path, "compiled_path": None,
+             "top_features": [f"F{i}" for i in range(1, 11)], "source": "test"}
+    monkeypatch.setattr(serve, "resolve_active_model", lambda: entry)
+
+    client = TestClient(serve.app)
+    assert client.post("/predict", json={"features": [1] * 10}).status_code == 500
+
+    r = client.post("/admin/reload", params={"wait": True})
+    assert r.status_code == 200
+    assert r.json()["model_id"] == "m-test"
+    assert client.get("/health").json()["model_id"] == "m-test"
+    assert client.post("/predict", json={"features": [1] * 10}).json()["prediction"] == 10.0
+
+
+def test_reload_of_a_reexported_forest_invalidates_the_cache(tmp_path, monkeypatch, no_active_model):
+    import os
+    from sklearn.ensemble import RandomForestRegressor
+    from forest_engine import CompiledForest
+    from prediction_cache import PredictionCache
+    X = np.random.RandomState(0).randn(100, 10)
+    compiled_path = tmp_path / "compiled_forest"
+    model_path = tmp_path / "model.pkl"
+    model_path.write_bytes(b"unused: the compiled export is served")
+    entry = {"model_id": "m-1", "model_path": model_path, "compiled_path": compiled_path,
+             "top_features": FEATURES, "source": "test"}
+    monkeypatch.setattr(serve, "resolve_active_model", lambda: entry)
+    monkeypatch.setattr(serve, "SERVING_ENGINE", "compiled")
+    monkeypatch.setattr(serve, "MODEL_MMAP", False)
+    monkeypatch.setattr(serve, "prediction_cache", PredictionCache(10))
+    client = TestClient(serve.app)
+
+    predictions = []
+    for target in (X[:, 0], -100 * X[:, 1]):
+        # a new training run exports into the same directory; neither its path nor its mtime change
+        stat = compiled_path.stat() if compiled_path.exists() else None
+        CompiledForest.from_sklearn(RandomForestRegressor(n_estimators=3, random_state=0).fit(X, target)).save(compiled_path)
+        if stat is not None:
+            os.utime(compiled_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert client.post("/admin/reload", params={"wait": True}).status_code == 200
+        for _ in range(2):
+            predictions.append(client.post("/predict", json={"features": X[0].tolist()}).json()["prediction"])
+    assert predictions[0] == predictions[1] and serve.prediction_cache.hits >= 1
+    assert predictions[2] != predictions[0] and predictions[2] == predictions[3]
+
+
+def test_predict_stage_metrics_use_route_templates(serve_model):
+    serve_model()
+
+    client = TestClient(serve.app)
+    assert client.post("/predict", json={"features": [1] * 10}).json()["prediction"] == 10.0
+    client.get("/no/such/path/12345")
+
+    metrics = client.get("/metrics/").text
+    for stage in ("parse", "array", "predict", "serialize"):
+        assert f'predict_stage_duration_seconds_count{{route="/predict",stage="{stage}"}}' in metrics
+    # unknown paths collapse into one label value instead of one series per path
+    assert 'endpoint="unmatched"' in metrics
+    assert "/no/such/path" not in metrics
+
+
+def test_admin_profiler_captures_predict_stacks(monkeypatch, serve_model):
+    serve_model()
+    monkeypatch.setattr(serve, "profiler", None)
+
+    client = TestClient(serve.app)
+    assert client.get("/admin/profile").status_code == 404
+    assert client.post("/admin/profile/start", params={"duration_s": 5, "interval_ms": 1, "focus": ""}).json()["running"]
+    assert client.post("/admin/profile/start").status_code == 409
+    for _ in range(20):
+        client.post("/predict", json={"features": [1] * 10})
+    status = client.post("/admin/profile/stop").json()
+    assert not status["running"] and status["ticks"] > 0
+
+    folded = client.get("/admin/profile").text
+    assert folded
+    # "frame;frame;... count" lines
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines())
+
+
+def test_liveness_is_separate_from_readiness_and_lifespan_loads_model(tmp_path, monkeypatch, no_active_model):
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, "wb") as f:
+        pickle.dump(RowSumModel(), f)
+    entry = {"model_id": "m-startup", "model_path": model_path, "compiled_path": None,
+             "top_features": [f"F{i}" for i in range(1, 11)], "source": "test"}
+
+    client = TestClient(serve.app)
+    assert client.get("/health/live").status_code == 200
+    r = client.get("/health")
+    assert r.status_code == 503
+    assert r.json()["model_loaded"] is False
+
+    monkeypatch.setattr(serve, "resolve_active_model", lambda: entry)
+    with TestClient(serve.app) as started:
+        # the model loads in the background; the server is live before it is ready
+        serve.startup_thread.join()
+        r = started.get("/health")
+        assert r.status_code == 200
+        assert r.json()["model_id"] == "m-startup"
+        assert r.json()["startup"]["model_load_seconds"] is not None
+
+
+def test_predict_binary_content_negotiation(serve_model):
+    import io
+    import numpy as np
+    serve_model()
+    client = TestClient(serve.app)
+
+    # raw float32 row in, raw float64 prediction out
+    row = np.ones(10, dtype=np.float32)
+    r = client.post("/predict", content=row.tobytes(),
+                    headers={"Content-Type": "application/octet-stream", "Accept": "application/octet-stream"})
+    assert r.status_code == 200
+    assert np.frombuffer(r.content, dtype="<f8").tolist() == [10.0]
+
+    # .npy batch in, .npy predictions out
+    stream = io.BytesIO()
+    np.save(stream, np.array([[1.0] * 10, [2.0] * 10]))
+    r = client.post("/predict/batch", content=stream.getvalue(),
+                    headers={"Content-Type": "application/x-npy", "Accept": "application/x-npy"})
+    assert r.headers["content-type"] == "application/x-npy"
+    assert r.headers["x-prediction-errors"] == "0"
+    assert np.load(io.BytesIO(r.content)).tolist() == [10.0, 20.0]
+
+    # schema is still enforced against top_features
+    assert client.post("/predict", content=np.ones(9, dtype=np.float32).tobytes(),
+                       headers={"Content-Type": "application/octet-stream"}).status_code == 400
+    assert client.post("/predict", content=b"a,b", headers={"Content-Type": "text/csv"}).status_code == 415
+    # an Accept without any known type still gets JSON, as before content negotiation
+    r = client.post("/predict", json={"features": [1] * 10}, headers={"Accept": "text/plain"})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/json"
+    r = client.post("/predict", json={"features": [1] * 10}, headers={"Accept": "application/x-npy;q=0, application/json"})
+    assert r.headers["content-type"] == "application/json"
+    # malformed JSON is still a validation error
+    assert client.post("/predict", json={"features": "x"}).status_code == 422
+
+
+def test_requests_pick_a_pooled_model(monkeypatch, serve_model):
+    class TimesModel:
+        def __init__(self, factor):
+            self.factor = factor
+
+        def predict(self, X):
+            return X.sum(axis=1) * self.factor
+
+    serve_model(model_id="m-champion")
+    factors = {"m-challenger": 2, "m-regional": 3}
+
+    def loader(model_id):
+        if model_id not in factors:
+            raise serve.UnknownModel(model_id)
+        # a regional model may use its own feature set
+        n_features = 10 if model_id == "m-challenger" else 3
+        return serve.LoadedModel(TimesModel(factors[model_id]), model_id=model_id,
+                                 feature_names=[f"R{i}" for i in range(n_features)])
+
+    monkeypatch.setattr(serve, "model_pool", serve.ModelPool(loader, memory_budget_bytes=10, size_fn=lambda m: 1))
+    client = TestClient(serve.app)
+
+    r = client.post("/predict", json={"features": [1] * 10})
+    assert r.json()["prediction"] == 10.0 and r.headers["x-model-id"] == "m-champion"
+    r = client.post("/predict", json={"features": [1] * 10}, headers={"X-Model-Id": "m-challenger"})
+    assert r.json()["prediction"] == 20.0 and r.headers["x-model-id"] == "m-challenger"
+    r = client.post("/predict/batch", json={"rows": [[1, 1, 1], [2, 2, 2]], "model_id": "m-regional"})
+    assert r.json()["predictions"] == [9.0, 18.0]
+    # rows are checked against the selected model's features
+    assert client.post("/predict", json={"features": [1] * 10, "model_id": "m-regional"}).status_code == 400
+
+    assert client.post("/predict", json={"features": [1] * 10}, headers={"X-Model-Id": "m-nope"}).status_code == 404
+    assert client.post("/predict", json={"features": [1] * 10, "model_id": "m-regional"},
+                       headers={"X-Model-Id": "m-challenger"}).status_code == 400
+
+    pool = client.get("/models").json()["pool"]
+    # most recently used first: the header was resolved before the conflicting body was rejected
+    assert [model["model_id"] for model in pool["models"]] == ["m-challenger", "m-regional"]
+    metrics = client.get("/metrics").text
+    assert 'model_pool_loads_total{model_id="m-challenger"} 1.0' in metrics
+    assert 'model_predict_duration_seconds_count{model_id="m-regional"}' in metrics
+
+
+def test_predictions_are_logged_off_the_request_path(tmp_path, monkeypatch, serve_model):
+    from prediction_log import PredictionLog, read_log
+    serve_model(model_id="m-1")
+    log = PredictionLog(tmp_path, flush_interval_s=60).start()
+    monkeypatch.setattr(serve, "prediction_log", log)
+    client = TestClient(serve.app)
+
+    r = client.post("/predict", json={"features": [1] * 10}, headers={"X-Request-Id": "sale-42"})
+    assert r.headers["x-request-id"] == "sale-42"
+    r = client.post("/predict/batch", json={"rows": [[2] * 10, [1] * 9, [3] * 10]})
+    batch_id = r.headers["x-request-id"]
+    # nothing is written until the flusher runs
+    assert log.buffered_rows == 3 and log.flushed == 0
+    assert 'prediction_log_buffered_rows 3.0' in client.get("/metrics").text
+
+    log.close()
+    frame = read_log(tmp_path).sort_values(["request_id", "row"])
+    assert frame["request_id"].tolist() == sorted(["sale-42", batch_id, batch_id])
+    logged = frame.set_index(["request_id", "row"])
+    assert logged.loc[(batch_id, 2), "prediction"] == 30.0 and logged.loc[(batch_id, 2), "F1"] == 3.0
+    assert logged.loc[("sale-42", 0), "model_id"] == "m-1"
+
+
+def test_drift_scores_are_exported_as_metrics(tmp_path, monkeypatch, serve_model):
+    from drift import DriftMonitor, build_reference_profile, save_profile
+    features = [f"F{i}" for i in range(1, 11)]
+    serve_model(model_id="m-1", features=features)
+    monkeypatch.setattr(serve, "drift_monitor", None)
+    profile = build_reference_profile([[float(i)] * 10 for i in range(100)], features)
+    save_profile(profile, tmp_path / "drift_profile.json")
+    monkeypatch.chdir(tmp_path)
+    # startup and reloads pick up the profile train.py wrote
+    serve._reset_drift_monitor()
+    assert isinstance(serve.drift_monitor, DriftMonitor)
+    monkeypatch.setattr(serve, "drift_monitor", DriftMonitor(profile, min_rows=2))
+    client = TestClient(serve.app)
+
+    client.post("/predict", json={"features": [500] * 10})
+    client.post("/predict/batch", json={"rows": [[400] * 10, [1] * 9]})
+    metrics = client.get("/metrics").text
+    assert 'drift_rows_observed_total 2.0' in metrics
+    assert 'feature_drift_window_rows{feature="F3"} 2.0' in metrics
+    assert 'feature_drift_out_of_range_ratio{feature="F1"} 1.0' in metrics
+    assert 'feature_drift_psi{feature="F1"}' in metrics
+
+    # a profile of other features leaves monitoring off
+    monkeypatch.setattr(serve, "top_features", ["G1"])
+    serve._reset_drift_monitor()
+    assert serve.drift_monitor is None
+
+
+def test_predict_returns_per_tree_intervals(serve_model):
+    import io
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 10)
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, X @ np.arange(10))
+    serve_model(model)
+    client = TestClient(serve.app)
+    per_tree = np.column_stack([tree.predict(X[:3]) for tree in model.estimators_])
+
+    body = client.post("/predict?interval=0.9", json={"features": X[0].tolist()}).json()
+    assert body["interval"] == 0.9
+    assert body["prediction"] == pytest.approx(model.predict(X[:1])[0])
+    assert body["lower"] == pytest.approx(np.quantile(per_tree[0], 0.05))
+    assert body["upper"] == pytest.approx(np.quantile(per_tree[0], 0.95))
+    assert body["std"] == pytest.approx(per_tree[0].std())
+    # the sklearn model was compiled once for per-tree predictions
+    assert serve.active_model.compiled_forest.n_trees == 20
+
+    rows = X[:3].tolist()
+    rows.insert(1, [1.0] * 9)
+    body = client.post("/predict/batch?interval=0.5", json={"rows": rows}).json()
+    assert body["n_errors"] == 1 and body["lower"][1] is None and body["std"][1] is None
+    assert body["upper"][3] == pytest.approx(np.quantile(per_tree[2], 0.75))
+    # without the option the response is unchanged
+    assert "lower" not in client.post("/predict/batch", json={"rows": rows}).json()
+
+    # binary responses carry one column per value
+    r = client.post("/predict/batch?interval=0.9", json={"rows": X[:3].tolist()}, headers={"Accept": "application/x-npy"})
+    assert r.headers["x-columns"] == "prediction,lower,upper,std"
+    values = np.load(io.BytesIO(r.content))
+    assert values.shape == (3, 4)
+    assert values[:, 3] == pytest.approx(per_tree.std(axis=1))
+
+    assert client.post("/predict?interval=1.5", json={"features": X[0].tolist()}).status_code == 422
+
+
+def test_explain_returns_cached_contributions_with_portuguese_names(monkeypatch, serve_model):
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+    from prediction_cache import PredictionCache
+    features = [f"F{i}" for i in range(1, 11)]
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 10)
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, 5 * X[:, 0])
+    serve_model(model, model_id="m-1", features=features)
+    monkeypatch.setattr(serve, "feature_names_map", {"F1": "Qualidade Geral (1-10)"})
+    monkeypatch.setattr(serve, "explanation_cache", PredictionCache(100))
+    client = TestClient(serve.app)
+
+    body = client.post("/explain", json={"features": X[0].tolist()}).json()
+    assert body["features"] == features
+    assert body["feature_names"][:2] == ["Qualidade Geral (1-10)", "F2"]
+    assert body["values"] == X[0].tolist()
+    assert body["prediction"] == pytest.approx(model.predict(X[:1])[0])
+    assert body["base_value"] + sum(body["contributions"]) == pytest.approx(body["prediction"])
+    assert abs(body["contributions"][0]) == max(abs(c) for c in body["contributions"])
+
+    # the batch reuses the cached row and reports bad rows like /predict/batch
+    rows = [X[0].tolist(), [1.0] * 9, X[1].tolist()]
+    body = client.post("/explain/batch", json={"rows": rows}).json()
+    assert body["n_errors"] == 1 and body["contributions"][1] is None
+    assert body["predictions"][2] == pytest.approx(model.predict(X[1:2])[0])
+    assert serve.explanation_cache.hits == 1 and serve.explanation_cache.misses == 2
+    assert "explanation_cache_hits_total 1.0" in client.get("/metrics").text
+
+    # contributions need a structured response format
+    assert client.post("/explain", json={"features": X[0].tolist()},
+                       headers={"Accept": "application/x-npy"}).status_code == 406
+
+
+def test_reload_refreshes_the_portuguese_feature_names(tmp_path, monkeypatch, no_active_model):
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+    # serve.py runs from src/ and reads ../top_features.json, which train.py rewrites per model
+    (tmp_path / "src").mkdir()
+    monkeypatch.chdir(tmp_path / "src")
+    X = np.random.RandomState(0).randn(100, 2)
+    entries = {}
+    for name, features in (("m-old", ["A", "B"]), ("m-new", ["C", "D"])):
+        model_path = tmp_path / f"{name}.pkl"
+        with open(model_path, "wb") as f:
+            pickle.dump(RandomForestRegressor(n_estimators=3, random_state=0).fit(X, X[:, 0]), f)
+        entries[name] = {"model_id": name, "model_path": model_path, "compiled_path": None,
+                         "top_features": features, "source": "test"}
+    monkeypatch.setattr(serve, "explanation_cache", None)
+    monkeypatch.setattr(serve, "feature_names_map", {})
+    client = TestClient(serve.app)
+
+    for name, names in (("m-old", {"A": "Area", "B": "Banheiros"}), ("m-new", {"C": "Cozinha", "D": "Dormitorios"})):
+        (tmp_path / "top_features.json").write_text(json.dumps(
+            {"top_features": entries[name]["top_features"], "feature_names": names}))
+        monkeypatch.setattr(serve, "resolve_active_model", lambda name=name: entries[name])
+        assert client.post("/admin/reload", params={"wait": True}).json()["model_id"] == name
+        body = client.post("/explain", json={"features": [0.5, -0.5]}).json()
+        assert body["features"] == entries[name]["top_features"]
+        assert body["feature_names"] == list(names.values())
+    assert serve.top_features == ["C", "D"]
+
@@ -1,34 +1,31 @@
 import sys
+import shutil
 import json
 import types
+import pickle
 import numpy as np
+import pandas as pd
 from pathlib import Path
 import importlib.util
 
+import pytest
+
 
 def make_fake_data_prep_module(path: Path):
-    # Create a fake module named 'data_prep' that provides load_and_prepare_data
+    # Create a fake module named 'data_prep' whose load_dataset returns a small
+    # random frame; prepare_data is the real one so the pipeline is exercised as is
     mod = types.ModuleType('data_prep')
+    real_dp = load_module(path / 'src' / 'data_prep.py', 'real_data_prep')
 
-    def load_and_prepare_data(test_size=0.2, random_state=42, descr=False, selected_features=None):
-        # If selected_features provided, use its length
-        if selected_features is None:
-            n_features = 12
-            feature_names = [f'F{i}' for i in range(1, n_features + 1)]
-        else:
-            feature_names = selected_features
-            n_features = len(selected_features)
-
-        n_samples = 50
-        # small random dataset
+    def load_dataset(source=None, use_cache=True, mmap=False, verify=True, refresh=False):
+        n_samples, n_features = 50, 12
         rng = np.random.RandomState(0)
-        X_train = rng.randn(int(n_samples * (1 - test_size)), n_features)
-        X_test = rng.randn(int(n_samples * test_size), n_features)
-        y_train = rng.randn(int(n_samples * (1 - test_size)))
-        y_test = rng.randn(int(n_samples * test_size))
-        return X_train, X_test, y_train, y_test, feature_names
+        X = pd.DataFrame(rng.randn(n_samples, n_features), columns=[f'F{i}' for i in range(1, n_features + 1)])
+        y = pd.Series(rng.randn(n_samples), name='SalePrice')
+        return X, y, 'fake dataset'
 
-    mod.load_and_prepare_data = load_and_prepare_data
+    mod.load_dataset = load_dataset
+    mod.prepare_data = real_dp.prepare_data
     return mod
 
 
@@ -42,6 +39,9 @@ def load_module(path: Path, name: str):
 def test_train_generates_top_features(tmp_path, monkeypatch):
     repo_root = Path.cwd()
 
+    # train.py and data_prep.py import its sibling modules flat, as when run from src/
+    monkeypatch.syspath_prepend(str(repo_root / 'src'))
+
     # inject fake data_prep into sys.modules before loading train.py
     fake_dp = make_fake_data_prep_module(repo_root)
     sys.modules['data_prep'] = fake_dp
@@ -59,7 +59,11 @@ def test_train_generates_top_features(tmp_path, monkeypatch):
 
     fake_mlflow.start_run = start_run
     fake_mlflow.log_metric = lambda *a, **k: None
+    fake_mlflow.log_metrics = lambda *a, **k: None
+    fake_mlflow.log_params = lambda *a, **k: None
     fake_mlflow.log_param = lambda *a, **k: None
+    fake_mlflow.log_artifact = lambda *a, **k: None
+    fake_mlflow.log_artifacts = lambda *a, **k: None
     fake_mlflow.set_tracking_uri = lambda *a, **k: None
     fake_mlflow.set_experiment = lambda *a, **k: None
 
@@ -83,8 +87,199 @@ def test_train_generates_top_features(tmp_path, monkeypatch):
     assert 'top_features' in data
     assert len(data['top_features']) == 10
 
-    # cleanup
-    try:
-        cfg_path.unlink()
-    except Exception:
-        pass
+    # cleanup, including the serving artifacts written next to top_features.json
+    shutil.rmtree(repo_root / 'compiled_forest', ignore_errors=True)
+    shutil.rmtree(repo_root / 'compiled_forest_compact', ignore_errors=True)
+    for path in (cfg_path, repo_root / 'preprocessing.json', repo_root / 'drift_profile.json'):
+        try:
+            path.unlink()
+        except Exception:
+            pass
+
+
+@pytest.fixture(scope='module')
+def trained(tmp_path_factory):
+    # One full training on the fake dataset, run in a scratch directory, whose exports the
+    # tests below each check; yields (directory, logged metrics)
+    repo_root = Path.cwd()
+    workdir = tmp_path_factory.mktemp('trained')
+    logged_metrics = {}
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.syspath_prepend(str(repo_root / 'src'))
+        monkeypatch.setitem(sys.modules, 'data_prep', make_fake_data_prep_module(repo_root))
+        install_fake_mlflow(monkeypatch, logged_metrics, {})
+        train_mod = load_module(repo_root / 'src' / 'train.py', 'train_artifacts')
+        monkeypatch.chdir(workdir)
+        train_mod.train_and_evaluate_model(cv_folds=3, cv_workers=1)
+    yield workdir, logged_metrics
+
+
+def test_training_exports_the_compiled_forest(trained, monkeypatch):
+    workdir, _ = trained
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    from forest_engine import CompiledForest
+    # memory-mappable .npy files for the compiled serving engine
+    assert (workdir / 'compiled_forest' / 'children.npy').exists()
+    assert CompiledForest.load(workdir / 'compiled_forest').n_trees > 0
+
+
+def test_training_saves_the_fitted_preprocessing(trained):
+    workdir, _ = trained
+    top_features = json.loads((workdir / 'top_features.json').read_text())['top_features']
+    assert json.loads((workdir / 'preprocessing.json').read_text())['feature_names'] == top_features
+
+
+def test_training_exports_a_compact_forest_with_its_report(trained):
+    workdir, logged_metrics = trained
+    # the size/accuracy trade-off of the compact copy is recorded in the run
+    assert (workdir / 'compiled_forest_compact' / 'value.npy').exists()
+    assert logged_metrics['artifact_bytes_compact'] < logged_metrics['artifact_bytes_compiled']
+    assert abs(logged_metrics['compact_r2_delta']) < 1e-3
+
+
+def test_training_saves_the_drift_profile(trained):
+    workdir, _ = trained
+    top_features = json.loads((workdir / 'top_features.json').read_text())['top_features']
+    drift_profile = json.loads((workdir / 'drift_profile.json').read_text())
+    assert [feature['name'] for feature in drift_profile['features']] == top_features
+
+
+def test_training_logs_the_cross_validation_estimate(trained):
+    _, logged_metrics = trained
+    # the k-fold estimate is logged alongside the single holdout
+    assert logged_metrics['cv_folds'] == 3 and logged_metrics['cv_repeats'] == 1
+    assert 'cv_r2_std' in logged_metrics and logged_metrics['cv_speedup'] > 0
+
+
+def test_training_writes_the_model_manifest(trained, monkeypatch):
+    workdir, _ = trained
+    monkeypatch.syspath_prepend(str(Path.cwd() / 'src'))
+    from model_index import resolve_active_model
+    from preprocessing import Preprocessor
+    manifest = json.loads((workdir / 'model_manifest.json').read_text())
+    # relative to the manifest, so the project can be mounted elsewhere (/app in docker)
+    assert manifest['model_id'] == 'm-test' and manifest['run_id'] == 'r-test'
+    assert manifest['model_path'] == 'mlruns/1/models/m-test/artifacts/model.pkl'
+    # the run's logged copies of the serving exports, not the repo-root ones the next training overwrites
+    assert manifest['compiled_path'] == 'mlruns/1/r-test/artifacts/compiled_forest'
+    assert manifest['compact_path'] == 'mlruns/1/r-test/artifacts/compiled_forest_compact'
+    assert manifest['preprocessing_path'] == 'mlruns/1/r-test/artifacts/preprocessing.json'
+    assert manifest['top_features'] == json.loads((workdir / 'top_features.json').read_text())['top_features']
+    assert manifest['preprocessing_fingerprint'] == Preprocessor.load(workdir / 'preprocessing.json').fingerprint
+
+    entry = resolve_active_model(roots=(workdir,))
+    assert entry['model_id'] == 'm-test' and entry['model_path'] == workdir / manifest['model_path']
+    assert (entry['compiled_path'] / 'children.npy').exists() and entry['preprocessing_path'].exists()
+
+
+def install_fake_mlflow(monkeypatch, logged_metrics, logged_params):
+    fake_mlflow = types.ModuleType('mlflow')
+
+    run_artifacts = Path('mlruns') / '1' / 'r-test' / 'artifacts'
+
+    class DummyRunCtx:
+        def __enter__(self):
+            self.info = types.SimpleNamespace(run_id='r-test', artifact_uri='file://' + str(run_artifacts.resolve()))
+            return self
+
+        def __exit__(self, exc_type, exc, tb):
+            return False
+
+    def logged_model_dir(model_id):
+        return Path('mlruns') / '1' / 'models' / model_id / 'artifacts'
+
+    def log_model(sk_model, name, registered_model_name=None):
+        # kept where MLflow 3 stores logged models, for the manifest to point at
+        model_dir = logged_model_dir('m-test')
+        model_dir.mkdir(parents=True, exist_ok=True)
+        with open(model_dir / 'model.pkl', 'wb') as f:
+            pickle.dump(sk_model, f)
+        return types.SimpleNamespace(model_id='m-test')
+
+    fake_mlflow.start_run = lambda *a, **k: DummyRunCtx()
+    fake_mlflow.get_logged_model = lambda model_id: types.SimpleNamespace(
+        artifact_location='file://' + str(logged_model_dir(model_id).resolve()))
+    fake_mlflow.log_metrics = lambda metrics, *a, **k: logged_metrics.update(metrics)
+    fake_mlflow.log_params = lambda params, *a, **k: logged_params.update(params)
+    def log_artifact(local_path, artifact_path=None):
+        destination = run_artifacts / (artifact_path or '')
+        destination.mkdir(parents=True, exist_ok=True)
+        shutil.copy(local_path, destination)
+
+    def log_artifacts(local_dir, artifact_path=None):
+        shutil.copytree(local_dir, run_artifacts / (artifact_path or ''), dirs_exist_ok=True)
+
+    fake_mlflow.log_artifact = log_artifact
+    fake_mlflow.log_artifacts = log_artifacts
+    sklearn_mod = types.ModuleType('mlflow.sklearn')
+    sklearn_mod.log_model = log_model
+    fake_mlflow.sklearn = sklearn_mod
+    monkeypatch.setitem(sys.modules, 'mlflow', fake_mlflow)
+    monkeypatch.setitem(sys.modules, 'mlflow.sklearn', sklearn_mod)
+
+
+def test_incremental_training_extends_the_served_forest(tmp_path, monkeypatch):
+    from sklearn.ensemble import RandomForestRegressor
+    repo_root = Path.cwd()
+    monkeypatch.syspath_prepend(str(repo_root / 'src'))
+    logged_metrics, logged_params = {}, {}
+    install_fake_mlflow(monkeypatch, logged_metrics, logged_params)
+    train_mod = load_module(repo_root / 'src' / 'train.py', 'train_incremental')
+    from model_index import write_manifest
+    from preprocessing import Preprocessor
+
+    # a served 10-tree model with its preprocessing and manifest, as a full training leaves them
+    features = [f'F{i}' for i in range(1, 11)]
+    rng = np.random.RandomState(0)
+    X = rng.randn(200, 10)
+    served = RandomForestRegressor(n_estimators=10, random_state=42).fit(X, X[:, 0])
+    with open(tmp_path / 'model.pkl', 'wb') as f:
+        pickle.dump(served, f)
+    preprocessor = Preprocessor(features, np.zeros(10), np.zeros(10), np.ones(10))
+    preprocessing_path = preprocessor.save(tmp_path / 'preprocessing.json')
+    write_manifest(tmp_path / 'model_manifest.json', model_id='m-served', run_id='r', model_path=tmp_path / 'model.pkl',
+                   top_features=features, preprocessing_path=preprocessing_path,
+                   preprocessing_fingerprint=preprocessor.fingerprint)
+
+    # this week's sales, with one feature missing
+    X_new = rng.randn(40, 10)
+    new_rows = pd.DataFrame(X_new, columns=features).drop(columns=['F10']).assign(SalePrice=X_new[:, 0] + 5)
+    new_rows.to_csv(tmp_path / 'new_sales.csv', index=False)
+    monkeypatch.chdir(tmp_path)
+
+    model, metrics = train_mod.train_incrementally(new_data='new_sales.csv', n_new_trees=5, max_trees=12)
+
+    # 10 + 5 trees, the 3 oldest dropped; the 7 kept ones are untouched
+    assert len(model.estimators_) == 12 and model.n_estimators == 12
+    for kept, original in zip(model.estimators_[:7], served.estimators_[3:]):
+        assert np.array_equal(kept.tree_.threshold, original.tree_.threshold)
+    # the added trees learned the shifted prices of the new rows
+    assert np.mean([tree.predict(X_new[:5]).mean() for tree in model.estimators_[7:]]) > 3
+    assert logged_metrics['new_data_rows'] == 40 and logged_metrics['holdout_rows'] == 8
+    assert logged_metrics['n_trees_dropped'] == 3
+    assert metrics['mse'] < logged_metrics['previous_mse']
+    assert logged_params['training_mode'] == 'incremental' and logged_params['parent_model_id'] == 'm-served'
+
+    # the serving artifacts describe the extended forest and keep the served features
+    from forest_engine import CompiledForest
+    assert CompiledForest.load(tmp_path / 'compiled_forest').n_trees == 12
+    assert Preprocessor.load(tmp_path / 'preprocessing.json').fingerprint == preprocessor.fingerprint
+
+
+def test_ranking_check_flags_shifted_features(monkeypatch):
+    repo_root = Path.cwd()
+    monkeypatch.syspath_prepend(str(repo_root / 'src'))
+    install_fake_mlflow(monkeypatch, {}, {})
+    train_mod = load_module(repo_root / 'src' / 'train.py', 'train_ranking_check')
+
+    rng = np.random.RandomState(1)
+    frame = pd.DataFrame(rng.randn(300, 20), columns=[f'F{i}' for i in range(1, 21)])
+    top_features = [f'F{i}' for i in range(1, 11)]
+    stable = frame[top_features].to_numpy() @ np.linspace(2, 1, 10)
+    shifted = frame[[f'F{i}' for i in range(11, 21)]].to_numpy() @ np.linspace(2, 1, 10)
+
+    assert train_mod.ranking_check(frame, stable, top_features)[0] is False
+    is_shifted, agreement = train_mod.ranking_check(frame, shifted, top_features)
+    assert is_shifted and agreement['top_k_overlap'] < 0.6
+    # too few rows to rank
+    assert train_mod.ranking_check(frame[:50], shifted[:50], top_features) == (False, None)
@@ -0,0 +1,92 @@
+import io
+from pathlib import Path
+import importlib.util
+
+import numpy as np
+import pytest
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+FEATURES = ['A', 'B', 'C']
+
+
+def test_npy_and_raw_buffers_decode_without_copying():
+    mod = load_module(Path('src') / 'wire_formats.py', 'wire_formats')
+    X = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+    stream = io.BytesIO()
+    np.save(stream, X)
+    body = stream.getvalue()
+    decoded = mod.decode_rows(body, 'application/x-npy', FEATURES)
+    np.testing.assert_array_equal(decoded, X)
+    # a read-only view over the request bytes, not a copy
+    assert not decoded.flags.owndata and not decoded.flags.writeable
+
+    raw = mod.decode_rows(X.tobytes(), 'application/octet-stream', FEATURES)
+    np.testing.assert_array_equal(raw, X)
+    raw64 = mod.decode_rows(X.astype('<f8').tobytes(), 'application/octet-stream', FEATURES, dtype_header='float64')
+    np.testing.assert_array_equal(raw64, X)
+
+    # schema checks against the model features
+    with pytest.raises(ValueError):
+        mod.decode_rows(X[:, :2].tobytes(), 'application/octet-stream', FEATURES)
+    with pytest.raises(ValueError):
+        mod.decode_rows(X.tobytes(), 'application/octet-stream', FEATURES, names_header='A,C,B')
+    with pytest.raises(mod.UnsupportedFormat):
+        mod.decode_rows(b'', 'text/csv', FEATURES)
+
+
+def test_msgpack_and_arrow_round_trips():
+    msgpack = pytest.importorskip('msgpack')
+    pa = pytest.importorskip('pyarrow')
+    mod = load_module(Path('src') / 'wire_formats.py', 'wire_formats')
+    X = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+    packed = msgpack.packb({'data': X.astype('<f4').tobytes(), 'shape': [2, 3], 'feature_names': FEATURES})
+    np.testing.assert_array_equal(mod.decode_rows(packed, 'application/msgpack', FEATURES), X)
+    np.testing.assert_array_equal(mod.decode_rows(msgpack.packb({'rows': X.tolist()}), 'application/x-msgpack', FEATURES), X)
+
+    # Arrow columns are matched by name, whatever their order in the table
+    table = pa.table({'C': X[:, 2], 'A': X[:, 0], 'B': X[:, 1]})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    np.testing.assert_array_equal(mod.decode_rows(sink.getvalue().to_pybytes(), mod.ARROW, FEATURES), X)
+
+    content = {'predictions': [1.5, None], 'errors': [], 'n_rows': 2, 'n_errors': 1}
+    body, media_type = mod.encode(content, mod.ARROW)
+    column = pa.ipc.open_stream(body).read_all().column('prediction').to_pylist()
+    assert media_type == mod.ARROW and column == [1.5, None]
+    assert msgpack.unpackb(mod.encode(content, 'application/msgpack')[0]) == content
+
+
+def test_response_negotiation():
+    mod = load_module(Path('src') / 'wire_formats.py', 'wire_formats')
+    content = {'predictions': [1.5, None], 'n_errors': 1}
+
+    assert mod.encode(content, None)[1] == mod.JSON
+    assert mod.encode(content, 'text/html,application/xhtml+xml,*/*;q=0.8')[1] == mod.JSON
+    body, media_type = mod.encode(content, 'application/x-npy')
+    values = np.load(io.BytesIO(body))
+    assert media_type == mod.NPY and values[0] == 1.5 and np.isnan(values[1])
+    assert np.frombuffer(mod.encode({'prediction': 2.0}, 'application/octet-stream')[0], dtype='<f8').tolist() == [2.0]
+    # no known type asked for: JSON rather than a failed request
+    assert mod.encode(content, 'text/csv')[1] == mod.JSON
+    assert mod.encode(content, 'text/plain')[1] == mod.JSON
+
+
+def test_accept_q_values():
+    mod = load_module(Path('src') / 'wire_formats.py', 'wire_formats')
+    # highest q wins, whatever the listed order; q=0 means "not this one"
+    assert mod.accepted_type('application/json;q=0.5, application/x-npy') == mod.NPY
+    assert mod.accepted_type('application/x-npy;q=0, application/msgpack;q=0.1') == mod.MSGPACK
+    assert mod.accepted_type('application/x-npy;q=0') == mod.JSON
+    assert mod.accepted_type('application/x-npy;q=0.5, application/msgpack;q=0.5') == mod.NPY
+    assert mod.accepted_type('application/x-npy;q=0.2, */*;q=0.8') == mod.JSON
+    assert mod.accepted_type('application/x-npy;q=oops, application/msgpack') == mod.MSGPACK